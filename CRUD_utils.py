@@ -24,9 +24,12 @@ Date: 07/06/2024
 from dotenv import load_dotenv
 import os
 
-from pymongo import MongoClient
+from pymongo import ASCENDING, DESCENDING, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
 from bson import ObjectId
 from datetime import datetime
+from functools import lru_cache
+import itertools
 
 # Append the path to the schemas directory
 import sys
@@ -35,100 +38,366 @@ sys.path.append("./db_schemas")
 from graph_map import GraphMap
 from process_step import ProcessStep
 from crud_models import *
+from document_cache import graph_cache, process_cache
+from query_guard import query_guard
+from metrics import timed
+from db_connection import LazyHandle, get_client, get_database, lazy_collection
+from read_routing import analytics_read_preference, read_route
+from graph_summary import (
+	SUMMARY_PROJECTION, catalog_differences, catalog_operations, catalog_rebuild_pipeline, catalog_removals, empty_summary,
+	rebuild_pipeline, rebuild_timestamp, stale_summary_filter, summary_operations, without_zero_counts
+)
+from analytics import analytics_max_time_ms
+from data_paths import DATA_PATHS_FIELD, flatten_data_paths, with_data_paths
+from search import next_search_token, search_plan
+from query_utils import chunked, find_documents, keyset_sort, lineage_pipeline, process_list_push
 
 # load environmental varibles from ".env" file
 load_dotenv()
 
-# connect to database and create database objs
+# create database objs, the client connects on first use (see db_connection.py)
 
-database_url = os.getenv('DATABASE_URL')
-client = MongoClient(database_url)
+client = LazyHandle(get_client)
+db = LazyHandle(get_database)
+graph_collection = lazy_collection("graph_map")
+process_collection = lazy_collection("process_step")
+summary_collection = lazy_collection("graph_summary")
+catalog_collection = lazy_collection("data_key_catalog")
 
-db = client.Goldfish
-graph_collection = db.graph_map
-process_collection = db.process_step
+# secondary reads for the analytics policy, see read_routing.py
+analytics_graph_collection = lazy_collection("graph_map", get_database, analytics_read_preference())
+analytics_process_collection = lazy_collection("process_step", get_database, analytics_read_preference())
+
+# Cached Lookups
+
+def _cached_find_one(collection, cache, ID:str):
+	"""
+	Read-through lookup of a whole document by its ID.
+
+	:param collection: The collection holding the document.
+	:param cache: The DocumentCache in front of the collection.
+	:param ID: The ID of the document to retrieve.
+	:return: The document if found, otherwise None.
+	"""
+	result = cache.get(ID)
+	if result is None:
+		version = cache.version()
+		result = collection.find_one({"_id" : ID})
+		if result:
+			cache.set(ID, result, version)
+	return result
+
+def _cached_find_many(collection, cache, IDs:list):
+	"""
+	Read-through lookup of whole documents by their IDs. The cache misses
+	are read with a single $in query.
+
+	:param collection: The collection holding the documents.
+	:param cache: The DocumentCache in front of the collection.
+	:param IDs: The IDs of the documents to retrieve.
+	:return: A dictionary from ID to document for the IDs that were found.
+	"""
+	found = {}
+	for ID in IDs:
+		document = cache.get(ID)
+		if document is not None:
+			found[ID] = document
+
+	missing = [ID for ID in dict.fromkeys(IDs) if ID not in found]
+	if missing:
+		version = cache.version()
+		for document in collection.find({"_id" : {"$in": missing}}):
+			cache.set(document["_id"], document, version)
+			found[document["_id"]] = document
+	return found
+
+# Graph Summaries
+
+def _apply_summary_changes(changes:list, session=None):
+	"""
+	Apply process changes to the graph summaries and the data key catalog,
+	with one bulk_write each.
+
+	:param changes: list of (before, after) process documents, see summary_operations.
+	:param session: Optional session, to write the counts inside its transaction.
+	"""
+	operations = summary_operations(changes)
+	if operations:
+		summary_collection.bulk_write(operations, ordered=False, session=session)
+	operations = catalog_operations(changes)
+	if operations:
+		catalog_collection.bulk_write(operations, ordered=False, session=session)
+
+@timed
+def rebuild_graph_summaries(graph_ids:list=None):
+	"""
+	Recompute graph summaries from the process collection on the server
+	and remove the summaries of graphs left without processes.
+
+	:param graph_ids: The graphs to rebuild, None for every graph.
+	:return: The number of summaries rebuilt and removed.
+	"""
+	rebuilt_at = rebuild_timestamp()
+	pipeline = rebuild_pipeline(process_collection.name, summary_collection.name, rebuilt_at, graph_ids)
+	list(process_collection.aggregate(pipeline, allowDiskUse=True))
+
+	rebuilt_filter = {"date_updated": rebuilt_at}
+	if graph_ids is not None:
+		rebuilt_filter["_id"] = {"$in": graph_ids}
+	return {
+		"rebuilt": summary_collection.count_documents(rebuilt_filter),
+		"removed": summary_collection.delete_many(stale_summary_filter(rebuilt_at, graph_ids)).deleted_count,
+	}
+
+@timed
+def rebuild_data_key_catalog():
+	"""
+	Recompute the data key catalog from the process collection on the
+	server and remove the keys no process holds anymore.
+
+	:return: The number of keys rebuilt and removed.
+	"""
+	rebuilt_at = rebuild_timestamp()
+	pipeline = catalog_rebuild_pipeline(catalog_collection.name, rebuilt_at)
+	list(process_collection.aggregate(pipeline, allowDiskUse=True))
+
+	removed = catalog_collection.delete_many({"date_updated": {"$lt": rebuilt_at}})
+	return {
+		"rebuilt": catalog_collection.count_documents({"date_updated": rebuilt_at}),
+		"removed": removed.deleted_count,
+	}
 
 # Create Graph Data 
 
+@timed
 def create_graph_document(new_graph_dict:dict):
 	"""
 	Create a dictionary in new graph_map.
 
 	:new_graph_dict: dictionary containing document info.
-	:return: The produced graph echoed back.
+	:return: The produced graph echoed back, built from the inserted payload.
 	"""
 	result = graph_collection.insert_one(new_graph_dict)
 
+	# the inserted payload already is the stored document, echo it back
 	if result.inserted_id:
-		created_graph_map = pull_graph_id(result.inserted_id)
-		return created_graph_map
+		return new_graph_dict
+
+@timed
+def create_graph_documents_bulk(new_graph_dicts:list, chunk_size:int=1000):
+	"""
+	Create many graph documents with unordered bulk_write calls of
+	InsertOne operations, one call per chunk.
+
+	:new_graph_dicts: list of dictionaries containing document info.
+	:chunk_size: number of documents sent per bulk_write.
+	:return: The ids created and the ids that failed with the reason.
+	"""
+	summary = {"created": [], "failed": []}
+	for chunk in chunked(new_graph_dicts, chunk_size):
+		failed = {}
+		try:
+			graph_collection.bulk_write([InsertOne(graph) for graph in chunk], ordered=False)
+		except BulkWriteError as error:
+			failed = {write_error["index"]: write_error["errmsg"] for write_error in error.details["writeErrors"]}
+
+		for index, graph in enumerate(chunk):
+			if index in failed:
+				summary["failed"].append({"_id": graph["_id"], "detail": failed[index]})
+			else:
+				summary["created"].append(graph["_id"])
+	return summary
 
 # Read Graph Data 
 
-def pull_graph_instance(filter):
+@timed
+def pull_graph_instance(filter, projection:dict=None):
 	"""
 	Pull a specific document with specific filter.
 
 	:param filter: filter to apply to database.
+	:param projection: Fields to include or exclude, None for whole documents.
 	:return: The graph document if found, otherwise None.
 	"""
-	return graph_collection.find_one(filter)
+	return graph_collection.find_one(filter, projection)
 
-def pull_graph_collection(filter):
+@timed
+def pull_graph_collection(filter, projection:dict=None, limit:int=None, after:str=None, as_cursor=False):
 	"""
 	Pull a collection of graphs under specific filter.
 
 	:param filter: filter to apply to database.
+	:param projection: Fields to include or exclude, None for whole documents.
+	:param limit: Maximum number of documents to return, None for all.
+	:param after: Pagination token of the last document already served.
+	:param as_cursor: Return the open cursor instead of a list so it can be streamed.
 	:return: The graph document if found, otherwise None.
+	:raises QueryRejected: The filter is invalid or would scan too much of the collection.
 	"""
-	return list(graph_collection.find(filter))
-
-def pull_graph_id(ID:str):
+	collection, session = read_route("pull_graph_collection", graph_collection, analytics_graph_collection)
+	# the filter comes straight from the user, so check its plan first
+	query_guard.check(collection, filter, keyset_sort(limit, after))
+	cursor = find_documents(
+		collection, filter, limit=limit, after=after, projection=projection,
+		max_time_ms=query_guard.max_time_ms, session=session
+	)
+	if as_cursor:
+		return cursor
+	return list(cursor)
+
+@timed
+def pull_graph_id(ID:str, projection:dict=None):
 	"""
 	Pull a graph document by its ID.
 
 	:param ID: The ID of the graph document to retrieve.
+	:param projection: Fields to include or exclude, None for whole documents.
 	:return: The graph document if found, otherwise None.
 	"""
-	result = graph_collection.find_one({"_id" : ID})
+	if projection is None:
+		result = _cached_find_one(graph_collection, graph_cache, ID)
+	else:
+		result = graph_collection.find_one({"_id" : ID}, projection)
 	if result:
 		return result
 
-def pull_graph_project_name(name:str):
+@timed
+def pull_graph_ids(IDs:list, projection:dict=None):
+	"""
+	Pull graph documents by their IDs with one query instead of one per ID.
+
+	:param IDs: The IDs of the graph documents to retrieve.
+	:param projection: Fields to include or exclude, None for whole documents. _id is always returned.
+	:return: The graph documents in the order of IDs, None for the IDs that were not found.
+	"""
+	if projection is None:
+		found = _cached_find_many(graph_collection, graph_cache, IDs)
+	else:
+		# the documents are matched back to the IDs by _id, so only its exclusion is
+		# dropped, {"_id": 1} alone stays a valid inclusion of nothing but the ids
+		projection = {field: value for field, value in projection.items() if field != "_id" or value} or None
+		cursor = graph_collection.find({"_id" : {"$in": list(dict.fromkeys(IDs))}}, projection)
+		found = {document["_id"]: document for document in cursor}
+	return [found.get(ID) for ID in IDs]
+
+@timed
+def pull_graph_project_name(name:str, projection:dict=None):
 	"""
 	Pull a graph document by its project name.
 
 	:param name: The project name of the graph document to retrieve.
+	:param projection: Fields to include or exclude, None for whole documents.
 	:return: The graph document if found, otherwise None.
 	"""
-	result = graph_collection.find_one({"project_name" : name})
+	result = graph_collection.find_one({"project_name" : name}, projection)
 	if result:
 		return result
 
-def pull_graphs_owner(owner:str):
+@timed
+def pull_graphs_owner(owner:str, projection:dict=None, limit:int=None, after:str=None, as_cursor=False):
 	"""
 	Pull all graph documents by the owner's name.
 
 	:param owner: The name of the owner.
+	:param projection: Fields to include or exclude, None for whole documents.
+	:param limit: Maximum number of documents to return, None for all.
+	:param after: Pagination token of the last document already served.
+	:param as_cursor: Return the open cursor instead of a list so it can be streamed.
 	:return: A list of graph documents owned by the specified owner.
 	"""
-	result = list(graph_collection.find({"owner" : owner}))
+	collection, session = read_route("pull_graphs_owner", graph_collection, analytics_graph_collection)
+	cursor = find_documents(collection, {"owner" : owner}, limit=limit, after=after, projection=projection, session=session)
+	if as_cursor:
+		return cursor
+	result = list(cursor)
 	if result:
 		return result
 
-def pull_graphs_email(email:str):
+@timed
+def pull_graphs_email(email:str, projection:dict=None, limit:int=None, after:str=None, as_cursor=False):
 	"""
 	Pull all graph documents by the owner's email.
 
 	:param email: The email of the owner.
+	:param projection: Fields to include or exclude, None for whole documents.
+	:param limit: Maximum number of documents to return, None for all.
+	:param after: Pagination token of the last document already served.
+	:param as_cursor: Return the open cursor instead of a list so it can be streamed.
 	:return: A list of graph documents owned by the specified email.
 	"""
-	result = list(graph_collection.find({"owner_email" : email}))
+	collection, session = read_route("pull_graphs_email", graph_collection, analytics_graph_collection)
+	cursor = find_documents(collection, {"owner_email" : email}, limit=limit, after=after, projection=projection, session=session)
+	if as_cursor:
+		return cursor
+	result = list(cursor)
+	if result:
+		return result
+
+@timed
+def pull_graph_summary(ID:str):
+	"""
+	Pull the process counts of a graph from its summary document.
+
+	:param ID: The ID of the graph.
+	:return: The graph summary if the graph exists, otherwise None.
+	"""
+	result = summary_collection.find_one({"_id" : ID})
+	if result:
+		return without_zero_counts(result)
+
+	# graphs without processes have no summary yet
+	if graph_collection.find_one({"_id" : ID}, {"_id": 1}):
+		return empty_summary(ID)
+
+@timed
+def pull_graph_lineage(ID:str, projection:dict=None, start:int=0, stop:int=None):
+	"""
+	Pull the process documents of a graph in process_list order with one
+	aggregation, instead of one lookup per process.
+
+	:param ID: The ID of the graph.
+	:param projection: Fields to include or exclude, None for whole documents.
+	:param start: First process_list position to return.
+	:param stop: Position to stop before, None for the end of the list.
+	:return: The process documents with their "position" if the graph exists, otherwise None.
+	:raises ValueError: If the range is empty or negative.
+	"""
+	cursor = graph_collection.aggregate(lineage_pipeline(ID, process_collection.name, start, stop, projection))
+	result = list(cursor)
 	if result:
 		return result
 
+	# graphs without processes in the range
+	if graph_collection.find_one({"_id" : ID}, {"_id": 1}):
+		return []
+
+@timed
+def search_graphs(query:str, mode:str="text", field:str="project_name", projection:dict=None, limit:int=20, after:str=None):
+	"""
+	Search graphs by words in their project name, owner and description,
+	or by the prefix of their project name or owner, see search.py.
+
+	:param query: Words to search for in text mode, the prefix in prefix mode.
+	:param mode: "text" for ranked full text search, "prefix" for an anchored prefix match.
+	:param field: The field searched in prefix mode, project_name or owner.
+	:param projection: Fields to include or exclude, None for whole documents.
+	:param limit: Page size.
+	:param after: Pagination token of the previous page.
+	:return: The matching graphs, ranked by "score" in text mode, and the "next_after" token.
+	:raises ValueError: The mode, field, limit or token is invalid.
+	"""
+	plan = search_plan(query, mode, field, limit, after, projection)
+	collection, session = read_route("search_graphs", graph_collection, analytics_graph_collection)
+	cursor = collection.find(
+		plan["filter"], plan["projection"], sort=plan["sort"], skip=plan["skip"], limit=plan["limit"],
+		max_time_ms=query_guard.max_time_ms, session=session
+	)
+	matches = list(cursor)
+	return {"matches": matches, "next_after": next_search_token(matches, plan, mode, field)}
+
 # Update Graph Data 
 
+@timed
 def update_graph_process_meta_data(update_id:str, process_meta_data:dict):
 	"""
 	Update the process metadata of a graph document.
@@ -149,9 +418,12 @@ def update_graph_process_meta_data(update_id:str, process_meta_data:dict):
 			}}
 		)
 
+	graph_cache.invalidate(update_id)
+
 	if result.modified_count > 0:
 		return f"item '{update_id}' modified with supplied meta data"
 
+@timed
 def update_graph_project_name(update_id:str, project_name:str):
 	"""
 	Update the project name of a graph document.
@@ -172,9 +444,12 @@ def update_graph_project_name(update_id:str, project_name:str):
 			}}
 		)
 
+	graph_cache.invalidate(update_id)
+
 	if result.modified_count > 0:
 		return f"item '{update_id}' modified with supplied meta data"
 
+@timed
 def update_graph_owner_email(update_id:str, owner_email:str):
 	"""
 	Update the owner email of a graph document.
@@ -195,9 +470,12 @@ def update_graph_owner_email(update_id:str, owner_email:str):
 			}}
 		)
 
+	graph_cache.invalidate(update_id)
+
 	if result.modified_count > 0:
 		return f"item '{update_id}' modified with supplied meta data"
 
+@timed
 def update_graph_owner(update_id:str, owner:str):
 	"""
 	Update the owner of a graph document.
@@ -218,41 +496,211 @@ def update_graph_owner(update_id:str, owner:str):
 			}}
 		)
 
+	graph_cache.invalidate(update_id)
+
 	if result.modified_count > 0:
 		return f"item '{update_id}' modified with supplied meta data"
 
+@timed
 def update_graph_process_list_order(update_id:str, process_list:str):
 	"""
-	Update the order of the process list in a graph document.
+	Update the order of the process list in a graph document. The new
+	order is only written if the stored list holds exactly the same
+	processes, checked by the server within the same atomic update so a
+	concurrent insert or delete can not be lost.
 
 	:param update_id: The unique identifier of the graph document to update.
 	:param process_list: The new order of the process list to update in the graph document.
 	:return: A message indicating the outcome of the update operation.
+	:raises ValueError: The process list holds an id more than once.
 	"""
-	# pull refence graph data
-	reference_graph_data = pull_graph_id(update_id)
-
-	# check to ensure graph data exists and that the data matches
-	if reference_graph_data:
-		if sorted(reference_graph_data["process_list"]) == sorted(process_list):
-			# generate timestamp
-			time_stamp = datetime.utcnow() 
-
-			# update database
-			result = graph_collection.update_one(
-					{"_id":update_id}, 
-					{'$set': {
-						"process_list":process_list,
-						"date_updated":time_stamp
-					}}
-				)
+	# $size and $all only pin down the stored processes when the ids are distinct,
+	# a repeated id would otherwise replace another process of the graph
+	if len(set(process_list)) != len(process_list):
+		raise ValueError("the process list holds duplicate ids")
+
+	# generate timestamp
+	time_stamp = datetime.utcnow()
+
+	# $all with an empty list matches nothing, an empty list is matched by its size alone
+	stored_list = {"$size":len(process_list), "$all":process_list} if process_list else {"$size":0}
+
+	# update database only if the stored list holds the same processes
+	result = graph_collection.update_one(
+			{
+				"_id":update_id,
+				"process_list":stored_list
+			},
+			{'$set': {
+				"process_list":process_list,
+				"date_updated":time_stamp
+			}}
+		)
+
+	graph_cache.invalidate(update_id)
+
+	if result.modified_count > 0:
+		return f"item '{update_id}' modified with supplied meta data"
+
+
+def _bulk_update_fields(collection, cache, updates:list, chunk_size:int=1000):
+	"""
+	Apply per document $set updates with unordered bulk_write calls of
+	UpdateOne operations, one call per chunk. Ids are only looked up when
+	a chunk matched fewer documents than it addressed.
+
+	:param collection: The collection to update.
+	:param cache: The DocumentCache in front of the collection.
+	:param updates: list of dictionaries holding update_id and the fields to set.
+	:param chunk_size: number of updates sent per bulk_write.
+	:return: A summary with the matched and modified counts and the ids not found.
+	"""
+	summary = {"requested": len(updates), "matched": 0, "modified": 0, "not_found": []}
+	for chunk in chunked(updates, chunk_size):
+		# generate timestamp
+		time_stamp = datetime.utcnow()
+
+		operations = []
+		for update in chunk:
+			fields = {key: value for key, value in update.items() if key != "update_id"}
+			fields["date_updated"] = time_stamp
+			operations.append(UpdateOne({"_id": update["update_id"]}, {'$set': fields}))
+
+		result = collection.bulk_write(operations, ordered=False)
+		cache.invalidate(*[update["update_id"] for update in chunk])
+		summary["matched"] += result.matched_count
+		summary["modified"] += result.modified_count
+
+		if result.matched_count < len(chunk):
+			chunk_ids = [update["update_id"] for update in chunk]
+			found = {document["_id"] for document in collection.find({"_id": {"$in": chunk_ids}}, {"_id": 1})}
+			summary["not_found"].extend(update_id for update_id in chunk_ids if update_id not in found)
+	return summary
+
+@timed
+def update_graph_documents_bulk(updates:list, chunk_size:int=1000):
+	"""
+	Update fields of many graph documents at once.
 
-			if result.modified_count > 0:
-				return f"item '{update_id}' modified with supplied meta data"
+	:param updates: list of dictionaries holding update_id and the graph fields to set.
+	:param chunk_size: number of updates sent per bulk_write.
+	:return: A summary with the matched and modified counts and the ids not found.
+	"""
+	return _bulk_update_fields(graph_collection, graph_cache, updates, chunk_size)
 
 
 # Delete Graph Data 
 
+@lru_cache(maxsize=None)
+def _supports_transactions():
+	"""
+	Check whether the connected deployment can run multi-document
+	transactions (replica sets and sharded clusters only). Checked once
+	per process.
+
+	:return: True if transactions are available.
+	"""
+	hello = db.command("hello")
+	return bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+
+def _delete_process_batch(graph_id:str, batch_size:int, use_transaction:bool):
+	"""
+	Delete up to batch_size processes of a graph with one delete_many,
+	pull them from its process_list and take them off the graph summary
+	and the data key catalog. With a transaction all of it commits
+	together, so the graph never lists a deleted process and an
+	interrupted cascade leaves the counts in step with the processes that
+	are left. Without one a concurrent delete can remove some of the
+	processes read for the batch first, then the deltas of the batch are
+	unknown and the summary of the graph is rebuilt instead, moving the
+	catalog by the difference between the old and the rebuilt summary.
+
+	:param graph_id: The graph whose processes are deleted.
+	:param batch_size: Maximum number of processes deleted in this batch.
+	:param use_transaction: Run the batch inside a session transaction.
+	:return: The number of processes deleted, None once none are left.
+	"""
+	def delete_batch(session=None):
+		processes = list(process_collection.find(
+				{"parent_graph" : graph_id}, SUMMARY_PROJECTION, session=session
+			).limit(batch_size))
+		if not processes:
+			return [], 0
+
+		ids = [process["_id"] for process in processes]
+		result = process_collection.delete_many({"_id": {"$in": ids}, "parent_graph": graph_id}, session=session)
+		graph_collection.update_one(
+				{"_id": graph_id},
+				{'$pull': {"process_list": {"$in": ids}}},
+				session=session
+			)
+		# inside a transaction a concurrent delete conflicts and retries it, so the counts always match
+		if result.deleted_count == len(processes):
+			_apply_summary_changes([(process, None) for process in processes], session=session)
+		else:
+			before = summary_collection.find_one({"_id": graph_id})
+			rebuild_graph_summaries([graph_id])
+			operations = catalog_differences(before, summary_collection.find_one({"_id": graph_id}))
+			if operations:
+				catalog_collection.bulk_write(operations, ordered=False)
+		return ids, result.deleted_count
+
+	if use_transaction:
+		with client.start_session() as session:
+			ids, deleted_count = session.with_transaction(delete_batch)
+	else:
+		ids, deleted_count = delete_batch()
+
+	if not ids:
+		return None
+	process_cache.invalidate(*ids)
+	graph_cache.invalidate(graph_id)
+	return deleted_count
+
+@timed
+def cascade_delete_graph(id:str, batch_size:int=1000, on_progress=None):
+	"""
+	Delete a graph and all of its processes. Processes are removed in
+	bounded batches first, then the graph, then a final sweep removes
+	processes attached concurrently, and the outcome is verified.
+
+	:param id: The unique identifier of the graph document to delete.
+	:param batch_size: Maximum number of processes deleted per batch.
+	:param on_progress: Optional callback receiving the running count of deleted processes.
+	:return: A report of the deleted processes, whether the graph was deleted
+	         and how many processes remain (0 when consistent).
+	"""
+	use_transaction = _supports_transactions()
+	report = {"deleted_processes": 0, "graph_deleted": False, "remaining_processes": 0}
+
+	def sweep():
+		while True:
+			deleted_count = _delete_process_batch(id, batch_size, use_transaction)
+			if deleted_count is None:
+				return
+			report["deleted_processes"] += deleted_count
+			if on_progress:
+				on_progress(report["deleted_processes"])
+
+	sweep()
+
+	# Delete the graph document with the specified id
+	graph_result = graph_collection.delete_one({"_id" : f"{id}"})
+	graph_cache.invalidate(id)
+	report["graph_deleted"] = graph_result.deleted_count > 0
+
+	sweep()
+	summary = summary_collection.find_one_and_delete({"_id" : id})
+	if summary:
+		operations = catalog_removals(summary)
+		if operations:
+			catalog_collection.bulk_write(operations, ordered=False)
+
+	# consistency check
+	report["remaining_processes"] = process_collection.count_documents({"parent_graph" : id})
+	return report
+
+@timed
 def delete_graph(id:str):
 	"""
 	Delete a graph document by its unique identifier and 
@@ -262,137 +710,341 @@ def delete_graph(id:str):
 	:return: A message indicating the outcome of the deletion operation, 
 	         including associated processes.
 	"""
-	# Delete the graph document with the specified id
-	graph_result = graph_collection.delete_one({"_id" : f"{id}"})
-
-	# Delete all process documents associated with the specified graph id
-	process_result = delete_all_from_parent_graph(id)
+	report = cascade_delete_graph(id)
 
 	# Validate results
-	if graph_result.deleted_count > 0 and process_result:
+	if report["graph_deleted"] and not report["remaining_processes"]:
 		return f"item '{id}' and all associated processes deleted"
 
 
 
 # Create Process Data 
 
+@timed
 def create_process_document(new_process_dict:dict, list_insert_location=None):
 	"""
 	Create a new process document in the collection and add the document
 	to the process list in the parent graph. If list_insert_location
 	is specified it inserts the process into the process_list at that point
-	otherwise it simply appends
+	otherwise it simply appends. The parent list is changed with a single
+	server side $push so concurrent inserts into one graph never overwrite
+	each other, and whose result also validates the parent. The response
+	is built from the inserted payload rather than read back from the
+	database, so a create costs two round trips.
 
 	:new_process_dict: dictionary containing document info.
 	:list_insert_location: integer if specifing location, none if simply appending
 	:return: The produced process echoed back otherwise nothing.
 	"""
-	# validate that parent exists and pull data
+	# keep the path to process index in step with elastic_data_paths
+	new_process_dict = with_data_paths(new_process_dict)
 	parent_id = new_process_dict["parent_graph"]
-	parent_result = pull_graph_id(parent_id)
 
-	if parent_result:
-		# add data to the stack
-		result = process_collection.insert_one(new_process_dict)
+	# add data to the stack
+	result = process_collection.insert_one(new_process_dict)
 
-		# check that worked properly
-		if result.inserted_id:
-			# generate timestamp
-			time_stamp = datetime.utcnow()
+	# check that worked properly
+	if result.inserted_id:
+		# generate timestamp
+		time_stamp = datetime.utcnow()
+
+		# push the new child process onto the parent process list, the
+		# update only matches if the parent exists
+		process_append_result = graph_collection.update_one(
+					{"_id":parent_id},
+					{
+						'$push': {"process_list":process_list_push(
+							[new_process_dict["_id"]], list_insert_location
+						)},
+						'$set': {"date_updated":time_stamp}
+					}
+				)
 
-			# isolate and update parent process list to reflect new child process
-			process_list = parent_result["process_list"]
-			if not list_insert_location or (type(list_insert_location) != int):
-				process_list.append(new_process_dict["_id"])
-			else:
-				process_list.insert(list_insert_location, new_process_dict["_id"])
-
-			process_append_result = graph_collection.update_one(
-						{"_id":parent_id}, 
-						{'$set': {
-							"process_list":process_list,
-							"date_updated":time_stamp
-						}}
-					)
-
-			# validate that this worked
-			if process_append_result.modified_count > 0:
-				# query new data entered and echo back to user
-				created_process_map = pull_process_id(result.inserted_id)
-				return created_process_map
+		graph_cache.invalidate(parent_id)
+
+		# validate that this worked, remove the process again if there is no parent
+		if process_append_result.modified_count == 0:
+			process_collection.delete_one({"_id" : result.inserted_id})
+			return
+
+		_apply_summary_changes([(None, new_process_dict)])
+
+		# echo the inserted payload back to user
+		return new_process_dict
+
+@timed
+def create_process_documents_bulk(new_process_dicts:list, ordered:bool=False):
+	"""
+	Create many process documents at once. All parents are validated with
+	one query, the processes are written with one insert_many and every
+	parent's process_list is extended with one $push $each, sent together
+	in a single bulk_write.
+
+	:new_process_dicts: list of dictionaries containing document info.
+	:ordered: stop at the first failed insert instead of continuing.
+	:return: A status entry per supplied process, in the supplied order.
+	"""
+	new_process_dicts = [with_data_paths(process) for process in new_process_dicts]
+
+	# validate all parents with one query
+	parent_ids = list({process["parent_graph"] for process in new_process_dicts})
+	existing_parents = {
+		parent["_id"] for parent in graph_collection.find({"_id": {"$in": parent_ids}}, {"_id": 1})
+	}
+
+	statuses = [{"_id": process["_id"], "status": "created"} for process in new_process_dicts]
+	insertable = []
+	for index, process in enumerate(new_process_dicts):
+		if process["parent_graph"] in existing_parents:
+			insertable.append(index)
+		else:
+			statuses[index].update(status="failed", detail="parent graph not found")
+
+	# add data to the stack
+	if insertable:
+		try:
+			process_collection.insert_many(
+				[new_process_dicts[index] for index in insertable], ordered=ordered
+			)
+		except BulkWriteError as error:
+			failed = {write_error["index"]: write_error["errmsg"] for write_error in error.details["writeErrors"]}
+			for position, index in enumerate(insertable):
+				if position in failed:
+					statuses[index].update(status="failed", detail=failed[position])
+				elif ordered and position > min(failed):
+					statuses[index].update(status="failed", detail="not attempted after earlier failure")
+
+	# extend each parent's process list in input order
+	children = {}
+	created = []
+	for index in insertable:
+		if statuses[index]["status"] == "created":
+			process = new_process_dicts[index]
+			children.setdefault(process["parent_graph"], []).append(process["_id"])
+			created.append((None, process))
+
+	if children:
+		time_stamp = datetime.utcnow()
+		graph_collection.bulk_write([
+			UpdateOne(
+				{"_id": parent_id},
+				{
+					'$push': {"process_list": process_list_push(process_ids)},
+					'$set': {"date_updated": time_stamp}
+				}
+			)
+			for parent_id, process_ids in children.items()
+		], ordered=False)
+		graph_cache.invalidate(*children)
+		_apply_summary_changes(created)
+
+	return statuses
 
 # Read Process Data 
 
-def pull_process_instance(filter):
+@timed
+def pull_process_instance(filter, projection:dict=None):
 	"""
 	Pull a specific document with specific filter.
 
 	:param filter: filter to apply to database.
+	:param projection: Fields to include or exclude, None for whole documents.
 	:return: The graph document if found, otherwise None.
 	"""
-	return process_collection.find_one(filter)
+	return process_collection.find_one(filter, projection)
 
-def pull_process_collection(filter):
+@timed
+def pull_process_collection(filter, projection:dict=None, limit:int=None, after:str=None, as_cursor=False):
 	"""
 	Pull a collection of graphs under specific filter.
 
 	:param filter: filter to apply to database.
+	:param projection: Fields to include or exclude, None for whole documents.
+	:param limit: Maximum number of documents to return, None for all.
+	:param after: Pagination token of the last document already served.
+	:param as_cursor: Return the open cursor instead of a list so it can be streamed.
 	:return: The graph document if found, otherwise None.
+	:raises QueryRejected: The filter is invalid or would scan too much of the collection.
 	"""
-	return list(process_collection.find(filter))
-
-def pull_process_id(ID:str):
+	collection, session = read_route("pull_process_collection", process_collection, analytics_process_collection)
+	# the filter comes straight from the user, so check its plan first
+	query_guard.check(collection, filter, keyset_sort(limit, after))
+	cursor = find_documents(
+		collection, filter, limit=limit, after=after, projection=projection,
+		max_time_ms=query_guard.max_time_ms, session=session
+	)
+	if as_cursor:
+		return cursor
+	return list(cursor)
+
+@timed
+def pull_process_id(ID:str, projection:dict=None):
 	"""
 	Pull a process document by its ID.
 
 	:param ID: The ID of the process document to retrieve.
+	:param projection: Fields to include or exclude, None for whole documents.
 	:return: The process document if found, otherwise None.
 	"""
-	result = process_collection.find_one({"_id" : ID})
+	if projection is None:
+		result = _cached_find_one(process_collection, process_cache, ID)
+	else:
+		result = process_collection.find_one({"_id" : ID}, projection)
 	if result:
 		return result
 
-def pull_processes_parent_graph(parent_graph:str):
+@timed
+def pull_process_ids(IDs:list, projection:dict=None):
+	"""
+	Pull process documents by their IDs with one query instead of one per ID.
+
+	:param IDs: The IDs of the process documents to retrieve.
+	:param projection: Fields to include or exclude, None for whole documents. _id is always returned.
+	:return: The process documents in the order of IDs, None for the IDs that were not found.
+	"""
+	if projection is None:
+		found = _cached_find_many(process_collection, process_cache, IDs)
+	else:
+		# the documents are matched back to the IDs by _id, so only its exclusion is
+		# dropped, {"_id": 1} alone stays a valid inclusion of nothing but the ids
+		projection = {field: value for field, value in projection.items() if field != "_id" or value} or None
+		cursor = process_collection.find({"_id" : {"$in": list(dict.fromkeys(IDs))}}, projection)
+		found = {document["_id"]: document for document in cursor}
+	return [found.get(ID) for ID in IDs]
+
+@timed
+def pull_processes_parent_graph(parent_graph:str, projection:dict=None, limit:int=None, after:str=None, as_cursor=False):
 	"""
 	Pull all process documents that derive from the parent graph.
 
 	:param data_key: The ID to the parent graph.
+	:param projection: Fields to include or exclude, None for whole documents.
+	:param limit: Maximum number of documents to return, None for all.
+	:param after: Pagination token of the last document already served.
+	:param as_cursor: Return the open cursor instead of a list so it can be streamed.
 	:return: A list of process documents that contain the specified parent.
 	"""
-	result = list(process_collection.find({"parent_graph" : parent_graph}))
+	collection, session = read_route("pull_processes_parent_graph", process_collection, analytics_process_collection)
+	cursor = find_documents(collection, {"parent_graph" : parent_graph}, limit=limit, after=after, projection=projection, session=session)
+	if as_cursor:
+		return cursor
+	result = list(cursor)
 	if result:
 		return result
 
-def pull_processes_data_type(data_key:str):
+@timed
+def pull_processes_data_type(data_key:str, projection:dict=None, limit:int=None, after:str=None, as_cursor=False):
 	"""
 	Pull all process documents that contain a specific key in the elastic_data_paths dictionary.
 
 	:param data_key: The key to search for in the elastic_data_paths dictionary.
+	:param projection: Fields to include or exclude, None for whole documents.
+	:param limit: Maximum number of documents to return, None for all.
+	:param after: Pagination token of the last document already served.
+	:param as_cursor: Return the open cursor instead of a list so it can be streamed.
 	:return: A list of process documents that contain the specified key.
+	:raises ValueError: The data key is empty, holds a "." or starts with "$".
 	"""
+	if not data_key or "." in data_key or data_key.startswith("$"):
+		raise ValueError(f"invalid data key '{data_key}'")
+
+	# answered by the wildcard index on elastic_data_paths
 	query = {
 		f"elastic_data_paths.{data_key}": {"$exists": True}
 	}
-	print(query)
-	result = list(process_collection.find(query))
+	collection, session = read_route("pull_processes_data_type", process_collection, analytics_process_collection)
+	cursor = find_documents(collection, query, limit=limit, after=after, projection=projection, session=session)
+	if as_cursor:
+		return cursor
+	result = list(cursor)
 
 	if result:
 		return result
 
-def pull_processes_file_location_type(file_location_type:str):
+@timed
+def pull_data_key_catalog():
+	"""
+	Pull the data keys held by the processes, read from the data key catalog.
+
+	:return: A list of data keys with the number of processes holding them, most used first.
+	"""
+	cursor = catalog_collection.find({"process_count" : {"$gt" : 0}}).sort([("process_count", DESCENDING), ("_id", ASCENDING)])
+	return [
+		{"data_key" : entry["_id"], "process_count" : entry["process_count"]}
+		for entry in cursor
+	]
+
+@timed
+def pull_processes_file_location_type(file_location_type:str, projection:dict=None, limit:int=None, after:str=None, as_cursor=False):
 	"""
 	Pull all process data contained in a catigory of file location
 
 	:param file_location: process location type (embedded, digs_local, pool).
+	:param projection: Fields to include or exclude, None for whole documents.
+	:param limit: Maximum number of documents to return, None for all.
+	:param after: Pagination token of the last document already served.
+	:param as_cursor: Return the open cursor instead of a list so it can be streamed.
 	:return: A list of process documents stored in a storage catigory.
 	"""
-	result = list(process_collection.find({"file_location_type" : file_location_type}))
+	collection, session = read_route("pull_processes_file_location_type", process_collection, analytics_process_collection)
+	cursor = find_documents(collection, {"file_location_type" : file_location_type}, limit=limit, after=after, projection=projection, session=session)
+	if as_cursor:
+		return cursor
+	result = list(cursor)
+	if result:
+		return result
+
+@timed
+def pull_processes_data_path(data_path:str, projection:dict=None, limit:int=None, after:str=None, as_cursor=False):
+	"""
+	Pull all processes whose elastic_data_paths reference a file, through
+	the multikey index on data_paths (see data_paths.py).
+
+	:param data_path: The file path, e.g. /some_path1.pdb.
+	:param projection: Fields to include or exclude, None for whole documents.
+	:param limit: Maximum number of documents to return, None for all.
+	:param after: Pagination token of the last document already served.
+	:param as_cursor: Return the open cursor instead of a list so it can be streamed.
+	:return: A list of process documents referencing the file.
+	"""
+	collection, session = read_route("pull_processes_data_path", process_collection, analytics_process_collection)
+	cursor = find_documents(collection, {DATA_PATHS_FIELD : data_path}, limit=limit, after=after, projection=projection, session=session)
+	if as_cursor:
+		return cursor
+	result = list(cursor)
 	if result:
 		return result
 
 
+# Analytics
+
+@timed
+def aggregate_graph_collection(pipeline:list):
+	"""
+	Run an analytics aggregation over the graph collection, see analytics.py.
+
+	:param pipeline: The aggregation pipeline.
+	:return: The open cursor over the results so it can be streamed.
+	"""
+	collection, session = read_route("aggregate_graph_collection", graph_collection, analytics_graph_collection)
+	# group stages may exceed the 100MB stage limit on large collections
+	return collection.aggregate(pipeline, allowDiskUse=True, maxTimeMS=analytics_max_time_ms, session=session)
+
+@timed
+def aggregate_process_collection(pipeline:list):
+	"""
+	Run an analytics aggregation over the process collection, see analytics.py.
+
+	:param pipeline: The aggregation pipeline.
+	:return: The open cursor over the results so it can be streamed.
+	"""
+	collection, session = read_route("aggregate_process_collection", process_collection, analytics_process_collection)
+	return collection.aggregate(pipeline, allowDiskUse=True, maxTimeMS=analytics_max_time_ms, session=session)
+
+
 # Update Process Data 
 
+@timed
 def update_process_meta_data(update_id:str, meta_data:dict):
 	"""
 	Update the metadata of a process document.
@@ -413,9 +1065,12 @@ def update_process_meta_data(update_id:str, meta_data:dict):
 			}}
 		)
 
+	process_cache.invalidate(update_id)
+
 	if result.modified_count > 0:
 		return f"item '{update_id}' modified with supplied meta data"
 
+@timed
 def update_process_elastic_data_paths(update_id:str, elastic_data_paths:dict):
 	"""
 	Update the elastic data paths of a process document.
@@ -427,18 +1082,24 @@ def update_process_elastic_data_paths(update_id:str, elastic_data_paths:dict):
 	# generate timestamp
 	time_stamp = datetime.utcnow()
 
-	# update database
-	result = process_collection.update_one(
+	# update database, the previous values keep the graph summary in step
+	before = process_collection.find_one_and_update(
 			{"_id":update_id}, 
 			{'$set': {
 				"elastic_data_paths":elastic_data_paths,
+				"data_paths":flatten_data_paths(elastic_data_paths),
 				"date_updated":time_stamp
-			}}
+			}},
+			projection=SUMMARY_PROJECTION
 		)
 
-	if result.modified_count > 0:
+	process_cache.invalidate(update_id)
+
+	if before:
+		_apply_summary_changes([(before, {**before, "elastic_data_paths":elastic_data_paths})])
 		return f"item '{update_id}' modified with supplied meta data"
 
+@timed
 def update_process_file_location_type(update_id:str, file_location_type:str):
 	"""
 	Update the file location type of a process document.
@@ -450,24 +1111,151 @@ def update_process_file_location_type(update_id:str, file_location_type:str):
 	# generate timestamp
 	time_stamp = datetime.utcnow()
 
-	# update database
-	result = process_collection.update_one(
+	# update database, the previous values keep the graph summary in step
+	before = process_collection.find_one_and_update(
 			{"_id":update_id}, 
 			{'$set': {
 				"file_location_type":file_location_type,
 				"date_updated":time_stamp
-			}}
+			}},
+			projection=SUMMARY_PROJECTION
 		)
 
-	if result.modified_count > 0:
+	process_cache.invalidate(update_id)
+
+	if before:
+		_apply_summary_changes([(before, {**before, "file_location_type":file_location_type})])
 		return f"item '{update_id}' modified with supplied meta data"
 
+def _summary_update_filter(before:dict):
+	"""
+	:param before: A process read with SUMMARY_PROJECTION.
+	:return: A filter matching the process only while its summary fields
+	         still hold the values read, missing fields match as None.
+	"""
+	return {"_id": before["_id"], **{field: before.get(field) for field in SUMMARY_PROJECTION}}
+
+def _update_summary_chunk(chunk:list, session=None, attempts:int=3):
+	"""
+	Apply a chunk of process updates that change summary fields with
+	bulk_write and add the changes to the summary counts. The previous
+	values come from one batched read, each UpdateOne only matches while
+	the process still holds them. Inside a transaction every update
+	matches, outside of one the updates overtaken by a concurrent write
+	are read again and resent, and the few still left after that are
+	applied with find_one_and_update.
+
+	:param chunk: list of dictionaries holding update_id and the process fields to set.
+	:param session: Optional session whose transaction the chunk runs in.
+	:param attempts: Number of conditional bulk_write rounds.
+	:return: The number of processes updated and the ids not found.
+	"""
+	pending = {update["update_id"]: {key: value for key, value in update.items() if key != "update_id"} for update in chunk}
+	updated, not_found = 0, []
+
+	for _ in range(attempts):
+		# Mongo keeps milliseconds, the rounded stamp helps find the updates that matched
+		time_stamp = datetime.utcnow()
+		time_stamp = time_stamp.replace(microsecond=time_stamp.microsecond // 1000 * 1000)
+
+		before = {
+			process["_id"]: process for process in
+			process_collection.find({"_id": {"$in": list(pending)}}, SUMMARY_PROJECTION, session=session)
+		}
+		not_found.extend(ID for ID in pending if ID not in before)
+		pending = {ID: fields for ID, fields in pending.items() if ID in before}
+		if not pending:
+			break
+
+		result = process_collection.bulk_write([
+			UpdateOne(_summary_update_filter(before[ID]), {'$set': {**fields, "date_updated": time_stamp}})
+			for ID, fields in pending.items()
+		], ordered=False, session=session)
+		if result.matched_count == len(pending):
+			matched = set(pending)
+		else:
+			# an update matched when the process holds its stamp and values, a
+			# concurrent write in the same millisecond with the same values is
+			# the only case left for the summary rebuild in graph_summary.py
+			matched = {
+				process["_id"] for process in
+				process_collection.find(
+					{"_id": {"$in": list(pending)}, "date_updated": time_stamp},
+					{**SUMMARY_PROJECTION, "date_updated": 1}, session=session
+				)
+				if all(process.get(field) == value for field, value in pending[process["_id"]].items() if field in SUMMARY_PROJECTION)
+			}
+
+		_apply_summary_changes([(before[ID], {**before[ID], **pending[ID]}) for ID in matched], session=session)
+		updated += len(matched)
+		pending = {ID: fields for ID, fields in pending.items() if ID not in matched}
+		if not pending:
+			break
+
+	# processes written to in every round, update them one by one
+	for ID, fields in pending.items():
+		before = process_collection.find_one_and_update(
+			{"_id": ID},
+			{'$set': {**fields, "date_updated": datetime.utcnow()}},
+			projection=SUMMARY_PROJECTION,
+			session=session
+		)
+		if before is None:
+			not_found.append(ID)
+			continue
+		_apply_summary_changes([(before, {**before, **fields})], session=session)
+		updated += 1
+	return updated, not_found
+
+@timed
+def update_process_documents_bulk(updates:list, chunk_size:int=1000):
+	"""
+	Update fields of many process documents at once, for example
+	relabelling file_location_type after a storage migration. Updates
+	changing file_location_type or elastic_data_paths also move the
+	graph summary and data key catalog counts, they are sent per chunk
+	inside a transaction when the deployment supports one and as
+	conditional updates otherwise, see _update_summary_chunk.
+
+	:param updates: list of dictionaries holding update_id and the process fields to set.
+	:param chunk_size: number of updates sent per bulk_write.
+	:return: A summary with the matched and modified counts and the ids not found.
+	"""
+	updates = [with_data_paths(update) for update in updates]
+
+	summary_updates = [
+		update for update in updates
+		if "file_location_type" in update or "elastic_data_paths" in update
+	]
+	result = _bulk_update_fields(
+		process_collection, process_cache,
+		[update for update in updates if "file_location_type" not in update and "elastic_data_paths" not in update],
+		chunk_size
+	)
+	result["requested"] = len(updates)
+
+	use_transaction = _supports_transactions()
+	for chunk in chunked(summary_updates, chunk_size):
+		if use_transaction:
+			with client.start_session() as session:
+				updated, not_found = session.with_transaction(lambda session: _update_summary_chunk(chunk, session))
+		else:
+			updated, not_found = _update_summary_chunk(chunk)
+
+		process_cache.invalidate(*[update["update_id"] for update in chunk])
+		# date_updated changes with every write, so a match is a modification
+		result["matched"] += updated
+		result["modified"] += updated
+		result["not_found"].extend(not_found)
+	return result
+
 # Delete Process Data 
 
+@timed
 def delete_process(id:str):
 	"""
 	Delete a process document by its unique identifier and remove it from
-	parent list
+	parent list with a server side $pull.
 
 	:param id: The unique identifier of the process document to delete.
 	:return: A message indicating the outcome of the deletion operation.
@@ -475,24 +1263,28 @@ def delete_process(id:str):
 	# generate timestamp
 	time_stamp = datetime.utcnow()
 
-	# find parent list and remove this id from parent if it exists
-	process_data = pull_process_id(id)
+	# delete the process and remove this id from its parent if it existed
+	process_data = process_collection.find_one_and_delete(
+			{"_id" : f"{id}"},
+			projection=SUMMARY_PROJECTION
+		)
 	if process_data:
-		parent_graph_data = pull_graph_id(process_data["parent_graph"])
-		process_list = parent_graph_data["process_list"]
-		process_list.remove(id)
+		_apply_summary_changes([(process_data, None)])
 		list_modified_result = graph_collection.update_one(
-				{"_id":process_data["parent_graph"]}, 
-				{'$set': {
-					"process_list":process_list,
-					"date_updated":time_stamp
-				}}
+				{"_id":process_data["parent_graph"]},
+				{
+					'$pull': {"process_list":id},
+					'$set': {"date_updated":time_stamp}
+				}
 			)
 
-		result = process_collection.delete_one({"_id" : f"{id}"})
-		if result.deleted_count > 0 and list_modified_result.modified_count > 0:
+		process_cache.invalidate(id)
+		graph_cache.invalidate(process_data["parent_graph"])
+
+		if list_modified_result.modified_count > 0:
 			return f"item '{id}' deleted"
 
+@timed
 def delete_all_from_parent_graph(parent_graph:str):
 	"""
 	Delete all process documents associated with a specific parent graph.
@@ -500,9 +1292,114 @@ def delete_all_from_parent_graph(parent_graph:str):
 	:param parent_graph: The identifier of the parent graph whose associated process documents will be deleted.
 	:return: A message indicating the outcome of the deletion operation.
 	"""
+	summary = summary_collection.find_one({"_id" : parent_graph}, {"data_keys" : 1})
 	result = process_collection.delete_many({"parent_graph" : f"{parent_graph}"})
+	process_cache.invalidate_where(lambda process: process.get("parent_graph") == parent_graph)
+	rebuild_graph_summaries([parent_graph])
+	if summary and result.deleted_count > 0:
+		operations = catalog_removals(summary)
+		if operations:
+			catalog_collection.bulk_write(operations, ordered=False)
 	if result.deleted_count > 0:
 		return f"items under '{parent_graph}' graph deleted"
 
 
 
+
+# Transfer Graph Data
+
+@timed
+def export_graph(ID:str, batch_size:int=1000):
+	"""
+	Read a graph and all of its processes for an export, see graph_transfer.py.
+
+	:param ID: The unique identifier of the graph document.
+	:param batch_size: Number of processes fetched per cursor batch.
+	:return: An iterator over the graph document followed by its processes in
+	         creation order, None if the graph does not exist.
+	"""
+	graph = graph_collection.find_one({"_id" : ID})
+	if not graph:
+		return None
+
+	# served by the parent_graph index, the cursor holds one batch at a time
+	processes = process_collection.find({"parent_graph" : ID}).sort(
+		[("date_created", ASCENDING), ("_id", ASCENDING)]
+	).batch_size(batch_size)
+	return itertools.chain([graph], processes)
+
+@timed
+def import_graph(documents, batch_size:int=1000):
+	"""
+	Load a graph and its processes from an export, see graph_transfer.py.
+	The processes are written with one insert_many per batch before the
+	graph, so the graph only appears once all of its processes are stored.
+	When a write fails the processes this import wrote are deleted again.
+
+	:param documents: Iterator over the graph document followed by its processes.
+	:param batch_size: Number of processes per insert_many.
+	:return: The id of the imported graph and its number of processes,
+	         None when the graph already exists.
+	:raises ValueError: The export does not start with a graph or holds a
+	                    process of another graph.
+	"""
+	documents = iter(documents)
+	graph = next(documents, None)
+	if not graph or "_id" not in graph or "process_list" not in graph:
+		raise ValueError("the export must start with a graph document")
+	if graph_collection.find_one({"_id" : graph["_id"]}, {"_id" : 1}):
+		return None
+
+	# ids of the processes this call wrote, the rollback only touches those.
+	# A batch that failed without a write report may be partly written, its
+	# ids are kept apart since they were never added to the summary counts
+	inserted_ids, uncounted_ids = [], []
+
+	def record(processes):
+		inserted_ids.extend(process["_id"] for process in processes)
+		_apply_summary_changes([(None, process) for process in processes])
+
+	try:
+		while True:
+			batch = [with_data_paths(process) for process in itertools.islice(documents, batch_size)]
+			if not batch:
+				break
+			if any(process.get("parent_graph") != graph["_id"] for process in batch):
+				raise ValueError(f"the export holds processes of graphs other than '{graph['_id']}'")
+
+			try:
+				process_collection.insert_many(batch, ordered=False)
+			except BulkWriteError as error:
+				failed = {write_error["index"] for write_error in error.details["writeErrors"]}
+				record([process for index, process in enumerate(batch) if index not in failed])
+				raise
+			except Exception:
+				uncounted_ids.extend(process["_id"] for process in batch)
+				raise
+			record(batch)
+
+		graph_collection.insert_one(graph)
+	except Exception:
+		_rollback_import(inserted_ids, uncounted_ids)
+		raise
+	return {"_id" : graph["_id"], "processes" : len(inserted_ids)}
+
+def _rollback_import(inserted_ids:list, uncounted_ids:list, chunk_size:int=1000):
+	"""
+	Delete the processes written by a failed import and take them off the
+	graph summary and the data key catalog.
+
+	:param inserted_ids: The ids of the processes the import wrote and counted.
+	:param uncounted_ids: The ids of a batch that may be partly written, not counted.
+	:param chunk_size: Number of ids deleted per delete_many.
+	"""
+	changes = []
+	for ID in inserted_ids:
+		process = process_collection.find_one_and_delete({"_id" : ID}, projection=SUMMARY_PROJECTION)
+		if process:
+			changes.append((process, None))
+	_apply_summary_changes(changes)
+
+	for chunk in chunked(uncounted_ids, chunk_size):
+		process_collection.delete_many({"_id" : {"$in" : chunk}})
+	process_cache.invalidate(*inserted_ids, *uncounted_ids)
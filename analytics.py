@@ -0,0 +1,138 @@
+"""
+-------------------------------------------------------------------
+This is a Goldfish Project File
+
+Authors: Max Witwer, Jie Chen, Elliott Cole
+Collaboration with the Baker Lab
+
+This file was generated during an internship at the institute for
+protein design
+
+Description:
+This file contains the aggregation pipelines behind the analytics
+endpoints: group-by counts over document fields, time bucket
+histograms of date_created/date_updated and the distinct values of
+an elastic_data_paths key. The reduction runs inside Mongo with
+allowDiskUse and the results are streamed to the client, instead of
+the client downloading whole collections to count them.
+
+Configuration (environment variables):
+    ANALYTICS_MAX_TIME_MS   server side time limit per pipeline (default 60000)
+
+
+Date: 07/06/2024
+-------------------------------------------------------------------
+"""
+
+from dotenv import load_dotenv
+import os
+
+import re
+
+# load environmental varibles from ".env" file
+load_dotenv()
+
+analytics_max_time_ms = int(os.getenv('ANALYTICS_MAX_TIME_MS', '60000'))
+
+# dotted field paths without operators, e.g. meta_data.tool
+FIELD_PATH = re.compile(r"^[A-Za-z0-9_\-]+(\.[A-Za-z0-9_\-]+)*$")
+
+MAX_GROUP_FIELDS = 5
+
+DATE_FIELDS = ("date_created", "date_updated")
+TIME_UNITS = ("minute", "hour", "day", "week", "month", "year")
+
+
+def _check_field_path(field:str):
+	if not FIELD_PATH.match(field):
+		raise ValueError(f"invalid field '{field}'")
+
+
+def group_count_pipeline(fields:list, filter:dict=None, limit:int=None):
+	"""
+	Count documents per combination of field values, largest groups first.
+	Every result looks like {"group": {"file_location_type": "pool"}, "count": 12}.
+
+	:param fields: Dotted field paths to group by.
+	:param filter: Filter selecting the documents to count, None for all.
+	:param limit: Maximum number of groups returned, None for all.
+	:return: The aggregation pipeline.
+	:raises ValueError: No, too many or invalid fields were given.
+	"""
+	if not fields or len(fields) > MAX_GROUP_FIELDS:
+		raise ValueError(f"group by 1 to {MAX_GROUP_FIELDS} fields")
+	for field in fields:
+		_check_field_path(field)
+
+	pipeline = [
+		{"$match": filter or {}},
+		# positional keys, dotted paths are not valid field names here
+		{"$group": {"_id": {f"f{index}": f"${field}" for index, field in enumerate(fields)}, "count": {"$sum": 1}}},
+		{"$sort": {"count": -1, "_id": 1}},
+	]
+	if limit:
+		pipeline.append({"$limit": limit})
+	pipeline.append({"$project": {
+		"_id": 0,
+		"group": {"$arrayToObject": [[
+			{"k": field, "v": f"$_id.f{index}"} for index, field in enumerate(fields)
+		]]},
+		"count": 1
+	}})
+	return pipeline
+
+
+def date_histogram_pipeline(field:str="date_created", unit:str="day", bin_size:int=1, filter:dict=None):
+	"""
+	Count documents per time bucket of a date field, oldest bucket first.
+	Every result looks like {"bucket": datetime, "count": 12}.
+
+	:param field: date_created or date_updated.
+	:param unit: Bucket unit, one of TIME_UNITS.
+	:param bin_size: Number of units per bucket.
+	:param filter: Filter selecting the documents to count, None for all.
+	:return: The aggregation pipeline.
+	:raises ValueError: The field, unit or bin size is not supported.
+	"""
+	if field not in DATE_FIELDS:
+		raise ValueError(f"field must be one of {', '.join(DATE_FIELDS)}")
+	if unit not in TIME_UNITS:
+		raise ValueError(f"unit must be one of {', '.join(TIME_UNITS)}")
+	if bin_size < 1:
+		raise ValueError("bin_size must be at least 1")
+
+	return [
+		{"$match": {"$and": [filter or {}, {field: {"$type": "date"}}]}},
+		{"$group": {
+			"_id": {"$dateTrunc": {"date": f"${field}", "unit": unit, "binSize": bin_size}},
+			"count": {"$sum": 1}
+		}},
+		{"$sort": {"_id": 1}},
+		{"$project": {"_id": 0, "bucket": "$_id", "count": 1}},
+	]
+
+
+def data_values_pipeline(data_key:str, filter:dict=None, limit:int=None):
+	"""
+	Distinct values stored under one elastic_data_paths key with the number
+	of processes holding each. Every result looks like {"value": "/a.pdb", "count": 1}.
+
+	:param data_key: The elastic_data_paths key, e.g. pdb.
+	:param filter: Filter selecting the processes, None for all.
+	:param limit: Maximum number of values returned, None for all.
+	:return: The aggregation pipeline.
+	:raises ValueError: The key is not a plain field name.
+	"""
+	_check_field_path(data_key)
+	path = f"elastic_data_paths.{data_key}"
+
+	pipeline = [
+		{"$match": {"$and": [filter or {}, {path: {"$exists": True}}]}},
+		{"$unwind": f"${path}"},
+		{"$group": {"_id": f"${path}", "count": {"$sum": 1}}},
+		{"$sort": {"_id": 1}},
+	]
+	if limit:
+		pipeline.append({"$limit": limit})
+	pipeline.append({"$project": {"_id": 0, "value": "$_id", "count": 1}})
+	return pipeline
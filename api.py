@@ -18,9 +18,14 @@ Date: 07/06/2024
 
 from fastapi import FastAPI, HTTPException
 from CRUD_utils import *
-import json 
+import json
+import os
 
 from routes.crud import crud_router
+from index_manager import bootstrap_indexes
+from change_stream_watcher import start_change_stream_watcher
+from metrics import metrics_middleware
+from read_routing import causal_read_middleware
 
 # meta data for autodocumentation
 tags_metadata = [
@@ -63,6 +68,18 @@ tags_metadata = [
     {
         "name": "Process Create Operations",
         "description": "Endpoints relating to creation of process documents",
+    },
+    {
+        "name": "Analytics Operations",
+        "description": "Endpoints that stream counts aggregated on the database server",
+    },
+    {
+        "name": "Transfer Operations",
+        "description": "Endpoints that export and import whole graphs with their processes",
+    },
+    {
+        "name": "Service Operations",
+        "description": "Endpoints that report on the state of the service itself",
     }
 ]
 docs_text = open('display_text.txt', 'r').read()
@@ -78,3 +95,34 @@ app = FastAPI(
 # include the router
 app.include_router(crud_router)
 
+# keep reads that follow a write on the primary, see read_routing.py
+app.middleware("http")(causal_read_middleware)
+
+# record route latency and Mongo round trips for /metrics
+app.middleware("http")(metrics_middleware)
+
+@app.on_event("startup")
+def startup_index_bootstrap():
+    """
+    Make sure the indexes the CRUD queries rely on exist before serving.
+    INDEX_BOOTSTRAP selects "create" (default), "check" or "off".
+    """
+    bootstrap_indexes(os.getenv('INDEX_BOOTSTRAP', 'create'))
+
+@app.on_event("startup")
+def startup_change_stream_watcher():
+    """
+    Keep the local document caches in line with writes made by other
+    workers. CHANGE_STREAM_CACHE selects "off" (default), "invalidate"
+    or "refresh".
+    """
+    app.state.change_stream_watcher = start_change_stream_watcher(os.getenv('CHANGE_STREAM_CACHE', 'off'))
+
+@app.on_event("shutdown")
+def shutdown_change_stream_watcher():
+    """
+    Stop the change stream watcher if one is running.
+    """
+    watcher = getattr(app.state, "change_stream_watcher", None)
+    if watcher:
+        watcher.stop()
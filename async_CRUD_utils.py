@@ -0,0 +1,909 @@
+"""
+-------------------------------------------------------------------
+This is a Goldfish Project File
+
+Authors: Max Witwer, Jie Chen, Elliott Cole
+Collaboration with the Baker Lab
+
+This file was generated during an internship at the institute for
+protein design
+
+Description:
+This file contains the async versions of the database CRUD
+opperations found in CRUD_utils.py. It uses the Motor driver so
+that the FastAPI endpoints can await the database instead of
+blocking the event loop while a query is running. Every function
+mirrors its CRUD_utils counterpart in name, arguments and return
+values so the two backends can be swapped freely. Functions without
+an async version here, such as the batched cascade in delete_graph,
+are run from the threadpool by the router instead.
+
+
+Date: 07/06/2024
+-------------------------------------------------------------------
+"""
+
+from dotenv import load_dotenv
+import os
+
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING
+
+# Append the path to the schemas directory
+import sys
+sys.path.append("./db_schemas")
+
+from document_cache import graph_cache, process_cache
+from query_guard import query_guard
+from metrics import timed
+from db_connection import LazyHandle, get_async_client, get_async_database, lazy_collection
+from read_routing import analytics_read_preference, read_route_async
+from graph_summary import (
+	SUMMARY_PROJECTION, catalog_operations, catalog_rebuild_pipeline, catalog_removals, empty_summary,
+	rebuild_pipeline, rebuild_timestamp, stale_summary_filter, summary_operations, without_zero_counts
+)
+from analytics import analytics_max_time_ms
+from data_paths import DATA_PATHS_FIELD, flatten_data_paths, with_data_paths
+from search import next_search_token, search_plan
+from query_utils import find_documents, keyset_sort, lineage_pipeline, process_list_push
+
+# load environmental varibles from ".env" file
+load_dotenv()
+
+# create database objs, the client connects on first use (see db_connection.py)
+
+client = LazyHandle(get_async_client)
+db = LazyHandle(get_async_database)
+graph_collection = lazy_collection("graph_map", get_async_database)
+process_collection = lazy_collection("process_step", get_async_database)
+summary_collection = lazy_collection("graph_summary", get_async_database)
+catalog_collection = lazy_collection("data_key_catalog", get_async_database)
+
+# secondary reads for the analytics policy, see read_routing.py
+analytics_graph_collection = lazy_collection("graph_map", get_async_database, analytics_read_preference())
+analytics_process_collection = lazy_collection("process_step", get_async_database, analytics_read_preference())
+
+# Cached Lookups
+
+async def _cached_find_one(collection, cache, ID:str):
+	"""
+	Read-through lookup of a whole document by its ID.
+
+	:param collection: The collection holding the document.
+	:param cache: The DocumentCache in front of the collection.
+	:param ID: The ID of the document to retrieve.
+	:return: The document if found, otherwise None.
+	"""
+	result = cache.get(ID)
+	if result is None:
+		version = cache.version()
+		result = await collection.find_one({"_id" : ID})
+		if result:
+			cache.set(ID, result, version)
+	return result
+
+async def _cached_find_many(collection, cache, IDs:list):
+	"""
+	Read-through lookup of whole documents by their IDs. The cache misses
+	are read with a single $in query.
+
+	:param collection: The collection holding the documents.
+	:param cache: The DocumentCache in front of the collection.
+	:param IDs: The IDs of the documents to retrieve.
+	:return: A dictionary from ID to document for the IDs that were found.
+	"""
+	found = {}
+	for ID in IDs:
+		document = cache.get(ID)
+		if document is not None:
+			found[ID] = document
+
+	missing = [ID for ID in dict.fromkeys(IDs) if ID not in found]
+	if missing:
+		version = cache.version()
+		async for document in collection.find({"_id" : {"$in": missing}}):
+			cache.set(document["_id"], document, version)
+			found[document["_id"]] = document
+	return found
+
+# Graph Summaries
+
+async def _apply_summary_changes(changes:list):
+	"""
+	Apply process changes to the graph summaries and the data key catalog,
+	with one bulk_write each.
+
+	:param changes: list of (before, after) process documents, see summary_operations.
+	"""
+	operations = summary_operations(changes)
+	if operations:
+		await summary_collection.bulk_write(operations, ordered=False)
+	operations = catalog_operations(changes)
+	if operations:
+		await catalog_collection.bulk_write(operations, ordered=False)
+
+@timed
+async def rebuild_graph_summaries(graph_ids:list=None):
+	"""
+	Recompute graph summaries from the process collection on the server
+	and remove the summaries of graphs left without processes.
+
+	:param graph_ids: The graphs to rebuild, None for every graph.
+	:return: The number of summaries rebuilt and removed.
+	"""
+	rebuilt_at = rebuild_timestamp()
+	pipeline = rebuild_pipeline(process_collection.name, summary_collection.name, rebuilt_at, graph_ids)
+	await process_collection.aggregate(pipeline, allowDiskUse=True).to_list(length=None)
+
+	rebuilt_filter = {"date_updated": rebuilt_at}
+	if graph_ids is not None:
+		rebuilt_filter["_id"] = {"$in": graph_ids}
+	removed = await summary_collection.delete_many(stale_summary_filter(rebuilt_at, graph_ids))
+	return {
+		"rebuilt": await summary_collection.count_documents(rebuilt_filter),
+		"removed": removed.deleted_count,
+	}
+
+@timed
+async def rebuild_data_key_catalog():
+	"""
+	Recompute the data key catalog from the process collection on the
+	server and remove the keys no process holds anymore.
+
+	:return: The number of keys rebuilt and removed.
+	"""
+	rebuilt_at = rebuild_timestamp()
+	pipeline = catalog_rebuild_pipeline(catalog_collection.name, rebuilt_at)
+	await process_collection.aggregate(pipeline, allowDiskUse=True).to_list(length=None)
+
+	removed = await catalog_collection.delete_many({"date_updated": {"$lt": rebuilt_at}})
+	return {
+		"rebuilt": await catalog_collection.count_documents({"date_updated": rebuilt_at}),
+		"removed": removed.deleted_count,
+	}
+
+# Create Graph Data
+
+@timed
+async def create_graph_document(new_graph_dict:dict):
+	"""
+	Create a dictionary in new graph_map.
+
+	:new_graph_dict: dictionary containing document info.
+	:return: The produced graph echoed back, built from the inserted payload.
+	"""
+	result = await graph_collection.insert_one(new_graph_dict)
+
+	# the inserted payload already is the stored document, echo it back
+	if result.inserted_id:
+		return new_graph_dict
+
+# Read Graph Data
+
+@timed
+async def pull_graph_instance(filter, projection:dict=None):
+	"""
+	Pull a specific document with specific filter.
+
+	:param filter: filter to apply to database.
+	:param projection: Fields to include or exclude, None for whole documents.
+	:return: The graph document if found, otherwise None.
+	"""
+	return await graph_collection.find_one(filter, projection)
+
+@timed
+async def pull_graph_collection(filter, projection:dict=None, limit:int=None, after:str=None, as_cursor=False):
+	"""
+	Pull a collection of graphs under specific filter.
+
+	:param filter: filter to apply to database.
+	:param projection: Fields to include or exclude, None for whole documents.
+	:param limit: Maximum number of documents to return, None for all.
+	:param after: Pagination token of the last document already served.
+	:param as_cursor: Return the open cursor instead of a list so it can be streamed.
+	:return: The graph document if found, otherwise None.
+	:raises QueryRejected: The filter is invalid or would scan too much of the collection.
+	"""
+	collection, session = await read_route_async("pull_graph_collection", graph_collection, analytics_graph_collection)
+	# the filter comes straight from the user, so check its plan first
+	await query_guard.check_async(collection, filter, keyset_sort(limit, after))
+	cursor = find_documents(
+		collection, filter, limit=limit, after=after, projection=projection,
+		max_time_ms=query_guard.max_time_ms, session=session
+	)
+	if as_cursor:
+		return cursor
+	return await cursor.to_list(length=None)
+
+@timed
+async def pull_graph_id(ID:str, projection:dict=None):
+	"""
+	Pull a graph document by its ID.
+
+	:param ID: The ID of the graph document to retrieve.
+	:param projection: Fields to include or exclude, None for whole documents.
+	:return: The graph document if found, otherwise None.
+	"""
+	if projection is None:
+		result = await _cached_find_one(graph_collection, graph_cache, ID)
+	else:
+		result = await graph_collection.find_one({"_id" : ID}, projection)
+	if result:
+		return result
+
+@timed
+async def pull_graph_ids(IDs:list, projection:dict=None):
+	"""
+	Pull graph documents by their IDs with one query instead of one per ID.
+
+	:param IDs: The IDs of the graph documents to retrieve.
+	:param projection: Fields to include or exclude, None for whole documents. _id is always returned.
+	:return: The graph documents in the order of IDs, None for the IDs that were not found.
+	"""
+	if projection is None:
+		found = await _cached_find_many(graph_collection, graph_cache, IDs)
+	else:
+		# the documents are matched back to the IDs by _id, so only its exclusion is
+		# dropped, {"_id": 1} alone stays a valid inclusion of nothing but the ids
+		projection = {field: value for field, value in projection.items() if field != "_id" or value} or None
+		cursor = graph_collection.find({"_id" : {"$in": list(dict.fromkeys(IDs))}}, projection)
+		found = {document["_id"]: document async for document in cursor}
+	return [found.get(ID) for ID in IDs]
+
+@timed
+async def pull_graph_project_name(name:str, projection:dict=None):
+	"""
+	Pull a graph document by its project name.
+
+	:param name: The project name of the graph document to retrieve.
+	:param projection: Fields to include or exclude, None for whole documents.
+	:return: The graph document if found, otherwise None.
+	"""
+	result = await graph_collection.find_one({"project_name" : name}, projection)
+	if result:
+		return result
+
+@timed
+async def pull_graphs_owner(owner:str, projection:dict=None, limit:int=None, after:str=None, as_cursor=False):
+	"""
+	Pull all graph documents by the owner's name.
+
+	:param owner: The name of the owner.
+	:param projection: Fields to include or exclude, None for whole documents.
+	:param limit: Maximum number of documents to return, None for all.
+	:param after: Pagination token of the last document already served.
+	:param as_cursor: Return the open cursor instead of a list so it can be streamed.
+	:return: A list of graph documents owned by the specified owner.
+	"""
+	collection, session = await read_route_async("pull_graphs_owner", graph_collection, analytics_graph_collection)
+	cursor = find_documents(collection, {"owner" : owner}, limit=limit, after=after, projection=projection, session=session)
+	if as_cursor:
+		return cursor
+	result = await cursor.to_list(length=None)
+	if result:
+		return result
+
+@timed
+async def pull_graphs_email(email:str, projection:dict=None, limit:int=None, after:str=None, as_cursor=False):
+	"""
+	Pull all graph documents by the owner's email.
+
+	:param email: The email of the owner.
+	:param projection: Fields to include or exclude, None for whole documents.
+	:param limit: Maximum number of documents to return, None for all.
+	:param after: Pagination token of the last document already served.
+	:param as_cursor: Return the open cursor instead of a list so it can be streamed.
+	:return: A list of graph documents owned by the specified email.
+	"""
+	collection, session = await read_route_async("pull_graphs_email", graph_collection, analytics_graph_collection)
+	cursor = find_documents(collection, {"owner_email" : email}, limit=limit, after=after, projection=projection, session=session)
+	if as_cursor:
+		return cursor
+	result = await cursor.to_list(length=None)
+	if result:
+		return result
+
+@timed
+async def pull_graph_summary(ID:str):
+	"""
+	Pull the process counts of a graph from its summary document.
+
+	:param ID: The ID of the graph.
+	:return: The graph summary if the graph exists, otherwise None.
+	"""
+	result = await summary_collection.find_one({"_id" : ID})
+	if result:
+		return without_zero_counts(result)
+
+	# graphs without processes have no summary yet
+	if await graph_collection.find_one({"_id" : ID}, {"_id": 1}):
+		return empty_summary(ID)
+
+@timed
+async def pull_graph_lineage(ID:str, projection:dict=None, start:int=0, stop:int=None):
+	"""
+	Pull the process documents of a graph in process_list order with one
+	aggregation, instead of one lookup per process.
+
+	:param ID: The ID of the graph.
+	:param projection: Fields to include or exclude, None for whole documents.
+	:param start: First process_list position to return.
+	:param stop: Position to stop before, None for the end of the list.
+	:return: The process documents with their "position" if the graph exists, otherwise None.
+	:raises ValueError: If the range is empty or negative.
+	"""
+	cursor = graph_collection.aggregate(lineage_pipeline(ID, process_collection.name, start, stop, projection))
+	result = await cursor.to_list(length=None)
+	if result:
+		return result
+
+	# graphs without processes in the range
+	if await graph_collection.find_one({"_id" : ID}, {"_id": 1}):
+		return []
+
+@timed
+async def search_graphs(query:str, mode:str="text", field:str="project_name", projection:dict=None, limit:int=20, after:str=None):
+	"""
+	Search graphs by words in their project name, owner and description,
+	or by the prefix of their project name or owner, see search.py.
+
+	:param query: Words to search for in text mode, the prefix in prefix mode.
+	:param mode: "text" for ranked full text search, "prefix" for an anchored prefix match.
+	:param field: The field searched in prefix mode, project_name or owner.
+	:param projection: Fields to include or exclude, None for whole documents.
+	:param limit: Page size.
+	:param after: Pagination token of the previous page.
+	:return: The matching graphs, ranked by "score" in text mode, and the "next_after" token.
+	:raises ValueError: The mode, field, limit or token is invalid.
+	"""
+	plan = search_plan(query, mode, field, limit, after, projection)
+	collection, session = await read_route_async("search_graphs", graph_collection, analytics_graph_collection)
+	cursor = collection.find(
+		plan["filter"], plan["projection"], sort=plan["sort"], skip=plan["skip"], limit=plan["limit"],
+		max_time_ms=query_guard.max_time_ms, session=session
+	)
+	matches = await cursor.to_list(length=None)
+	return {"matches": matches, "next_after": next_search_token(matches, plan, mode, field)}
+
+# Update Graph Data
+
+@timed
+async def update_graph_process_meta_data(update_id:str, process_meta_data:dict):
+	"""
+	Update the process metadata of a graph document.
+
+	:param update_id: The unique identifier of the graph document to update.
+	:param process_meta_data: The process metadata to update in the graph document.
+	:return: A message indicating the outcome of the update operation.
+	"""
+	# generate timestamp
+	time_stamp = datetime.utcnow()
+
+	# update database
+	result = await graph_collection.update_one(
+			{"_id":update_id},
+			{'$set': {
+				"process_meta_data":process_meta_data,
+				"date_updated":time_stamp
+			}}
+		)
+
+	graph_cache.invalidate(update_id)
+
+	if result.modified_count > 0:
+		return f"item '{update_id}' modified with supplied meta data"
+
+@timed
+async def update_graph_project_name(update_id:str, project_name:str):
+	"""
+	Update the project name of a graph document.
+
+	:param update_id: The unique identifier of the graph document to update.
+	:param project_name: The new project name to update in the graph document.
+	:return: A message indicating the outcome of the update operation.
+	"""
+	# generate timestamp
+	time_stamp = datetime.utcnow()
+
+	# update database
+	result = await graph_collection.update_one(
+			{"_id":update_id},
+			{'$set': {
+				"project_name":project_name,
+				"date_updated":time_stamp
+			}}
+		)
+
+	graph_cache.invalidate(update_id)
+
+	if result.modified_count > 0:
+		return f"item '{update_id}' modified with supplied meta data"
+
+@timed
+async def update_graph_owner_email(update_id:str, owner_email:str):
+	"""
+	Update the owner email of a graph document.
+
+	:param update_id: The unique identifier of the graph document to update.
+	:param owner_email: The new owner email to update in the graph document.
+	:return: A message indicating the outcome of the update operation.
+	"""
+	# generate timestamp
+	time_stamp = datetime.utcnow()
+
+	# update database
+	result = await graph_collection.update_one(
+			{"_id":update_id},
+			{'$set': {
+				"owner_email":owner_email,
+				"date_updated":time_stamp
+			}}
+		)
+
+	graph_cache.invalidate(update_id)
+
+	if result.modified_count > 0:
+		return f"item '{update_id}' modified with supplied meta data"
+
+@timed
+async def update_graph_owner(update_id:str, owner:str):
+	"""
+	Update the owner of a graph document.
+
+	:param update_id: The unique identifier of the graph document to update.
+	:param owner: The new owner to update in the graph document.
+	:return: A message indicating the outcome of the update operation.
+	"""
+	# generate timestamp
+	time_stamp = datetime.utcnow()
+
+	# update database
+	result = await graph_collection.update_one(
+			{"_id":update_id},
+			{'$set': {
+				"owner":owner,
+				"date_updated":time_stamp
+			}}
+		)
+
+	graph_cache.invalidate(update_id)
+
+	if result.modified_count > 0:
+		return f"item '{update_id}' modified with supplied meta data"
+
+@timed
+async def update_graph_process_list_order(update_id:str, process_list:str):
+	"""
+	Update the order of the process list in a graph document. The new
+	order is only written if the stored list holds exactly the same
+	processes, checked by the server within the same atomic update so a
+	concurrent insert or delete can not be lost.
+
+	:param update_id: The unique identifier of the graph document to update.
+	:param process_list: The new order of the process list to update in the graph document.
+	:return: A message indicating the outcome of the update operation.
+	:raises ValueError: The process list holds an id more than once.
+	"""
+	# $size and $all only pin down the stored processes when the ids are distinct,
+	# a repeated id would otherwise replace another process of the graph
+	if len(set(process_list)) != len(process_list):
+		raise ValueError("the process list holds duplicate ids")
+
+	# generate timestamp
+	time_stamp = datetime.utcnow()
+
+	# $all with an empty list matches nothing, an empty list is matched by its size alone
+	stored_list = {"$size":len(process_list), "$all":process_list} if process_list else {"$size":0}
+
+	# update database only if the stored list holds the same processes
+	result = await graph_collection.update_one(
+			{
+				"_id":update_id,
+				"process_list":stored_list
+			},
+			{'$set': {
+				"process_list":process_list,
+				"date_updated":time_stamp
+			}}
+		)
+
+	graph_cache.invalidate(update_id)
+
+	if result.modified_count > 0:
+		return f"item '{update_id}' modified with supplied meta data"
+
+
+# Create Process Data
+
+@timed
+async def create_process_document(new_process_dict:dict, list_insert_location=None):
+	"""
+	Create a new process document in the collection and add the document
+	to the process list in the parent graph. If list_insert_location
+	is specified it inserts the process into the process_list at that point
+	otherwise it simply appends. The parent list is changed with a single
+	server side $push so concurrent inserts into one graph never overwrite
+	each other, and whose result also validates the parent. The response
+	is built from the inserted payload rather than read back from the
+	database, so a create costs two round trips.
+
+	:new_process_dict: dictionary containing document info.
+	:list_insert_location: integer if specifing location, none if simply appending
+	:return: The produced process echoed back otherwise nothing.
+	"""
+	# keep the path to process index in step with elastic_data_paths
+	new_process_dict = with_data_paths(new_process_dict)
+	parent_id = new_process_dict["parent_graph"]
+
+	# add data to the stack
+	result = await process_collection.insert_one(new_process_dict)
+
+	# check that worked properly
+	if result.inserted_id:
+		# generate timestamp
+		time_stamp = datetime.utcnow()
+
+		# push the new child process onto the parent process list, the
+		# update only matches if the parent exists
+		process_append_result = await graph_collection.update_one(
+					{"_id":parent_id},
+					{
+						'$push': {"process_list":process_list_push(
+							[new_process_dict["_id"]], list_insert_location
+						)},
+						'$set': {"date_updated":time_stamp}
+					}
+				)
+
+		graph_cache.invalidate(parent_id)
+
+		# validate that this worked, remove the process again if there is no parent
+		if process_append_result.modified_count == 0:
+			await process_collection.delete_one({"_id" : result.inserted_id})
+			return
+
+		await _apply_summary_changes([(None, new_process_dict)])
+
+		# echo the inserted payload back to user
+		return new_process_dict
+
+# Read Process Data
+
+@timed
+async def pull_process_instance(filter, projection:dict=None):
+	"""
+	Pull a specific document with specific filter.
+
+	:param filter: filter to apply to database.
+	:param projection: Fields to include or exclude, None for whole documents.
+	:return: The graph document if found, otherwise None.
+	"""
+	return await process_collection.find_one(filter, projection)
+
+@timed
+async def pull_process_collection(filter, projection:dict=None, limit:int=None, after:str=None, as_cursor=False):
+	"""
+	Pull a collection of graphs under specific filter.
+
+	:param filter: filter to apply to database.
+	:param projection: Fields to include or exclude, None for whole documents.
+	:param limit: Maximum number of documents to return, None for all.
+	:param after: Pagination token of the last document already served.
+	:param as_cursor: Return the open cursor instead of a list so it can be streamed.
+	:return: The graph document if found, otherwise None.
+	:raises QueryRejected: The filter is invalid or would scan too much of the collection.
+	"""
+	collection, session = await read_route_async("pull_process_collection", process_collection, analytics_process_collection)
+	# the filter comes straight from the user, so check its plan first
+	await query_guard.check_async(collection, filter, keyset_sort(limit, after))
+	cursor = find_documents(
+		collection, filter, limit=limit, after=after, projection=projection,
+		max_time_ms=query_guard.max_time_ms, session=session
+	)
+	if as_cursor:
+		return cursor
+	return await cursor.to_list(length=None)
+
+@timed
+async def pull_process_id(ID:str, projection:dict=None):
+	"""
+	Pull a process document by its ID.
+
+	:param ID: The ID of the process document to retrieve.
+	:param projection: Fields to include or exclude, None for whole documents.
+	:return: The process document if found, otherwise None.
+	"""
+	if projection is None:
+		result = await _cached_find_one(process_collection, process_cache, ID)
+	else:
+		result = await process_collection.find_one({"_id" : ID}, projection)
+	if result:
+		return result
+
+@timed
+async def pull_process_ids(IDs:list, projection:dict=None):
+	"""
+	Pull process documents by their IDs with one query instead of one per ID.
+
+	:param IDs: The IDs of the process documents to retrieve.
+	:param projection: Fields to include or exclude, None for whole documents. _id is always returned.
+	:return: The process documents in the order of IDs, None for the IDs that were not found.
+	"""
+	if projection is None:
+		found = await _cached_find_many(process_collection, process_cache, IDs)
+	else:
+		# the documents are matched back to the IDs by _id, so only its exclusion is
+		# dropped, {"_id": 1} alone stays a valid inclusion of nothing but the ids
+		projection = {field: value for field, value in projection.items() if field != "_id" or value} or None
+		cursor = process_collection.find({"_id" : {"$in": list(dict.fromkeys(IDs))}}, projection)
+		found = {document["_id"]: document async for document in cursor}
+	return [found.get(ID) for ID in IDs]
+
+@timed
+async def pull_processes_parent_graph(parent_graph:str, projection:dict=None, limit:int=None, after:str=None, as_cursor=False):
+	"""
+	Pull all process documents that derive from the parent graph.
+
+	:param data_key: The ID to the parent graph.
+	:param projection: Fields to include or exclude, None for whole documents.
+	:param limit: Maximum number of documents to return, None for all.
+	:param after: Pagination token of the last document already served.
+	:param as_cursor: Return the open cursor instead of a list so it can be streamed.
+	:return: A list of process documents that contain the specified parent.
+	"""
+	collection, session = await read_route_async("pull_processes_parent_graph", process_collection, analytics_process_collection)
+	cursor = find_documents(collection, {"parent_graph" : parent_graph}, limit=limit, after=after, projection=projection, session=session)
+	if as_cursor:
+		return cursor
+	result = await cursor.to_list(length=None)
+	if result:
+		return result
+
+@timed
+async def pull_processes_data_type(data_key:str, projection:dict=None, limit:int=None, after:str=None, as_cursor=False):
+	"""
+	Pull all process documents that contain a specific key in the elastic_data_paths dictionary.
+
+	:param data_key: The key to search for in the elastic_data_paths dictionary.
+	:param projection: Fields to include or exclude, None for whole documents.
+	:param limit: Maximum number of documents to return, None for all.
+	:param after: Pagination token of the last document already served.
+	:param as_cursor: Return the open cursor instead of a list so it can be streamed.
+	:return: A list of process documents that contain the specified key.
+	:raises ValueError: The data key is empty, holds a "." or starts with "$".
+	"""
+	if not data_key or "." in data_key or data_key.startswith("$"):
+		raise ValueError(f"invalid data key '{data_key}'")
+
+	# answered by the wildcard index on elastic_data_paths
+	query = {
+		f"elastic_data_paths.{data_key}": {"$exists": True}
+	}
+	collection, session = await read_route_async("pull_processes_data_type", process_collection, analytics_process_collection)
+	cursor = find_documents(collection, query, limit=limit, after=after, projection=projection, session=session)
+	if as_cursor:
+		return cursor
+	result = await cursor.to_list(length=None)
+
+	if result:
+		return result
+
+@timed
+async def pull_data_key_catalog():
+	"""
+	Pull the data keys held by the processes, read from the data key catalog.
+
+	:return: A list of data keys with the number of processes holding them, most used first.
+	"""
+	cursor = catalog_collection.find({"process_count" : {"$gt" : 0}}).sort([("process_count", DESCENDING), ("_id", ASCENDING)])
+	return [
+		{"data_key" : entry["_id"], "process_count" : entry["process_count"]}
+		async for entry in cursor
+	]
+
+@timed
+async def pull_processes_file_location_type(file_location_type:str, projection:dict=None, limit:int=None, after:str=None, as_cursor=False):
+	"""
+	Pull all process data contained in a catigory of file location
+
+	:param file_location: process location type (embedded, digs_local, pool).
+	:param projection: Fields to include or exclude, None for whole documents.
+	:param limit: Maximum number of documents to return, None for all.
+	:param after: Pagination token of the last document already served.
+	:param as_cursor: Return the open cursor instead of a list so it can be streamed.
+	:return: A list of process documents stored in a storage catigory.
+	"""
+	collection, session = await read_route_async("pull_processes_file_location_type", process_collection, analytics_process_collection)
+	cursor = find_documents(collection, {"file_location_type" : file_location_type}, limit=limit, after=after, projection=projection, session=session)
+	if as_cursor:
+		return cursor
+	result = await cursor.to_list(length=None)
+	if result:
+		return result
+
+@timed
+async def pull_processes_data_path(data_path:str, projection:dict=None, limit:int=None, after:str=None, as_cursor=False):
+	"""
+	Pull all processes whose elastic_data_paths reference a file, through
+	the multikey index on data_paths (see data_paths.py).
+
+	:param data_path: The file path, e.g. /some_path1.pdb.
+	:param projection: Fields to include or exclude, None for whole documents.
+	:param limit: Maximum number of documents to return, None for all.
+	:param after: Pagination token of the last document already served.
+	:param as_cursor: Return the open cursor instead of a list so it can be streamed.
+	:return: A list of process documents referencing the file.
+	"""
+	collection, session = await read_route_async("pull_processes_data_path", process_collection, analytics_process_collection)
+	cursor = find_documents(collection, {DATA_PATHS_FIELD : data_path}, limit=limit, after=after, projection=projection, session=session)
+	if as_cursor:
+		return cursor
+	result = await cursor.to_list(length=None)
+	if result:
+		return result
+
+
+# Analytics
+
+@timed
+async def aggregate_graph_collection(pipeline:list):
+	"""
+	Run an analytics aggregation over the graph collection, see analytics.py.
+
+	:param pipeline: The aggregation pipeline.
+	:return: The open cursor over the results so it can be streamed.
+	"""
+	collection, session = await read_route_async("aggregate_graph_collection", graph_collection, analytics_graph_collection)
+	# group stages may exceed the 100MB stage limit on large collections
+	return collection.aggregate(pipeline, allowDiskUse=True, maxTimeMS=analytics_max_time_ms, session=session)
+
+@timed
+async def aggregate_process_collection(pipeline:list):
+	"""
+	Run an analytics aggregation over the process collection, see analytics.py.
+
+	:param pipeline: The aggregation pipeline.
+	:return: The open cursor over the results so it can be streamed.
+	"""
+	collection, session = await read_route_async("aggregate_process_collection", process_collection, analytics_process_collection)
+	return collection.aggregate(pipeline, allowDiskUse=True, maxTimeMS=analytics_max_time_ms, session=session)
+
+
+# Update Process Data
+
+@timed
+async def update_process_meta_data(update_id:str, meta_data:dict):
+	"""
+	Update the metadata of a process document.
+
+	:param update_id: The unique identifier of the process document to update.
+	:param meta_data: The metadata to update in the process document.
+	:return: A message indicating the outcome of the update operation.
+	"""
+	# generate timestamp
+	time_stamp = datetime.utcnow()
+
+	# update database
+	result = await process_collection.update_one(
+			{"_id":update_id},
+			{'$set': {
+				"meta_data":meta_data,
+				"date_updated":time_stamp
+			}}
+		)
+
+	process_cache.invalidate(update_id)
+
+	if result.modified_count > 0:
+		return f"item '{update_id}' modified with supplied meta data"
+
+@timed
+async def update_process_elastic_data_paths(update_id:str, elastic_data_paths:dict):
+	"""
+	Update the elastic data paths of a process document.
+
+	:param update_id: The unique identifier of the process document to update.
+	:param elastic_data_paths: The elastic data paths to update in the process document.
+	:return: A message indicating the outcome of the update operation.
+	"""
+	# generate timestamp
+	time_stamp = datetime.utcnow()
+
+	# update database, the previous values keep the graph summary in step
+	before = await process_collection.find_one_and_update(
+			{"_id":update_id},
+			{'$set': {
+				"elastic_data_paths":elastic_data_paths,
+				"data_paths":flatten_data_paths(elastic_data_paths),
+				"date_updated":time_stamp
+			}},
+			projection=SUMMARY_PROJECTION
+		)
+
+	process_cache.invalidate(update_id)
+
+	if before:
+		await _apply_summary_changes([(before, {**before, "elastic_data_paths":elastic_data_paths})])
+		return f"item '{update_id}' modified with supplied meta data"
+
+@timed
+async def update_process_file_location_type(update_id:str, file_location_type:str):
+	"""
+	Update the file location type of a process document.
+
+	:param update_id: The unique identifier of the process document to update.
+	:param file_location_type: The file location type to update in the process document.
+	:return: A message indicating the outcome of the update operation.
+	"""
+	# generate timestamp
+	time_stamp = datetime.utcnow()
+
+	# update database, the previous values keep the graph summary in step
+	before = await process_collection.find_one_and_update(
+			{"_id":update_id},
+			{'$set': {
+				"file_location_type":file_location_type,
+				"date_updated":time_stamp
+			}},
+			projection=SUMMARY_PROJECTION
+		)
+
+	process_cache.invalidate(update_id)
+
+	if before:
+		await _apply_summary_changes([(before, {**before, "file_location_type":file_location_type})])
+		return f"item '{update_id}' modified with supplied meta data"
+
+# Delete Process Data
+
+@timed
+async def delete_process(id:str):
+	"""
+	Delete a process document by its unique identifier and remove it from
+	parent list with a server side $pull.
+
+	:param id: The unique identifier of the process document to delete.
+	:return: A message indicating the outcome of the deletion operation.
+	"""
+	# generate timestamp
+	time_stamp = datetime.utcnow()
+
+	# delete the process and remove this id from its parent if it existed
+	process_data = await process_collection.find_one_and_delete(
+			{"_id" : f"{id}"},
+			projection=SUMMARY_PROJECTION
+		)
+	if process_data:
+		await _apply_summary_changes([(process_data, None)])
+		list_modified_result = await graph_collection.update_one(
+				{"_id":process_data["parent_graph"]},
+				{
+					'$pull': {"process_list":id},
+					'$set': {"date_updated":time_stamp}
+				}
+			)
+
+		process_cache.invalidate(id)
+		graph_cache.invalidate(process_data["parent_graph"])
+
+		if list_modified_result.modified_count > 0:
+			return f"item '{id}' deleted"
+
+@timed
+async def delete_all_from_parent_graph(parent_graph:str):
+	"""
+	Delete all process documents associated with a specific parent graph.
+
+	:param parent_graph: The identifier of the parent graph whose associated process documents will be deleted.
+	:return: A message indicating the outcome of the deletion operation.
+	"""
+	summary = await summary_collection.find_one({"_id" : parent_graph}, {"data_keys" : 1})
+	result = await process_collection.delete_many({"parent_graph" : f"{parent_graph}"})
+	process_cache.invalidate_where(lambda process: process.get("parent_graph") == parent_graph)
+	await rebuild_graph_summaries([parent_graph])
+	if summary and result.deleted_count > 0:
+		operations = catalog_removals(summary)
+		if operations:
+			await catalog_collection.bulk_write(operations, ordered=False)
+	if result.deleted_count > 0:
+		return f"items under '{parent_graph}' graph deleted"
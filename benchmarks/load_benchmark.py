@@ -0,0 +1,394 @@
+"""
+-------------------------------------------------------------------
+This is a Goldfish Project File
+
+Authors: Max Witwer, Jie Chen, Elliott Cole
+Collaboration with the Baker Lab
+
+This file was generated during an internship at the institute for
+protein design
+
+Description:
+Load benchmark of the api. A seeded data set is loaded with
+populate_dummy_data into a dedicated database, then every endpoint of
+routes/crud.py is driven through an in-process ASGI client: the reads
+and analytics against the loaded data, the creates, updates and
+deletes against scratch documents the run creates itself, so the
+loaded data stays the same from run to run. For every endpoint the
+throughput, the p50/p95/p99 latency, the error count and the Mongo
+commands per request are reported.
+
+The results can be saved as a JSON baseline and a later run compared
+against it; endpoints whose p95 latency grew or whose throughput
+dropped by more than the tolerance are reported as regressions and
+make the run exit with status 1. Compare runs made with the same
+arguments on the same machine only.
+
+The benchmark database is dropped before the run and, unless --keep
+is given, after it, so never point --database at real data.
+
+Usage (from the repository root, a local mongod must be running):
+    DATABASE_URL="mongodb://localhost:27017" python benchmarks/load_benchmark.py \\
+        --graphs 200 --processes 50 --requests 200 --output benchmarks/baselines/local.json
+    DATABASE_URL="mongodb://localhost:27017" python benchmarks/load_benchmark.py \\
+        --graphs 200 --processes 50 --requests 200 --compare benchmarks/baselines/local.json
+
+
+Date: 07/06/2024
+-------------------------------------------------------------------
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from pymongo import monitoring
+
+sys.path.append(".")
+
+
+class CommandCounter(monitoring.CommandListener):
+	"""
+	Counts the Mongo commands sent by every client created after it was registered.
+	"""
+
+	def __init__(self):
+		self.count = 0
+		self._lock = threading.Lock()
+
+	def started(self, event):
+		with self._lock:
+			self.count += 1
+
+	def succeeded(self, event):
+		pass
+
+	def failed(self, event):
+		pass
+
+
+def percentile(latencies:list, percent:int):
+	"""
+	:return: The percentile of the latencies, in milliseconds.
+	"""
+	if len(latencies) == 1:
+		return latencies[0] * 1000
+	return statistics.quantiles(latencies, n=100, method="inclusive")[percent - 1] * 1000
+
+
+def new_graph(rng:random.Random, index:int):
+	return {
+		"project_name": f"benchmark scratch {index}",
+		"process_meta_data": {"description": "benchmark scratch graph", "run": rng.random()},
+		"owner": "benchmark",
+		"owner_email": "benchmark@example.com"
+	}
+
+
+def new_process(rng:random.Random, parent_graph:str, step:int):
+	return {
+		"parent_graph": parent_graph,
+		"meta_data": {"description": f"benchmark step {step}", "score": rng.random()},
+		"elastic_data_paths": {"pdb": [f"/benchmark/step_{step}.pdb"]},
+		"file_location_type": rng.choice(["digs_local", "pool", "embedded"])
+	}
+
+
+def graph_export(rng:random.Random, processes:int):
+	"""
+	An NDJSON export of a new scratch graph. The ids are fresh uuid4s, not
+	drawn from the generator, which shares its seed with the loaded data.
+
+	:return: The bytes of the export.
+	"""
+	from graph_transfer import export_stream
+
+	now = datetime.utcnow()
+	graph_id = str(uuid.uuid4())
+	process_docs = [
+		{**new_process(rng, graph_id, step), "_id": str(uuid.uuid4()), "date_created": now, "date_updated": now}
+		for step in range(processes)
+	]
+	graph = {
+		**new_graph(rng, 0), "_id": graph_id, "process_list": [process["_id"] for process in process_docs],
+		"date_created": now, "date_updated": now
+	}
+	return b"".join(export_stream([graph] + process_docs))
+
+
+def endpoint_scenarios(state:dict):
+	"""
+	Every endpoint of routes/crud.py with a function building one request
+	for it. The requests draw their ids from state, which holds a sample of
+	the loaded graphs and the scratch documents created along the way.
+
+	:return: A list of (name, phase, build) tuples in run order, build takes
+	         the seeded generator and returns (method, url, keyword arguments).
+	"""
+	def graph(rng):
+		return rng.choice(state["graphs"])
+
+	def scratch_graph(rng):
+		return rng.choice(state["scratch_graphs"])
+
+	def scratch_process(rng):
+		return rng.choice(state["scratch_processes"])
+
+	def rotated_process_list():
+		# every request stores a different order, so none of them is a no-op
+		process_list = state["process_list_graph"]["process_list"]
+		state["rotation"] = (state["rotation"] + 1) % len(process_list)
+		return process_list[state["rotation"]:] + process_list[:state["rotation"]]
+
+	def updates(rng, pick, fields):
+		return [{"update_id": pick(rng), **fields} for _ in range(10)]
+
+	read = [
+		("graph_instance", lambda rng: ("POST", "/CRUD/read/graph_instance/", {"params": {"filter": json.dumps({"_id": graph(rng)["_id"]})}})),
+		("graph_collection", lambda rng: ("POST", "/CRUD/read/graph_collection/", {"params": {"filter": json.dumps({"owner": graph(rng)["owner"]}), "limit": 50}})),
+		("graph_id", lambda rng: ("GET", f"/CRUD/read/graph_id/{graph(rng)['_id']}", {})),
+		("graph_ids", lambda rng: ("POST", "/CRUD/read/graph_ids/", {"json": [graph(rng)["_id"] for _ in range(50)]})),
+		("graph_summary", lambda rng: ("GET", f"/CRUD/read/graph_summary/{graph(rng)['_id']}", {})),
+		("graph_lineage", lambda rng: ("GET", f"/CRUD/read/graph_lineage/{graph(rng)['_id']}", {"params": {"stop": 50}})),
+		("graph_name", lambda rng: ("GET", f"/CRUD/read/graph_name/{graph(rng)['project_name']}", {})),
+		("graph_owner", lambda rng: ("GET", f"/CRUD/read/graph_owner/{graph(rng)['owner']}", {"params": {"limit": 50}})),
+		("graph_search_text", lambda rng: ("GET", "/CRUD/read/graph_search/", {"params": {"query": graph(rng)["project_name"], "mode": "text", "limit": 20}})),
+		("graph_search_prefix", lambda rng: ("GET", "/CRUD/read/graph_search/", {"params": {"query": graph(rng)["project_name"][:-1], "mode": "prefix", "field": "project_name", "limit": 20}})),
+		("graph_email", lambda rng: ("GET", f"/CRUD/read/graph_email/{graph(rng)['owner_email']}", {"params": {"limit": 50}})),
+		("process_instance", lambda rng: ("POST", "/CRUD/read/process_instance/", {"params": {"filter": json.dumps({"parent_graph": graph(rng)["_id"]})}})),
+		("process_collection", lambda rng: ("POST", "/CRUD/read/process_collection/", {"params": {"filter": json.dumps({"parent_graph": graph(rng)["_id"]}), "limit": 50}})),
+		("process_id", lambda rng: ("GET", f"/CRUD/read/process_id/{rng.choice(graph(rng)['process_list'])}", {})),
+		("process_ids", lambda rng: ("POST", "/CRUD/read/process_ids/", {"json": graph(rng)["process_list"][:50]})),
+		("process_parent", lambda rng: ("GET", f"/CRUD/read/process_parent/{graph(rng)['_id']}", {"params": {"limit": 50}})),
+		("process_by_path", lambda rng: ("GET", "/CRUD/read/process_by_path/", {"params": {"path": rng.choice(state["data_paths"]), "limit": 50}})),
+		("process_data_type", lambda rng: ("GET", "/CRUD/read/process_data_type/pdb", {"params": {"limit": 50}})),
+		("data_keys", lambda rng: ("GET", "/CRUD/read/data_keys/", {})),
+		("process_file_location_type", lambda rng: ("GET", "/CRUD/read/process_file_location_type/pool", {"params": {"file_location_type": "pool", "limit": 50}})),
+		("export_graph", lambda rng: ("GET", f"/CRUD/export/graph/{graph(rng)['_id']}", {})),
+		("analytics_graph_group_count", lambda rng: ("POST", "/CRUD/analytics/graph_group_count/", {"params": {"fields": "owner", "limit": 20}})),
+		("analytics_process_group_count", lambda rng: ("POST", "/CRUD/analytics/process_group_count/", {"params": {"fields": "file_location_type,meta_data.tool"}})),
+		("analytics_graph_date_histogram", lambda rng: ("POST", "/CRUD/analytics/graph_date_histogram/", {"params": {"unit": "month"}})),
+		("analytics_process_date_histogram", lambda rng: ("POST", "/CRUD/analytics/process_date_histogram/", {"params": {"unit": "week", "filter": json.dumps({"parent_graph": graph(rng)["_id"]})}})),
+		("analytics_process_data_values", lambda rng: ("GET", "/CRUD/analytics/process_data_values/pdb", {"params": {"filter": json.dumps({"parent_graph": graph(rng)["_id"]})}})),
+		("cache_stats", lambda rng: ("GET", "/CRUD/cache/stats", {})),
+		("query_guard_stats", lambda rng: ("GET", "/CRUD/query_guard/stats", {})),
+		("metrics", lambda rng: ("GET", "/metrics", {})),
+	]
+	create = [
+		("create_graph", lambda rng: ("POST", "/CRUD/create/graph/", {"json": new_graph(rng, 0)})),
+		("create_graph_bulk", lambda rng: ("POST", "/CRUD/create/graph/bulk", {"json": [new_graph(rng, index) for index in range(10)]})),
+		("create_process", lambda rng: ("POST", "/CRUD/create/process/", {"json": new_process(rng, scratch_graph(rng), 0)})),
+		("create_process_bulk", lambda rng: ("POST", "/CRUD/create/process/bulk", {"json": [new_process(rng, scratch_graph(rng), step) for step in range(10)]})),
+		("import_graph", lambda rng: ("POST", "/CRUD/import/graph/", {"files": {"file": ("graph.ndjson", graph_export(rng, 10), "application/x-ndjson")}})),
+	]
+	update = [
+		("update_process_meta_data", lambda rng: ("POST", "/CRUD/update/process_meta_data/", {"json": {"update_id": scratch_process(rng), "meta_data": {"score": rng.random()}}})),
+		("update_process_elastic_data_paths", lambda rng: ("POST", "/CRUD/update/process_elastic_data_paths/", {"json": {"update_id": scratch_process(rng), "elastic_data_paths": {"fasta": ["/benchmark/seq.fasta"]}}})),
+		("update_graph_process_meta_data", lambda rng: ("POST", "/CRUD/update/graph_process_meta_data/", {"json": {"update_id": scratch_graph(rng), "process_meta_data": {"run": rng.random()}}})),
+		("update_graph_project_name", lambda rng: ("POST", "/CRUD/update/graph_project_name/", {"json": {"update_id": scratch_graph(rng), "project_name": f"benchmark scratch {rng.random()}"}})),
+		("update_graph_owner_email", lambda rng: ("POST", "/CRUD/update/graph_owner_email/", {"json": {"update_id": scratch_graph(rng), "owner_email": "benchmark2@example.com"}})),
+		("update_graph_owner", lambda rng: ("POST", "/CRUD/update/graph_owner/", {"json": {"update_id": scratch_graph(rng), "owner": "benchmark2"}})),
+		("update_process_list_order", lambda rng: ("POST", "/CRUD/update/process_list_order/", {"json": {"update_id": state["process_list_graph"]["_id"], "process_list": rotated_process_list()}})),
+		("update_process_bulk", lambda rng: ("POST", "/CRUD/update/process_bulk/", {"json": updates(rng, scratch_process, {"meta_data": {"score": rng.random()}})})),
+		("update_graph_bulk", lambda rng: ("POST", "/CRUD/update/graph_bulk/", {"json": updates(rng, scratch_graph, {"owner": "benchmark3"})})),
+	]
+	delete = [
+		("delete_process_file_id", lambda rng: ("GET", f"/CRUD/delete/process_file_id/{state['scratch_processes'].pop()}", {})),
+		("delete_process_partent_id", lambda rng: ("GET", f"/CRUD/delete/process_partent_id/{state['scratch_graphs'].pop()}", {})),
+		("delete_graph_file_id", lambda rng: ("GET", f"/CRUD/delete/graph_file_id/{state['scratch_graphs'].pop()}", {})),
+		("delete_graph_job", lambda rng: ("GET", f"/CRUD/delete/graph_job/{state['scratch_graphs'].pop()}", {})),
+		("job_status", lambda rng: ("GET", f"/CRUD/read/job_status/{rng.choice(state['jobs'])}", {})),
+	]
+	return [(name, phase, build) for phase, scenarios in (("read", read), ("create", create), ("update", update), ("delete", delete))
+		for name, build in scenarios]
+
+
+def remember_created(name:str, body:dict, state:dict):
+	"""
+	Keep the ids of the scratch documents and jobs for the later phases.
+	"""
+	result = body.get("result")
+	if name == "create_graph":
+		state["scratch_graphs"].append(result["_id"])
+	elif name == "create_graph_bulk":
+		state["scratch_graphs"].extend(result["created"])
+	elif name == "create_process":
+		state["scratch_processes"].append(result["_id"])
+	elif name == "create_process_bulk":
+		state["scratch_processes"].extend(entry["_id"] for entry in result if entry["status"] == "created")
+	elif name == "import_graph":
+		state["imported_graphs"].append(result["_id"])
+	elif name == "delete_graph_job":
+		state["jobs"].append(result["_id"])
+
+
+async def run_endpoint(client, name:str, build, state:dict, requests:int, concurrency:int, rng:random.Random, counter:CommandCounter):
+	"""
+	Send requests to one endpoint, concurrency of them at a time.
+
+	:return: The endpoint report.
+	"""
+	latencies = []
+	statuses = {}
+	semaphore = asyncio.Semaphore(concurrency)
+	# requests are built up front so the generator is used in a fixed order
+	prepared = [build(rng) for _ in range(requests)]
+
+	async def send(index:int):
+		method, url, kwargs = prepared[index]
+		async with semaphore:
+			start = time.perf_counter()
+			response = await client.request(method, url, **kwargs)
+			latencies.append(time.perf_counter() - start)
+		statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+		if response.status_code == 200 and response.headers.get("content-type", "").startswith("application/json"):
+			remember_created(name, response.json(), state)
+
+	commands_before = counter.count
+	start = time.perf_counter()
+	await asyncio.gather(*(send(index) for index in range(requests)))
+	seconds = time.perf_counter() - start
+
+	return {
+		"requests": requests,
+		"errors": sum(count for status, count in statuses.items() if status >= 400),
+		"statuses": {str(status): count for status, count in sorted(statuses.items())},
+		"throughput_rps": requests / seconds,
+		"p50_ms": percentile(latencies, 50),
+		"p95_ms": percentile(latencies, 95),
+		"p99_ms": percentile(latencies, 99),
+		"mongo_commands_per_request": (counter.count - commands_before) / requests,
+	}
+
+
+def compare(results:dict, baseline:dict, tolerance:float):
+	"""
+	:return: The regressions of results against the baseline, as printable lines.
+	"""
+	regressions = []
+	for name, report in results["endpoints"].items():
+		previous = baseline["endpoints"].get(name)
+		if previous is None:
+			continue
+		if report["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+			regressions.append(f"{name}: p95 {previous['p95_ms']:.2f} -> {report['p95_ms']:.2f} ms")
+		if report["throughput_rps"] < previous["throughput_rps"] * (1 - tolerance):
+			regressions.append(f"{name}: throughput {previous['throughput_rps']:.1f} -> {report['throughput_rps']:.1f} req/s")
+		if report["mongo_commands_per_request"] > previous["mongo_commands_per_request"] + 0.5:
+			regressions.append(f"{name}: mongo commands {previous['mongo_commands_per_request']:.1f} -> {report['mongo_commands_per_request']:.1f} per request")
+	return regressions
+
+
+async def run(args, counter:CommandCounter):
+	import httpx
+
+	from api import app
+	from data_paths import DATA_PATHS_FIELD
+	from db_connection import get_database
+	from populate_dummy_data import populate
+
+	db = get_database()
+	db.client.drop_database(db.name)
+	loaded = populate(db, args.graphs, args.processes, args.meta_data_bytes, args.data_keys, args.paths_per_key, args.seed)
+	print(f"loaded {loaded['graphs']} graphs and {loaded['processes']} processes in {loaded['seconds']:.1f} s")
+
+	state = {
+		"graphs": list(db.graph_map.find({}, {"owner": 1, "owner_email": 1, "project_name": 1, "process_list": 1}).sort("_id").limit(1000)),
+		"scratch_graphs": [],
+		"scratch_processes": [],
+		"jobs": [],
+		"imported_graphs": [],
+	}
+	# paths the loaded processes hold, for the path lookups
+	state["data_paths"] = sorted({
+		path for process in db.process_step.find({}, {DATA_PATHS_FIELD: 1}).sort("_id").limit(1000)
+		for path in process.get(DATA_PATHS_FIELD, [])
+	})
+	state["process_list_graph"] = state["graphs"][0]
+	state["rotation"] = 0
+	rng = random.Random(args.seed)
+	results = {"endpoints": {}}
+
+	try:
+		# server errors are counted as 500s instead of ending the run
+		transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+		async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+			for name, phase, build in endpoint_scenarios(state):
+				if args.endpoint and name not in args.endpoint:
+					continue
+				report = await run_endpoint(client, name, build, state, args.requests, args.concurrency, rng, counter)
+				results["endpoints"][name] = {"phase": phase, **report}
+				print(
+					f"{name:<36} {report['throughput_rps']:>8.1f} req/s  p50 {report['p50_ms']:>8.2f}  "
+					f"p95 {report['p95_ms']:>8.2f}  p99 {report['p99_ms']:>8.2f} ms  "
+					f"{report['mongo_commands_per_request']:>5.1f} cmd/req  {report['errors']} errors"
+				)
+				# the imports are deleted again right away, unmeasured, so the
+				# later endpoints see the same data with or without them
+				while state["imported_graphs"]:
+					await client.get(f"/CRUD/delete/graph_file_id/{state['imported_graphs'].pop()}")
+	finally:
+		if not args.keep:
+			db.client.drop_database(db.name)
+	return results
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Load benchmark of every Goldfish endpoint")
+	parser.add_argument("--database", default="goldfish_benchmark", help="scratch database, dropped before and after the run")
+	parser.add_argument("--graphs", type=int, default=100, help="graphs loaded before the run")
+	parser.add_argument("--processes", type=int, default=50, help="processes per loaded graph")
+	parser.add_argument("--meta-data-bytes", type=int, default=512, help="approximate size of every meta_data")
+	parser.add_argument("--data-keys", type=int, default=3, help="most elastic_data_paths keys per process")
+	parser.add_argument("--paths-per-key", type=int, default=5, help="most paths per elastic_data_paths key")
+	parser.add_argument("--seed", type=int, default=0, help="seed of the data and of the requests")
+	parser.add_argument("--requests", type=int, default=100, help="requests per endpoint")
+	parser.add_argument("--concurrency", type=int, default=8, help="requests in flight per endpoint")
+	parser.add_argument("--endpoint", action="append", help="only run this endpoint, may be repeated")
+	parser.add_argument("--output", help="write the results to this JSON file")
+	parser.add_argument("--compare", help="baseline JSON file to compare the results against")
+	parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown before a regression is reported")
+	parser.add_argument("--keep", action="store_true", help="keep the benchmark database after the run")
+	args = parser.parse_args()
+	if args.database == "Goldfish":
+		parser.error("refusing to drop the Goldfish database, pick a scratch database")
+
+	# both must be in place before the api creates its Mongo client
+	os.environ["DATABASE_NAME"] = args.database
+	counter = CommandCounter()
+	monitoring.register(counter)
+
+	results = asyncio.run(run(args, counter))
+	results["config"] = {key: value for key, value in vars(args).items() if key not in ("output", "compare", "keep")}
+	results["config"]["database_backend"] = os.getenv("DATABASE_BACKEND", "sync")
+	results["machine"] = {"platform": platform.platform(), "python": platform.python_version()}
+	results["date"] = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S")
+
+	if args.output:
+		os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+		with open(args.output, "w") as output:
+			json.dump(results, output, indent=2)
+		print(f"results written to {args.output}")
+
+	if args.compare:
+		with open(args.compare) as baseline_file:
+			regressions = compare(results, json.load(baseline_file), args.tolerance)
+		for regression in regressions:
+			print(f"REGRESSION {regression}")
+		if regressions:
+			return 1
+		print(f"no regressions against {args.compare}")
+	return 0
+
+
+if __name__ == "__main__":
+	raise SystemExit(main())
@@ -0,0 +1,129 @@
+"""
+-------------------------------------------------------------------
+This is a Goldfish Project File
+
+Authors: Max Witwer, Jie Chen, Elliott Cole
+Collaboration with the Baker Lab
+
+This file was generated during an internship at the institute for
+protein design
+
+Description:
+Benchmark for process_list maintenance. A scratch graph is created
+and several threads insert processes into it at the same time
+through create_process_document. Afterwards the graph's process_list
+is checked for lost updates and the per-insert latency is reported
+for each block of inserts, which should stay flat as the list grows.
+The --legacy flag runs the old read-modify-write $set of the whole
+array for comparison. The scratch graph is deleted at the end.
+
+Usage (from the repository root, DATABASE_URL must be set):
+    python benchmarks/process_list_concurrency.py --threads 8 --inserts 500
+
+
+Date: 07/06/2024
+-------------------------------------------------------------------
+"""
+
+import argparse
+import statistics
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+sys.path.append(".")
+
+from CRUD_utils import (
+	create_graph_document, create_process_document, delete_graph,
+	graph_collection, process_collection, pull_graph_id
+)
+
+
+def legacy_create_process_document(new_process_dict:dict):
+	"""
+	The previous implementation: read the parent, append in Python and
+	$set the whole process_list back.
+	"""
+	parent_id = new_process_dict["parent_graph"]
+	parent_result = pull_graph_id(parent_id)
+	process_collection.insert_one(new_process_dict)
+	process_list = parent_result["process_list"]
+	process_list.append(new_process_dict["_id"])
+	graph_collection.update_one(
+		{"_id":parent_id},
+		{'$set': {"process_list":process_list, "date_updated":datetime.utcnow()}}
+	)
+
+
+def insert_worker(graph_id:str, inserts:int, legacy:bool):
+	"""
+	Insert processes into one graph and time every insert.
+
+	:return: A list of (inserted id, seconds taken, finish time) tuples.
+	"""
+	create = legacy_create_process_document if legacy else create_process_document
+	timings = []
+	for _ in range(inserts):
+		process_id = str(uuid.uuid4())
+		start = time.perf_counter()
+		create({
+			"_id": process_id,
+			"parent_graph": graph_id,
+			"meta_data": {},
+			"elastic_data_paths": {},
+			"file_location_type": "embedded",
+			"date_created": datetime.utcnow(),
+			"date_updated": datetime.utcnow()
+		})
+		timings.append((process_id, time.perf_counter() - start, time.perf_counter()))
+	return timings
+
+
+def main():
+	parser = argparse.ArgumentParser(description="process_list concurrency benchmark")
+	parser.add_argument("--threads", type=int, default=8, help="concurrent writers")
+	parser.add_argument("--inserts", type=int, default=500, help="inserts per writer")
+	parser.add_argument("--block", type=int, default=500, help="inserts per latency block")
+	parser.add_argument("--legacy", action="store_true", help="use the read-modify-write implementation")
+	args = parser.parse_args()
+
+	graph_id = str(uuid.uuid4())
+	create_graph_document({
+		"_id": graph_id,
+		"project_name": "process_list concurrency benchmark",
+		"process_list": [],
+		"process_meta_data": {},
+		"owner": "benchmark",
+		"owner_email": "benchmark@example.com",
+		"date_created": datetime.utcnow(),
+		"date_updated": datetime.utcnow()
+	})
+
+	try:
+		with ThreadPoolExecutor(max_workers=args.threads) as executor:
+			results = list(executor.map(
+				lambda _: insert_worker(graph_id, args.inserts, args.legacy), range(args.threads)
+			))
+
+		timings = sorted((timing for worker in results for timing in worker), key=lambda timing: timing[2])
+		inserted_ids = {process_id for process_id, _, _ in timings}
+		process_list = pull_graph_id(graph_id)["process_list"]
+
+		lost = inserted_ids - set(process_list)
+		print(f"inserted {len(inserted_ids)} processes with {args.threads} writers")
+		print(f"process_list length {len(process_list)}, lost updates {len(lost)}")
+
+		print("block  mean_ms  p99_ms")
+		for block_start in range(0, len(timings), args.block):
+			block = [seconds * 1000 for _, seconds, _ in timings[block_start:block_start + args.block]]
+			p99 = statistics.quantiles(block, n=100)[98] if len(block) > 1 else block[0]
+			print(f"{block_start // args.block:5d}  {statistics.mean(block):7.2f}  {p99:6.2f}")
+		return 1 if lost else 0
+	finally:
+		delete_graph(graph_id)
+
+
+if __name__ == "__main__":
+	raise SystemExit(main())
@@ -0,0 +1,100 @@
+"""
+-------------------------------------------------------------------
+This is a Goldfish Project File
+
+Authors: Max Witwer, Jie Chen, Elliott Cole
+Collaboration with the Baker Lab
+
+This file was generated during an internship at the institute for
+protein design
+
+Description:
+Check of update_graph_process_list_order in both data layers. A
+scratch graph holding two processes is reordered with a list that
+repeats one id and drops the other, which must be rejected and leave
+the stored list untouched, then with a valid permutation, which must
+be written. A second scratch graph without processes is reordered
+with the empty list, which must match it. The scratch graphs are
+deleted at the end.
+
+Usage (from the repository root, DATABASE_URL must be set):
+    python benchmarks/process_list_order_check.py
+
+
+Date: 07/06/2024
+-------------------------------------------------------------------
+"""
+
+import asyncio
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.append(".")
+
+import async_CRUD_utils
+import CRUD_utils
+
+
+def check_layer(name:str, reorder, failures:list):
+	"""
+	Run the duplicate, permutation and empty list reorders against one layer.
+
+	:param name: Name of the layer, used in the failure messages.
+	:param reorder: Callable taking (update_id, process_list) that runs the layer's update.
+	:param failures: List the failure messages are appended to.
+	"""
+	graph_id, empty_graph_id = str(uuid.uuid4()), str(uuid.uuid4())
+	process_ids = [str(uuid.uuid4()), str(uuid.uuid4())]
+	# dated in the past, so the reorders always change date_updated and count as modified
+	created = datetime.utcnow() - timedelta(minutes=1)
+	for ID, process_list in ((graph_id, process_ids), (empty_graph_id, [])):
+		CRUD_utils.create_graph_document({
+			"_id": ID,
+			"project_name": "process_list order check",
+			"process_list": process_list,
+			"process_meta_data": {},
+			"owner": "benchmark",
+			"owner_email": "benchmark@example.com",
+			"date_created": created,
+			"date_updated": created
+		})
+
+	try:
+		try:
+			reorder(graph_id, [process_ids[0], process_ids[0]])
+			failures.append(f"{name}: a list with a duplicate id was accepted")
+		except ValueError as error:
+			print(f"{name}: duplicate ids rejected with '{error}'")
+		if CRUD_utils.graph_collection.find_one({"_id": graph_id})["process_list"] != process_ids:
+			failures.append(f"{name}: the duplicate request changed the stored process_list")
+
+		if not reorder(graph_id, process_ids[::-1]):
+			failures.append(f"{name}: a valid permutation was not written")
+		if CRUD_utils.graph_collection.find_one({"_id": graph_id})["process_list"] != process_ids[::-1]:
+			failures.append(f"{name}: the stored process_list does not hold the permutation")
+
+		if not reorder(empty_graph_id, []):
+			failures.append(f"{name}: the empty list did not match a graph without processes")
+	finally:
+		for ID in (graph_id, empty_graph_id):
+			CRUD_utils.graph_collection.delete_one({"_id": ID})
+			CRUD_utils.graph_cache.invalidate(ID)
+
+
+def main():
+	failures = []
+	check_layer("sync", CRUD_utils.update_graph_process_list_order, failures)
+	check_layer(
+		"async",
+		lambda update_id, process_list: asyncio.run(async_CRUD_utils.update_graph_process_list_order(update_id, process_list)),
+		failures
+	)
+
+	for failure in failures:
+		print(f"FAILED: {failure}")
+	return 1 if failures else 0
+
+
+if __name__ == "__main__":
+	raise SystemExit(main())
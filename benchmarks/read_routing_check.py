@@ -0,0 +1,113 @@
+"""
+-------------------------------------------------------------------
+This is a Goldfish Project File
+
+Authors: Max Witwer, Jie Chen, Elliott Cole
+Collaboration with the Baker Lab
+
+This file was generated during an internship at the institute for
+protein design
+
+Description:
+Check of the read preference routing against a replica set. A graph
+is created through the api, then listed by owner twice: once with
+the operation time of the create in X-Goldfish-After-Operation-Time,
+which must be served by the primary and include the new graph, and
+once without it, which must be served by a secondary when one is
+available. The graph is deleted at the end.
+
+A local three member replica set for the check:
+    mkdir -p /tmp/rs0-0 /tmp/rs0-1 /tmp/rs0-2
+    mongod --replSet rs0 --port 27017 --dbpath /tmp/rs0-0 --fork --logpath /tmp/rs0-0.log
+    mongod --replSet rs0 --port 27018 --dbpath /tmp/rs0-1 --fork --logpath /tmp/rs0-1.log
+    mongod --replSet rs0 --port 27019 --dbpath /tmp/rs0-2 --fork --logpath /tmp/rs0-2.log
+    mongosh --eval 'rs.initiate({_id: "rs0", members: [
+        {_id: 0, host: "localhost:27017"}, {_id: 1, host: "localhost:27018"},
+        {_id: 2, host: "localhost:27019"}]})'
+
+Usage (from the repository root):
+    DATABASE_URL="mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0" \
+        python benchmarks/read_routing_check.py
+
+
+Date: 07/06/2024
+-------------------------------------------------------------------
+"""
+
+import sys
+import uuid
+
+from fastapi.testclient import TestClient
+from pymongo import monitoring
+
+sys.path.append(".")
+
+from api import app
+from db_connection import get_client
+from read_routing import AFTER_OPERATION_TIME_HEADER, OPERATION_TIME_HEADER
+
+
+class ServedBy(monitoring.CommandListener):
+	"""
+	Remembers the server that answered the latest find.
+	"""
+
+	def __init__(self):
+		self.address = None
+
+	def started(self, event):
+		if event.command_name == "find":
+			self.address = event.connection_id
+
+	def succeeded(self, event):
+		pass
+
+	def failed(self, event):
+		pass
+
+
+def main():
+	served_by = ServedBy()
+	# global listeners only reach clients created afterwards
+	monitoring.register(served_by)
+	client = TestClient(app)
+	mongo_client = get_client()
+
+	owner = f"read-routing-{uuid.uuid4()}"
+	response = client.post("/CRUD/create/graph/", json={
+		"project_name": "read routing check",
+		"process_list": [],
+		"process_meta_data": {},
+		"owner": owner,
+		"owner_email": "benchmark@example.com"
+	})
+	graph_id = response.json()["result"]["_id"]
+	failures = []
+
+	try:
+		operation_time = response.headers.get(OPERATION_TIME_HEADER)
+		print(f"create returned {OPERATION_TIME_HEADER}: {operation_time}")
+		if operation_time is None:
+			failures.append("the create did not return an operation time, is this a replica set?")
+
+		response = client.get(f"/CRUD/read/graph_owner/{owner}", headers={AFTER_OPERATION_TIME_HEADER: operation_time or "0.0"})
+		print(f"read after write served by {served_by.address}, primary is {mongo_client.primary}")
+		if served_by.address != mongo_client.primary:
+			failures.append("the read after the write was not served by the primary")
+		if response.status_code != 200 or graph_id not in [graph["_id"] for graph in response.json()["result"]]:
+			failures.append("the read after the write did not see the new graph")
+
+		client.get(f"/CRUD/read/graph_owner/{owner}")
+		print(f"analytics read served by {served_by.address}, secondaries are {sorted(mongo_client.secondaries)}")
+		if mongo_client.secondaries and served_by.address not in mongo_client.secondaries:
+			failures.append("the analytics read was not served by a secondary")
+	finally:
+		client.get(f"/CRUD/delete/graph_file_id/{graph_id}")
+
+	for failure in failures:
+		print(f"FAILED: {failure}")
+	return 1 if failures else 0
+
+
+if __name__ == "__main__":
+	raise SystemExit(main())
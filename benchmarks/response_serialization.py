@@ -0,0 +1,99 @@
+"""
+-------------------------------------------------------------------
+This is a Goldfish Project File
+
+Authors: Max Witwer, Jie Chen, Elliott Cole
+Collaboration with the Baker Lab
+
+This file was generated during an internship at the institute for
+protein design
+
+Description:
+Micro-benchmark for response serialization. Synthetic process
+documents shaped like the ones in the database are serialized the
+way FastAPI does it by default (jsonable_encoder followed by
+json.dumps) and with mongo_json.dumps, for a 1k and a 100k document
+payload. No database is needed.
+
+Usage (from the repository root):
+    python benchmarks/response_serialization.py --sizes 1000 100000
+
+
+Date: 07/06/2024
+-------------------------------------------------------------------
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+
+sys.path.append(".")
+
+from mongo_json import dumps
+
+
+def new_process(index:int):
+	return {
+		"_id": str(uuid.uuid4()),
+		"parent_graph": str(uuid.uuid4()),
+		"meta_data": {
+			"description": f"benchmark process {index}",
+			"score": index * 0.5,
+			"tags": ["design", "relax", "filter"],
+			"settings": {"cycles": 3, "temperature": 0.6, "seed": ObjectId()}
+		},
+		"elastic_data_paths": {
+			"pdb": [f"/data/{index}/model_{model}.pdb" for model in range(5)],
+			"json": [f"/data/{index}/scores.json"]
+		},
+		"file_location_type": "embedded",
+		"date_created": datetime.utcnow(),
+		"date_updated": datetime.utcnow()
+	}
+
+
+def fastapi_default(content):
+	"""
+	What JSONResponse does with a route's return value by default. An
+	ObjectId encoder is added since jsonable_encoder can not handle it.
+	"""
+	return json.dumps(
+		jsonable_encoder(content, custom_encoder={ObjectId: str}), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+	).encode("utf-8")
+
+
+def time_serializer(serializer, content, repeats:int):
+	"""
+	:return: The median time of one serialization in milliseconds.
+	"""
+	timings = []
+	for _ in range(repeats):
+		start = time.perf_counter()
+		serializer(content)
+		timings.append((time.perf_counter() - start) * 1000)
+	return statistics.median(timings)
+
+
+def main():
+	parser = argparse.ArgumentParser(description="response serialization benchmark")
+	parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000], help="documents per payload")
+	parser.add_argument("--repeats", type=int, default=5, help="serializations per measurement")
+	args = parser.parse_args()
+
+	print(f"{'documents':>9}  {'default_ms':>10}  {'orjson_ms':>9}  speedup")
+	for size in args.sizes:
+		content = {"result": [new_process(index) for index in range(size)]}
+		default_ms = time_serializer(fastapi_default, content, args.repeats)
+		orjson_ms = time_serializer(dumps, content, args.repeats)
+		print(f"{size:9d}  {default_ms:10.1f}  {orjson_ms:9.1f}  {default_ms / orjson_ms:6.1f}x")
+
+
+if __name__ == "__main__":
+	main()
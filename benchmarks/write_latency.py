@@ -0,0 +1,136 @@
+"""
+-------------------------------------------------------------------
+This is a Goldfish Project File
+
+Authors: Max Witwer, Jie Chen, Elliott Cole
+Collaboration with the Baker Lab
+
+This file was generated during an internship at the institute for
+protein design
+
+Description:
+Benchmark for the create paths. Graphs and processes are created
+through create_graph_document and create_process_document and
+through the previous implementation, which read every created
+document back with pull_graph_id / pull_process_id, and the p50 and
+p99 latency of both are printed side by side. All benchmark data is
+deleted at the end.
+
+Usage (from the repository root, DATABASE_URL must be set):
+    python benchmarks/write_latency.py --iterations 1000
+
+
+Date: 07/06/2024
+-------------------------------------------------------------------
+"""
+
+import argparse
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime
+
+sys.path.append(".")
+
+from CRUD_utils import (
+	create_graph_document, create_process_document, delete_graph,
+	graph_collection, process_collection
+)
+
+
+def legacy_create_graph_document(new_graph_dict:dict):
+	"""
+	The previous implementation: insert, then read the graph back.
+	"""
+	result = graph_collection.insert_one(new_graph_dict)
+	return graph_collection.find_one({"_id": result.inserted_id})
+
+
+def legacy_create_process_document(new_process_dict:dict):
+	"""
+	The previous implementation: read the parent, insert, update the
+	parent and read the process back.
+	"""
+	parent_id = new_process_dict["parent_graph"]
+	graph_collection.find_one({"_id": parent_id})
+	result = process_collection.insert_one(new_process_dict)
+	graph_collection.update_one(
+		{"_id": parent_id},
+		{'$push': {"process_list": new_process_dict["_id"]}, '$set': {"date_updated": datetime.utcnow()}}
+	)
+	return process_collection.find_one({"_id": result.inserted_id})
+
+
+def new_graph(owner:str):
+	return {
+		"_id": str(uuid.uuid4()),
+		"project_name": "write latency benchmark",
+		"process_list": [],
+		"process_meta_data": {},
+		"owner": owner,
+		"owner_email": "benchmark@example.com",
+		"date_created": datetime.utcnow(),
+		"date_updated": datetime.utcnow()
+	}
+
+
+def new_process(parent_graph:str):
+	return {
+		"_id": str(uuid.uuid4()),
+		"parent_graph": parent_graph,
+		"meta_data": {"description": "write latency benchmark"},
+		"elastic_data_paths": {"pdb": ["/benchmark.pdb"]},
+		"file_location_type": "embedded",
+		"date_created": datetime.utcnow(),
+		"date_updated": datetime.utcnow()
+	}
+
+
+def time_calls(function, payloads:list):
+	"""
+	Call a function once per payload.
+
+	:return: The latency of every call in milliseconds.
+	"""
+	timings = []
+	for payload in payloads:
+		start = time.perf_counter()
+		function(payload)
+		timings.append((time.perf_counter() - start) * 1000)
+	return timings
+
+
+def percentiles(timings:list):
+	cut_points = statistics.quantiles(timings, n=100)
+	return cut_points[49], cut_points[98]
+
+
+def main():
+	parser = argparse.ArgumentParser(description="create path latency benchmark")
+	parser.add_argument("--iterations", type=int, default=1000, help="creates per measurement")
+	args = parser.parse_args()
+
+	owner = f"write-latency-{uuid.uuid4()}"
+	parent = new_graph(owner)
+	create_graph_document(parent)
+
+	try:
+		results = {
+			"create graph (read back)": time_calls(legacy_create_graph_document, [new_graph(owner) for _ in range(args.iterations)]),
+			"create graph": time_calls(create_graph_document, [new_graph(owner) for _ in range(args.iterations)]),
+			"create process (read back)": time_calls(legacy_create_process_document, [new_process(parent["_id"]) for _ in range(args.iterations)]),
+			"create process": time_calls(create_process_document, [new_process(parent["_id"]) for _ in range(args.iterations)]),
+		}
+
+		print(f"{'path':28}  p50_ms  p99_ms")
+		for name, timings in results.items():
+			p50, p99 = percentiles(timings)
+			print(f"{name:28}  {p50:6.2f}  {p99:6.2f}")
+	finally:
+		delete_graph(parent["_id"])
+		graph_collection.delete_many({"owner": owner})
+
+
+if __name__ == "__main__":
+	main()
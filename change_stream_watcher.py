@@ -0,0 +1,136 @@
+"""
+-------------------------------------------------------------------
+This is a Goldfish Project File
+
+Authors: Max Witwer, Jie Chen, Elliott Cole
+Collaboration with the Baker Lab
+
+This file was generated during an internship at the institute for
+protein design
+
+Description:
+This file contains a background watcher on the MongoDB change
+streams of the graph_map and process_step collections. Every write
+made by another worker or api host is pushed into the local document
+caches, either by invalidating the changed document or, in refresh
+mode, by storing the fresh document sent with the change event. This
+keeps the per-process caches correct when several workers share the
+same database. Change streams require a replica set or sharded
+cluster.
+
+Configuration (environment variables):
+    CHANGE_STREAM_CACHE   "off" (default), "invalidate" or "refresh"
+
+
+Date: 07/06/2024
+-------------------------------------------------------------------
+"""
+
+import logging
+import threading
+
+from pymongo.errors import PyMongoError
+
+from CRUD_utils import db
+from document_cache import graph_cache, process_cache
+
+logger = logging.getLogger(__name__)
+
+# caches fed by the watcher, keyed by collection name
+WATCHED_CACHES = {
+	"graph_map": graph_cache,
+	"process_step": process_cache,
+}
+
+
+class ChangeStreamWatcher(threading.Thread):
+	"""
+	Daemon thread that applies change events to the document caches.
+
+	Attributes:
+		database: The database whose collections are watched.
+		refresh (bool): Store the changed documents instead of only dropping them.
+		retry_seconds (float): Wait before reopening a failed change stream.
+		events_applied (int): Number of change events applied so far.
+	"""
+
+	def __init__(self, database=db, refresh:bool=False, retry_seconds:float=5.0):
+		super().__init__(name="goldfish-change-stream", daemon=True)
+		self.database = database
+		self.refresh = refresh
+		self.retry_seconds = retry_seconds
+		self.events_applied = 0
+		self._stop_event = threading.Event()
+
+	def apply(self, change:dict):
+		"""
+		Apply one change event to the matching cache.
+
+		:param change: The change stream event document.
+		"""
+		operation = change["operationType"]
+		cache = WATCHED_CACHES.get(change.get("ns", {}).get("coll"))
+
+		if operation in ("drop", "rename", "dropDatabase", "invalidate"):
+			for watched_cache in WATCHED_CACHES.values():
+				watched_cache.clear()
+		elif cache is not None:
+			document_id = change["documentKey"]["_id"]
+			cache.invalidate(document_id)
+			if self.refresh and change.get("fullDocument"):
+				cache.set(document_id, change["fullDocument"])
+		self.events_applied += 1
+
+	def run(self):
+		pipeline = [{"$match": {"ns.coll": {"$in": list(WATCHED_CACHES)}}}]
+		full_document = "updateLookup" if self.refresh else None
+		resync = False
+
+		while not self._stop_event.is_set():
+			try:
+				with self.database.watch(
+						pipeline,
+						full_document=full_document,
+						max_await_time_ms=1000
+					) as stream:
+					# events were missed while the stream was down, so drop
+					# everything cached once the new stream is listening
+					if resync:
+						for watched_cache in WATCHED_CACHES.values():
+							watched_cache.clear()
+						resync = False
+
+					while stream.alive and not self._stop_event.is_set():
+						change = stream.try_next()
+						if change is not None:
+							self.apply(change)
+
+					# an invalidate event closes the stream, reopen it and resync
+					if not stream.alive:
+						resync = True
+			except PyMongoError as error:
+				logger.warning("change stream failed, retrying: %s", error)
+				resync = True
+				self._stop_event.wait(self.retry_seconds)
+
+	def stop(self):
+		"""
+		Ask the watcher to exit after its current poll.
+		"""
+		self._stop_event.set()
+
+
+def start_change_stream_watcher(mode:str="off"):
+	"""
+	Startup hook used by the api.
+
+	:param mode: "invalidate" to drop changed documents, "refresh" to store
+	             the fresh documents, "off" to not watch at all.
+	:return: The running watcher, or None when disabled.
+	"""
+	if mode not in ("invalidate", "refresh"):
+		return None
+
+	watcher = ChangeStreamWatcher(refresh=(mode == "refresh"))
+	watcher.start()
+	return watcher
@@ -0,0 +1,104 @@
+"""
+-------------------------------------------------------------------
+This is a Goldfish Project File
+
+Authors: Max Witwer, Jie Chen, Elliott Cole
+Collaboration with the Baker Lab
+
+This file was generated during an internship at the institute for
+protein design
+
+Description:
+This file contains the path to process reverse index. Every process
+document carries a data_paths field holding all file paths found in
+its elastic_data_paths, flattened into one list:
+
+    {"elastic_data_paths": {"pdb": ["/a.pdb", "/b.pdb"], "fasta": "/c.fasta"},
+     "data_paths": ["/a.pdb", "/b.pdb", "/c.fasta"]}
+
+The multikey index on data_paths (see index_manager.py) answers which
+processes reference a file without scanning the collection. The CRUD
+layers write data_paths in the same update as elastic_data_paths, so
+both always change together. Processes written before the field
+existed are filled in with the backfill command.
+
+Usage (from the repository root):
+    python data_paths.py backfill           fill in processes without data_paths
+    python data_paths.py backfill --all     recompute data_paths of every process
+
+
+Date: 07/06/2024
+-------------------------------------------------------------------
+"""
+
+import argparse
+
+DATA_PATHS_FIELD = "data_paths"
+
+
+def flatten_data_paths(elastic_data_paths:dict):
+	"""
+	:param elastic_data_paths: The elastic_data_paths of a process, values are
+	                           a path or a list of paths.
+	:return: Every path in key order, values that are not strings are skipped.
+	"""
+	paths = []
+	for value in (elastic_data_paths or {}).values():
+		if isinstance(value, str):
+			paths.append(value)
+		elif isinstance(value, (list, tuple)):
+			paths.extend(path for path in value if isinstance(path, str))
+	return paths
+
+
+def with_data_paths(process:dict):
+	"""
+	:param process: A process document or the fields of a process update.
+	:return: A copy carrying the data_paths that match its elastic_data_paths,
+	         the process itself when it does not set elastic_data_paths.
+	"""
+	if "elastic_data_paths" not in process:
+		return process
+	return {**process, DATA_PATHS_FIELD: flatten_data_paths(process["elastic_data_paths"])}
+
+
+def backfill_pipeline():
+	"""
+	:return: The update pipeline computing data_paths on the server, the
+	         same flattening as flatten_data_paths().
+	"""
+	return [{"$set": {DATA_PATHS_FIELD: {"$reduce": {
+		"input": {"$objectToArray": {"$ifNull": ["$elastic_data_paths", {}]}},
+		"initialValue": [],
+		"in": {"$concatArrays": ["$$value", {"$switch": {
+			"branches": [
+				{"case": {"$eq": [{"$type": "$$this.v"}, "string"]}, "then": ["$$this.v"]},
+				{"case": {"$isArray": "$$this.v"}, "then": {"$filter": {
+					"input": "$$this.v", "as": "path", "cond": {"$eq": [{"$type": "$$path"}, "string"]}
+				}}},
+			],
+			"default": []
+		}}]}
+	}}}}]
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Manage the Goldfish path to process index")
+	subparsers = parser.add_subparsers(dest="command", required=True)
+	backfill_parser = subparsers.add_parser("backfill", help="compute data_paths on the server")
+	backfill_parser.add_argument("--all", action="store_true",
+		help="recompute every process, not only those without data_paths")
+	args = parser.parse_args()
+
+	# imported here since CRUD_utils itself imports this module
+	from CRUD_utils import process_collection, process_cache
+
+	filter = {} if args.all else {DATA_PATHS_FIELD: {"$exists": False}}
+	result = process_collection.update_many(filter, backfill_pipeline())
+	process_cache.clear()
+	print(f"updated data_paths of {result.modified_count} processes")
+	return 0
+
+
+if __name__ == "__main__":
+	raise SystemExit(main())
@@ -0,0 +1,181 @@
+"""
+-------------------------------------------------------------------
+This is a Goldfish Project File
+
+Authors: Max Witwer, Jie Chen, Elliott Cole
+Collaboration with the Baker Lab
+
+This file was generated during an internship at the institute for
+protein design
+
+Description:
+This file contains the connection manager for the Mongo clients.
+Nothing connects when a module is imported: the sync and async
+clients are created on first use, once per process, and a forked
+worker (e.g. under gunicorn) drops the client inherited from its
+parent and builds its own. Modules keep using plain module level
+names such as CRUD_utils.graph_collection, which are lazy handles
+that resolve to the current process's client when first used.
+
+Configuration (environment variables):
+    DATABASE_URL                  Mongo connection string
+    DATABASE_NAME                 database to use (default "Goldfish")
+    MONGO_MAX_POOL_SIZE           connections per server (default 100)
+    MONGO_MIN_POOL_SIZE           connections kept open (default 0)
+    MONGO_WAIT_QUEUE_TIMEOUT_MS   wait for a free connection before failing (default no limit)
+    MONGO_COMPRESSORS             e.g. "zstd,snappy"; compressors whose module is
+                                  not installed are skipped with a warning
+    MONGO_READ_PREFERENCE         e.g. "primary" (default) or "secondaryPreferred"
+
+
+Date: 07/06/2024
+-------------------------------------------------------------------
+"""
+
+from dotenv import load_dotenv
+import os
+
+import threading
+
+from pymongo import MongoClient
+
+from metrics import command_metrics, pool_metrics
+from read_routing import operation_time_tracker
+
+# load environmental varibles from ".env" file
+load_dotenv()
+
+database_name = os.getenv('DATABASE_NAME', 'Goldfish')
+
+_lock = threading.Lock()
+_clients = {}
+# bumped whenever the clients are dropped, so LazyHandles resolve again
+_generation = 0
+
+
+def client_options():
+	"""
+	Build the client keyword arguments from the environment.
+
+	:return: A dictionary passed to MongoClient / AsyncIOMotorClient.
+	"""
+	options = {
+		"maxPoolSize": int(os.getenv('MONGO_MAX_POOL_SIZE', '100')),
+		"minPoolSize": int(os.getenv('MONGO_MIN_POOL_SIZE', '0')),
+		"readPreference": os.getenv('MONGO_READ_PREFERENCE', 'primary'),
+		"event_listeners": [command_metrics, pool_metrics, operation_time_tracker],
+	}
+	if os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS'):
+		options["waitQueueTimeoutMS"] = int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS'))
+	if os.getenv('MONGO_COMPRESSORS'):
+		options["compressors"] = os.getenv('MONGO_COMPRESSORS')
+	return options
+
+
+def _get_client(kind:str, factory):
+	client = _clients.get(kind)
+	if client is None:
+		with _lock:
+			client = _clients.get(kind)
+			if client is None:
+				client = _clients[kind] = factory(os.getenv('DATABASE_URL'), **client_options())
+	return client
+
+
+def get_client():
+	"""
+	:return: This process's pymongo client, created on first use.
+	"""
+	return _get_client("sync", MongoClient)
+
+
+def get_async_client():
+	"""
+	:return: This process's Motor client, created on first use.
+	"""
+	# motor is only needed by the async backend
+	from motor.motor_asyncio import AsyncIOMotorClient
+	return _get_client("async", AsyncIOMotorClient)
+
+
+def get_database():
+	"""
+	:return: The Goldfish database on the pymongo client.
+	"""
+	return get_client()[database_name]
+
+
+def get_async_database():
+	"""
+	:return: The Goldfish database on the Motor client.
+	"""
+	return get_async_client()[database_name]
+
+
+def close_clients():
+	"""
+	Close every client this process opened.
+	"""
+	global _generation
+	with _lock:
+		for client in _clients.values():
+			client.close()
+		_clients.clear()
+		_generation += 1
+
+
+def _forget_parent_clients():
+	# a forked child must not use the parent's sockets or monitor threads
+	global _lock, _generation
+	_lock = threading.Lock()
+	_clients.clear()
+	_generation += 1
+
+
+os.register_at_fork(after_in_child=_forget_parent_clients)
+
+
+class LazyHandle:
+	"""
+	Stand-in for a client, database or collection that is resolved on
+	first use, and again after a fork or close_clients(), so importing
+	a module never connects.
+
+	Attributes:
+		resolve: Function returning the real object.
+	"""
+
+	def __init__(self, resolve):
+		self._resolve = resolve
+		self._target = None
+		self._target_generation = None
+
+	def _get(self):
+		if self._target_generation != _generation or self._target is None:
+			self._target = self._resolve()
+			self._target_generation = _generation
+		return self._target
+
+	def __getattr__(self, name):
+		return getattr(self._get(), name)
+
+	def __getitem__(self, name):
+		return self._get()[name]
+
+	def __repr__(self):
+		return f"LazyHandle({self._resolve.__name__})"
+
+
+def lazy_collection(name:str, database=get_database, read_preference=None):
+	"""
+	:param name: Name of the collection.
+	:param database: get_database or get_async_database.
+	:param read_preference: Read preference of the handle, None for the client's.
+	:return: A LazyHandle for the collection.
+	"""
+	def collection():
+		if read_preference is None:
+			return database()[name]
+		return database()[name].with_options(read_preference=read_preference)
+	collection.__name__ = name
+	return LazyHandle(collection)
@@ -16,7 +16,7 @@ Date: 07/06/2024
 """
 
 from pydantic import BaseModel, Field, EmailStr, root_validator
-from typing import List, Dict, Any, Literal
+from typing import List, Dict, Any, Literal, Optional
 from datetime import datetime
 
 class Process_update_meta_data_schema(BaseModel):
@@ -115,4 +115,41 @@ class Graph_update_process_list_order(BaseModel):
     process_list: List[str]
 
 
+class Process_bulk_update_schema(BaseModel):
+    """
+    Pydantic model for one entry of a bulk process update. Only the
+    fields that are supplied are updated.
+
+    Attributes:
+        update_id (str): The unique identifier of the process to update.
+        meta_data (Dict[str, Any]): Metadata to replace, if supplied.
+        elastic_data_paths (Dict[str, Any]): Elastic data paths to replace, if supplied.
+        file_location_type (Literal): The type of file location, if supplied.
+    """
+    update_id: str
+    meta_data: Optional[Dict[str, Any]] = None
+    elastic_data_paths: Optional[Dict[str, Any]] = None
+    file_location_type: Optional[Literal[
+                            'digs_local', 
+                            'pool', 
+                            'embedded', 
+                            'mixed'
+                        ]] = None
+
+class Graph_bulk_update_schema(BaseModel):
+    """
+    Pydantic model for one entry of a bulk graph update. Only the
+    fields that are supplied are updated.
 
+    Attributes:
+        update_id (str): The unique identifier of the graph to update.
+        project_name (str): The name of the project, if supplied.
+        owner (str): The owner of the project, if supplied.
+        owner_email (str): The email of the project owner, if supplied.
+        process_meta_data (Dict[str, Any]): Metadata associated with the process, if supplied.
+    """
+    update_id: str
+    project_name: Optional[str] = None
+    owner: Optional[str] = None
+    owner_email: Optional[str] = None
+    process_meta_data: Optional[Dict[str, Any]] = None
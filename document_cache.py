@@ -0,0 +1,191 @@
+"""
+-------------------------------------------------------------------
+This is a Goldfish Project File
+
+Authors: Max Witwer, Jie Chen, Elliott Cole
+Collaboration with the Baker Lab
+
+This file was generated during an internship at the institute for
+protein design
+
+Description:
+This file contains the in-process read-through cache that sits in
+front of the graph and process id lookups. Entries are evicted in
+least recently used order once the cache is full and expire after a
+time to live. The CRUD layers invalidate entries on every write they
+make, and a read only fills the cache if no invalidation happened
+while it was querying the database, so a slow read can not put a
+document back that a concurrent write just changed.
+
+Configuration (environment variables):
+    CACHE_ENABLED       "true" (default) or "false"
+    CACHE_MAX_SIZE      maximum entries per cache (default 10000)
+    CACHE_TTL_SECONDS   seconds before an entry expires (default 60)
+
+
+Date: 07/06/2024
+-------------------------------------------------------------------
+"""
+
+from dotenv import load_dotenv
+import os
+
+import threading
+import time
+from collections import OrderedDict
+
+# load environmental varibles from ".env" file
+load_dotenv()
+
+
+class DocumentCache:
+	"""
+	Bounded LRU cache with TTL expiry and hit/miss/eviction counters.
+	Safe to use from several threads.
+
+	Attributes:
+		name (str): Name used when reporting the counters.
+		max_size (int): Maximum number of entries held.
+		ttl (float): Seconds an entry stays valid.
+		enabled (bool): When False every lookup is a miss and nothing is stored.
+	"""
+
+	def __init__(self, name:str, max_size:int=10000, ttl:float=60.0, enabled:bool=True):
+		self.name = name
+		self.max_size = max_size
+		self.ttl = ttl
+		self.enabled = enabled
+
+		self._entries = OrderedDict()
+		self._lock = threading.Lock()
+		self._invalidation_count = 0
+
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self.expirations = 0
+		self.invalidations = 0
+
+	def get(self, key):
+		"""
+		Look up a document.
+
+		:param key: The document id.
+		:return: The cached document, or None on a miss.
+		"""
+		with self._lock:
+			entry = self._entries.get(key) if self.enabled else None
+			if entry is None:
+				self.misses += 1
+				return None
+
+			document, expires_at = entry
+			if expires_at < time.monotonic():
+				del self._entries[key]
+				self.expirations += 1
+				self.misses += 1
+				return None
+
+			self._entries.move_to_end(key)
+			self.hits += 1
+			return document
+
+	def version(self):
+		"""
+		Current invalidation version. Take it before reading from the
+		database and pass it to set() so the read is dropped if a write
+		invalidated anything in the meantime.
+
+		:return: An opaque version number.
+		"""
+		return self._invalidation_count
+
+	def set(self, key, document:dict, version:int=None):
+		"""
+		Store a document.
+
+		:param key: The document id.
+		:param document: The full document to cache.
+		:param version: Value of version() taken before the database read.
+		"""
+		if not self.enabled:
+			return
+		with self._lock:
+			if version is not None and version != self._invalidation_count:
+				return
+
+			self._entries[key] = (document, time.monotonic() + self.ttl)
+			self._entries.move_to_end(key)
+			while len(self._entries) > self.max_size:
+				self._entries.popitem(last=False)
+				self.evictions += 1
+
+	def invalidate(self, *keys):
+		"""
+		Drop documents after they were written.
+
+		:param keys: The ids of the changed documents.
+		"""
+		with self._lock:
+			self._invalidation_count += 1
+			for key in keys:
+				if self._entries.pop(key, None) is not None:
+					self.invalidations += 1
+
+	def invalidate_where(self, predicate):
+		"""
+		Drop every cached document matching a predicate, used when a write
+		affects documents whose ids are not known up front.
+
+		:param predicate: Function taking a document and returning True to drop it.
+		"""
+		with self._lock:
+			self._invalidation_count += 1
+			for key in [key for key, (document, _) in self._entries.items() if predicate(document)]:
+				del self._entries[key]
+				self.invalidations += 1
+
+	def clear(self):
+		"""
+		Drop every cached document.
+		"""
+		with self._lock:
+			self._invalidation_count += 1
+			self.invalidations += len(self._entries)
+			self._entries.clear()
+
+	def stats(self):
+		"""
+		Report the cache counters.
+
+		:return: A dictionary of the current size and counters.
+		"""
+		with self._lock:
+			return {
+				"size": len(self._entries),
+				"max_size": self.max_size,
+				"ttl_seconds": self.ttl,
+				"hits": self.hits,
+				"misses": self.misses,
+				"evictions": self.evictions,
+				"expirations": self.expirations,
+				"invalidations": self.invalidations,
+			}
+
+
+cache_enabled = os.getenv('CACHE_ENABLED', 'true').lower() == 'true'
+cache_max_size = int(os.getenv('CACHE_MAX_SIZE', '10000'))
+cache_ttl = float(os.getenv('CACHE_TTL_SECONDS', '60'))
+
+# caches shared by the sync and async CRUD layers
+graph_cache = DocumentCache("graph_map", cache_max_size, cache_ttl, cache_enabled)
+process_cache = DocumentCache("process_step", cache_max_size, cache_ttl, cache_enabled)
+
+
+def cache_stats():
+	"""
+	Report the counters of every document cache.
+
+	:return: A dictionary of cache name to its counters.
+	"""
+	return {cache.name: cache.stats() for cache in (graph_cache, process_cache)}
@@ -0,0 +1,110 @@
+"""
+-------------------------------------------------------------------
+This is a Goldfish Project File
+
+Authors: Max Witwer, Jie Chen, Elliott Cole
+Collaboration with the Baker Lab
+
+This file was generated during an internship at the institute for
+protein design
+
+Description:
+This file runs graph deletions as background jobs. Deleting a graph
+with hundreds of thousands of processes takes far longer than a
+request should, so the endpoint only records a job and returns its
+id while a background thread runs the batched cascade from
+CRUD_utils. Job progress is stored in the jobs collection so any
+worker can report the status of any job.
+
+
+Date: 07/06/2024
+-------------------------------------------------------------------
+"""
+
+import logging
+import threading
+import uuid
+from datetime import datetime
+
+from db_connection import lazy_collection
+from CRUD_utils import cascade_delete_graph, process_collection, pull_graph_id
+
+logger = logging.getLogger(__name__)
+
+job_collection = lazy_collection("jobs")
+
+
+def _run_graph_delete_job(job_id:str, graph_id:str, batch_size:int):
+	"""
+	Body of the background thread: run the cascade and record its progress.
+
+	:param job_id: The id of the job document.
+	:param graph_id: The graph to delete.
+	:param batch_size: Maximum number of processes deleted per batch.
+	"""
+	def record_progress(deleted_processes:int):
+		job_collection.update_one(
+			{"_id": job_id},
+			{'$set': {"deleted_processes": deleted_processes, "date_updated": datetime.utcnow()}}
+		)
+
+	job_collection.update_one({"_id": job_id}, {'$set': {"status": "running", "date_updated": datetime.utcnow()}})
+	try:
+		report = cascade_delete_graph(graph_id, batch_size=batch_size, on_progress=record_progress)
+	except Exception as error:
+		logger.exception("graph delete job %s failed", job_id)
+		job_collection.update_one(
+			{"_id": job_id},
+			{'$set': {"status": "failed", "error": str(error), "date_updated": datetime.utcnow()}}
+		)
+		return
+
+	status = "completed" if not report["remaining_processes"] else "inconsistent"
+	job_collection.update_one(
+		{"_id": job_id},
+		{'$set': {"status": status, **report, "date_updated": datetime.utcnow()}}
+	)
+
+
+def start_graph_delete_job(graph_id:str, batch_size:int=1000):
+	"""
+	Record a graph delete job and start it in a background thread.
+
+	:param graph_id: The unique identifier of the graph document to delete.
+	:param batch_size: Maximum number of processes deleted per batch.
+	:return: The job document, or None if the graph has nothing to delete.
+	"""
+	total_processes = process_collection.count_documents({"parent_graph" : graph_id})
+	if not total_processes and not pull_graph_id(graph_id, {"_id": 1}):
+		return None
+
+	time_stamp = datetime.utcnow()
+	job = {
+		"_id": str(uuid.uuid4()),
+		"type": "graph_delete",
+		"graph_id": graph_id,
+		"status": "queued",
+		"total_processes": total_processes,
+		"deleted_processes": 0,
+		"date_created": time_stamp,
+		"date_updated": time_stamp
+	}
+	job_collection.insert_one(job)
+
+	threading.Thread(
+		target=_run_graph_delete_job,
+		args=(job["_id"], graph_id, batch_size),
+		name=f"goldfish-graph-delete-{job['_id']}",
+		daemon=True
+	).start()
+	return job
+
+
+def pull_job_status(job_id:str):
+	"""
+	Pull the current state of a background job.
+
+	:param job_id: The id returned when the job was started.
+	:return: The job document if found, otherwise None.
+	"""
+	return job_collection.find_one({"_id": job_id})
@@ -0,0 +1,272 @@
+"""
+-------------------------------------------------------------------
+This is a Goldfish Project File
+
+Authors: Max Witwer, Jie Chen, Elliott Cole
+Collaboration with the Baker Lab
+
+This file was generated during an internship at the institute for
+protein design
+
+Description:
+This file contains the graph_summary collection helpers. Every graph
+has one summary document holding its process count, the number of
+processes per file_location_type and the number of processes per
+elastic_data_paths key (pdb, fasta, ...):
+
+    {"_id": graph id, "process_count": 3,
+     "file_location_type": {"embedded": 2, "pool": 1},
+     "data_keys": {"pdb": 3, "fasta": 1}, "date_updated": ...}
+
+The data_key_catalog collection holds the same data key counts over
+all processes, one document per key, so the known keys are listed
+without touching the processes:
+
+    {"_id": "pdb", "process_count": 1200, "date_updated": ...}
+
+The CRUD layers keep both up to date with $inc updates computed from
+the before and after image of every process they create, change or
+delete, so a summary is read with a single lookup. The full rebuild
+recomputes the summaries and the catalog from the process collection
+on the server; it replaces the documents it writes, so run it outside
+of heavy ingestion.
+
+Usage (from the repository root):
+    python graph_summary.py rebuild                  rebuild every summary and the catalog
+    python graph_summary.py rebuild --graph-id ID    rebuild selected graphs
+
+
+Date: 07/06/2024
+-------------------------------------------------------------------
+"""
+
+import argparse
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+# process fields the summary is computed from
+SUMMARY_PROJECTION = {"parent_graph": 1, "file_location_type": 1, "elastic_data_paths": 1}
+
+# file_location_type recorded for processes without one
+UNKNOWN_LOCATION = "unknown"
+
+
+def _process_counts(process:dict, sign:int):
+	"""
+	:return: The $inc fields one process contributes, multiplied by sign.
+	"""
+	counts = {
+		"process_count": sign,
+		f"file_location_type.{process.get('file_location_type') or UNKNOWN_LOCATION}": sign,
+	}
+	for data_key in process.get("elastic_data_paths") or {}:
+		counts[f"data_keys.{data_key}"] = sign
+	return counts
+
+
+def summary_operations(changes:list):
+	"""
+	Turn process changes into summary updates, one per affected graph.
+
+	:param changes: list of (before, after) process documents holding at least
+	                the SUMMARY_PROJECTION fields, None before a create and
+	                after a delete.
+	:return: A list of UpdateOne operations for the graph_summary collection.
+	"""
+	increments = {}
+	for before, after in changes:
+		for process, sign in ((before, -1), (after, 1)):
+			if process is None:
+				continue
+			graph_increments = increments.setdefault(process["parent_graph"], {})
+			for field, amount in _process_counts(process, sign).items():
+				graph_increments[field] = graph_increments.get(field, 0) + amount
+
+	time_stamp = datetime.utcnow()
+	operations = []
+	for graph_id, graph_increments in increments.items():
+		graph_increments = {field: amount for field, amount in graph_increments.items() if amount}
+		if graph_increments:
+			operations.append(UpdateOne(
+				{"_id": graph_id},
+				{'$inc': graph_increments, '$set': {"date_updated": time_stamp}},
+				upsert=True
+			))
+	return operations
+
+
+def _catalog_updates(increments:dict):
+	time_stamp = datetime.utcnow()
+	return [
+		UpdateOne(
+			{"_id": data_key},
+			{'$inc': {"process_count": amount}, '$set': {"date_updated": time_stamp}},
+			upsert=True
+		)
+		for data_key, amount in sorted(increments.items()) if amount
+	]
+
+
+def catalog_operations(changes:list):
+	"""
+	Turn process changes into data key catalog updates, one per affected key.
+
+	:param changes: list of (before, after) process documents, as for summary_operations().
+	:return: A list of UpdateOne operations for the data_key_catalog collection.
+	"""
+	increments = {}
+	for before, after in changes:
+		for process, sign in ((before, -1), (after, 1)):
+			if process is None:
+				continue
+			for data_key in process.get("elastic_data_paths") or {}:
+				increments[data_key] = increments.get(data_key, 0) + sign
+	return _catalog_updates(increments)
+
+
+def catalog_removals(summary:dict):
+	"""
+	:param summary: The summary of a graph whose processes were all deleted.
+	:return: A list of UpdateOne operations taking its data keys off the catalog.
+	"""
+	return _catalog_updates({data_key: -count for data_key, count in summary.get("data_keys", {}).items()})
+
+
+def catalog_differences(before:dict, after:dict):
+	"""
+	:param before: The summary of a graph before a change, None if it had none.
+	:param after: The summary rebuilt after the change, None if it was removed.
+	:return: A list of UpdateOne operations moving the catalog by the
+	         difference of their data key counts.
+	"""
+	increments = {}
+	for summary, sign in ((before, -1), (after, 1)):
+		for data_key, count in (summary or {}).get("data_keys", {}).items():
+			increments[data_key] = increments.get(data_key, 0) + sign * count
+	return _catalog_updates(increments)
+
+
+def catalog_rebuild_pipeline(catalog_collection_name:str, rebuilt_at:datetime):
+	"""
+	Aggregation over the process collection that recounts the data keys
+	and writes the catalog with $merge.
+
+	:param catalog_collection_name: Name of the data_key_catalog collection.
+	:param rebuilt_at: Timestamp stored as date_updated on every rebuilt key.
+	:return: The pipeline.
+	"""
+	return [
+		{"$project": {"data_keys": {"$objectToArray": {"$ifNull": ["$elastic_data_paths", {}]}}}},
+		{"$unwind": "$data_keys"},
+		{"$group": {"_id": "$data_keys.k", "process_count": {"$sum": 1}}},
+		{"$set": {"date_updated": {"$literal": rebuilt_at}}},
+		{"$merge": {"into": catalog_collection_name, "whenMatched": "replace", "whenNotMatched": "insert"}},
+	]
+
+
+def rebuild_pipeline(process_collection_name:str, summary_collection_name:str, rebuilt_at:datetime, graph_ids:list=None):
+	"""
+	Aggregation over the process collection that recomputes the summaries
+	and writes them with $merge.
+
+	:param process_collection_name: Name of the process collection the pipeline runs on.
+	:param summary_collection_name: Name of the graph_summary collection.
+	:param rebuilt_at: Timestamp stored as date_updated on every rebuilt summary.
+	:param graph_ids: Graphs to rebuild, None for all.
+	:return: The pipeline.
+	"""
+	match = [{"$match": {"parent_graph": {"$in": graph_ids}}}] if graph_ids is not None else []
+
+	def entries(field:str):
+		return {"$arrayToObject": {"$map": {
+			"input": {"$filter": {"input": "$entries", "cond": {"$eq": ["$$this.field", field]}}},
+			"in": {"k": "$$this.k", "v": "$$this.n"}
+		}}}
+
+	return match + [
+		{"$group": {
+			"_id": {
+				"graph": "$parent_graph",
+				"field": "file_location_type",
+				"k": {"$ifNull": ["$file_location_type", UNKNOWN_LOCATION]}
+			},
+			"n": {"$sum": 1}
+		}},
+		{"$unionWith": {"coll": process_collection_name, "pipeline": match + [
+			{"$project": {"parent_graph": 1, "data_keys": {"$objectToArray": {"$ifNull": ["$elastic_data_paths", {}]}}}},
+			{"$unwind": "$data_keys"},
+			{"$group": {"_id": {"graph": "$parent_graph", "field": "data_keys", "k": "$data_keys.k"}, "n": {"$sum": 1}}}
+		]}},
+		{"$group": {
+			"_id": "$_id.graph",
+			"process_count": {"$sum": {"$cond": [{"$eq": ["$_id.field", "file_location_type"]}, "$n", 0]}},
+			"entries": {"$push": {"field": "$_id.field", "k": "$_id.k", "n": "$n"}}
+		}},
+		{"$project": {
+			"process_count": 1,
+			"file_location_type": entries("file_location_type"),
+			"data_keys": entries("data_keys"),
+			"date_updated": {"$literal": rebuilt_at}
+		}},
+		{"$merge": {"into": summary_collection_name, "whenMatched": "replace", "whenNotMatched": "insert"}},
+	]
+
+
+def rebuild_timestamp():
+	"""
+	:return: The current time at the millisecond precision Mongo stores, so
+	         it compares equal to the date_updated written by a rebuild.
+	"""
+	now = datetime.utcnow()
+	return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
+def stale_summary_filter(rebuilt_at:datetime, graph_ids:list=None):
+	"""
+	:return: Filter matching the summaries a rebuild did not write, i.e.
+	         graphs that no longer have any processes.
+	"""
+	stale = {"date_updated": {"$lt": rebuilt_at}}
+	if graph_ids is not None:
+		stale["_id"] = {"$in": graph_ids}
+	return stale
+
+
+def empty_summary(graph_id:str):
+	"""
+	:return: The summary of a graph without processes.
+	"""
+	return {"_id": graph_id, "process_count": 0, "file_location_type": {}, "data_keys": {}}
+
+
+def without_zero_counts(summary:dict):
+	"""
+	:return: The summary without the counts that dropped back to zero.
+	"""
+	for field in ("file_location_type", "data_keys"):
+		summary[field] = {key: count for key, count in summary.get(field, {}).items() if count}
+	return summary
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Manage the Goldfish graph summaries")
+	subparsers = parser.add_subparsers(dest="command", required=True)
+	rebuild_parser = subparsers.add_parser("rebuild", help="recompute summaries from the process collection")
+	rebuild_parser.add_argument("--graph-id", action="append", dest="graph_ids",
+		help="graph to rebuild, may be repeated, all graphs when omitted")
+	args = parser.parse_args()
+
+	# imported here since CRUD_utils itself imports this module
+	from CRUD_utils import rebuild_data_key_catalog, rebuild_graph_summaries
+
+	report = rebuild_graph_summaries(args.graph_ids)
+	print(f"rebuilt {report['rebuilt']} summaries, removed {report['removed']} stale summaries")
+	if args.graph_ids is None:
+		report = rebuild_data_key_catalog()
+		print(f"rebuilt {report['rebuilt']} data keys, removed {report['removed']} stale data keys")
+	return 0
+
+
+if __name__ == "__main__":
+	raise SystemExit(main())
@@ -0,0 +1,210 @@
+"""
+-------------------------------------------------------------------
+This is a Goldfish Project File
+
+Authors: Max Witwer, Jie Chen, Elliott Cole
+Collaboration with the Baker Lab
+
+This file was generated during an internship at the institute for
+protein design
+
+Description:
+This file contains the export and import format of whole graphs. An
+export is the graph document followed by every process of the graph,
+written one document at a time, either as NDJSON (one MongoDB
+extended JSON document per line, so dates and binary data survive
+the round trip) or as raw BSON documents back to back, the layout
+mongodump uses. Either can be compressed with zstd, which needs the
+optional zstandard package (pip install zstandard).
+
+Documents are encoded and decoded while they stream, so exports and
+imports run in constant memory whatever the size of the graph. The
+CRUD layer reads the processes with a cursor on export and writes
+them with batched insert_many calls on import.
+
+Usage (from the repository root):
+    python graph_transfer.py export GRAPH_ID graph.ndjson.zst
+    python graph_transfer.py import graph.ndjson.zst [--batch-size 1000]
+
+The format and compression follow the file suffix (.ndjson or .bson,
+then .zst) unless --format or --compression is given.
+
+
+Date: 07/06/2024
+-------------------------------------------------------------------
+"""
+
+import argparse
+import io
+
+import bson
+from bson import json_util
+from bson.errors import InvalidBSON
+
+try:
+	import zstandard
+except ImportError:
+	# optional, only needed for zstd compressed transfers
+	zstandard = None
+
+TRANSFER_FORMATS = ("ndjson", "bson")
+TRANSFER_COMPRESSIONS = ("none", "zstd")
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "bson": "application/bson", "zstd": "application/zstd"}
+
+# encoded documents are collected into chunks of about this size before they are written
+CHUNK_BYTES = 64 * 1024
+
+
+def check_transfer_options(format:str, compression:str):
+	"""
+	:raises ValueError: The format or compression is unknown, or zstd is
+	                    requested without the zstandard package.
+	"""
+	if format not in TRANSFER_FORMATS:
+		raise ValueError(f"format must be one of {', '.join(TRANSFER_FORMATS)}")
+	if compression not in TRANSFER_COMPRESSIONS:
+		raise ValueError(f"compression must be one of {', '.join(TRANSFER_COMPRESSIONS)}")
+	if compression == "zstd" and zstandard is None:
+		raise ValueError("zstd compression needs the zstandard package")
+
+
+def transfer_suffix(format:str, compression:str):
+	"""
+	:return: The file suffix of an export, e.g. ".ndjson.zst".
+	"""
+	return f".{format}" + (".zst" if compression == "zstd" else "")
+
+
+def transfer_media_type(format:str, compression:str):
+	"""
+	:return: The media type of an export response.
+	"""
+	return MEDIA_TYPES["zstd" if compression == "zstd" else format]
+
+
+def options_from_path(path:str):
+	"""
+	:param path: An export file name.
+	:return: The (format, compression) its suffix names.
+	"""
+	compression = "zstd" if path.endswith(".zst") else "none"
+	stem = path[:-len(".zst")] if compression == "zstd" else path
+	return ("bson" if stem.endswith(".bson") else "ndjson"), compression
+
+
+def _encode(document:dict, format:str):
+	if format == "bson":
+		return bson.encode(document)
+	return json_util.dumps(document, json_options=json_util.RELAXED_JSON_OPTIONS).encode() + b"\n"
+
+
+def export_stream(documents, format:str="ndjson", compression:str="none"):
+	"""
+	Encode documents into the chunks of an export. The options are checked
+	right away, the documents are only read as the chunks are consumed.
+
+	:param documents: Iterator over the graph document followed by its processes.
+	:param format: "ndjson" or "bson".
+	:param compression: "none" or "zstd".
+	:return: A generator over the bytes of the export.
+	:raises ValueError: See check_transfer_options().
+	"""
+	check_transfer_options(format, compression)
+
+	def chunks():
+		compressor = zstandard.ZstdCompressor().compressobj() if compression == "zstd" else None
+		buffer = bytearray()
+		for document in documents:
+			buffer += _encode(document, format)
+			if len(buffer) >= CHUNK_BYTES:
+				chunk = compressor.compress(bytes(buffer)) if compressor else bytes(buffer)
+				buffer.clear()
+				if chunk:
+					yield chunk
+		chunk = compressor.compress(bytes(buffer)) + compressor.flush() if compressor else bytes(buffer)
+		if chunk:
+			yield chunk
+
+	return chunks()
+
+
+def read_documents(stream, format:str="ndjson", compression:str="none"):
+	"""
+	Decode the documents of an export while reading it.
+
+	:param stream: A binary file object holding the export.
+	:param format: "ndjson" or "bson".
+	:param compression: "none" or "zstd".
+	:return: A generator over the decoded documents.
+	:raises ValueError: See check_transfer_options(), or while iterating,
+	                    the export can not be decoded.
+	"""
+	check_transfer_options(format, compression)
+
+	def documents():
+		reader = stream
+		if compression == "zstd":
+			# buffered so reads return the full length the BSON decoder asks for
+			reader = io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(stream))
+		if format == "bson":
+			yield from bson.decode_file_iter(reader)
+			return
+		for line in reader:
+			if line.strip():
+				yield json_util.loads(line)
+
+	errors = (InvalidBSON, zstandard.ZstdError) if zstandard else (InvalidBSON,)
+
+	def checked():
+		try:
+			yield from documents()
+		except errors as error:
+			raise ValueError(f"the export can not be decoded: {error}") from error
+
+	return checked()
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Export and import whole Goldfish graphs")
+	subparsers = parser.add_subparsers(dest="command", required=True)
+	export_parser = subparsers.add_parser("export", help="write a graph and its processes to a file")
+	export_parser.add_argument("graph_id", help="the graph to export")
+	export_parser.add_argument("path", help="the file to write")
+	import_parser = subparsers.add_parser("import", help="load a graph and its processes from a file")
+	import_parser.add_argument("path", help="the file to read")
+	import_parser.add_argument("--batch-size", type=int, default=1000, help="processes per insert_many")
+	for subparser in (export_parser, import_parser):
+		subparser.add_argument("--format", choices=TRANSFER_FORMATS, help="default from the file suffix")
+		subparser.add_argument("--compression", choices=TRANSFER_COMPRESSIONS, help="default from the file suffix")
+	args = parser.parse_args()
+
+	format, compression = options_from_path(args.path)
+	format, compression = args.format or format, args.compression or compression
+	check_transfer_options(format, compression)
+
+	# imported here so the format helpers do not depend on the data layer
+	from CRUD_utils import export_graph, import_graph
+
+	if args.command == "export":
+		documents = export_graph(args.graph_id)
+		if documents is None:
+			print(f"graph '{args.graph_id}' not found")
+			return 1
+		with open(args.path, "wb") as output:
+			for chunk in export_stream(documents, format, compression):
+				output.write(chunk)
+		print(f"exported graph '{args.graph_id}' to {args.path}")
+		return 0
+
+	with open(args.path, "rb") as input:
+		result = import_graph(read_documents(input, format, compression), args.batch_size)
+	if result is None:
+		print("the graph already exists")
+		return 1
+	print(f"imported graph '{result['_id']}' with {result['processes']} processes")
+	return 0
+
+
+if __name__ == "__main__":
+	raise SystemExit(main())
@@ -0,0 +1,202 @@
+"""
+-------------------------------------------------------------------
+This is a Goldfish Project File
+
+Authors: Max Witwer, Jie Chen, Elliott Cole
+Collaboration with the Baker Lab
+
+This file was generated during an internship at the institute for
+protein design
+
+Description:
+This file declares every index the CRUD_utils queries rely on and
+keeps the live database in line with those declarations. Indexes
+are created idempotently when the api starts, drift between the
+declared and live indexes can be reported, and the command line
+interface allows building the indexes on large collections ahead
+of a deployment.
+
+Usage:
+    python index_manager.py check
+    python index_manager.py build [--background]
+
+
+Date: 07/06/2024
+-------------------------------------------------------------------
+"""
+
+import argparse
+import logging
+
+from pymongo import ASCENDING, TEXT, IndexModel
+
+from CRUD_utils import db
+
+logger = logging.getLogger(__name__)
+
+# indexes required by the pull_* functions, keyed by collection name.
+# Listing queries end on (date_created, _id) so the keyset pagination
+# sort in query_utils is served by the index instead of an in-memory sort.
+INDEX_SPECS = {
+	"graph_map": [
+		# pull_graph_collection pages
+		IndexModel([("date_created", ASCENDING), ("_id", ASCENDING)], name="date_created_1__id_1"),
+		# pull_graphs_owner
+		IndexModel(
+			[("owner", ASCENDING), ("date_created", ASCENDING), ("_id", ASCENDING)],
+			name="owner_1_date_created_1__id_1"
+		),
+		# pull_graphs_email
+		IndexModel(
+			[("owner_email", ASCENDING), ("date_created", ASCENDING), ("_id", ASCENDING)],
+			name="owner_email_1_date_created_1__id_1"
+		),
+		# pull_graph_project_name, prefix search_graphs on project_name
+		IndexModel([("project_name", ASCENDING), ("_id", ASCENDING)], name="project_name_1__id_1"),
+		# prefix search_graphs on owner
+		IndexModel([("owner", ASCENDING), ("_id", ASCENDING)], name="owner_1__id_1"),
+		# text search_graphs, a collection holds at most one text index
+		IndexModel(
+			[("project_name", TEXT), ("owner", TEXT), ("process_meta_data.description", TEXT)],
+			name="graph_text",
+			weights={"project_name": 10, "owner": 5, "process_meta_data.description": 1}
+		),
+	],
+	"process_step": [
+		# pull_process_collection pages
+		IndexModel([("date_created", ASCENDING), ("_id", ASCENDING)], name="date_created_1__id_1"),
+		# pull_processes_parent_graph, delete_all_from_parent_graph
+		IndexModel(
+			[("parent_graph", ASCENDING), ("date_created", ASCENDING), ("_id", ASCENDING)],
+			name="parent_graph_1_date_created_1__id_1"
+		),
+		# pull_processes_file_location_type
+		IndexModel(
+			[("file_location_type", ASCENDING), ("date_created", ASCENDING), ("_id", ASCENDING)],
+			name="file_location_type_1_date_created_1__id_1"
+		),
+		# pull_processes_data_path, multikey over every path in elastic_data_paths
+		IndexModel(
+			[("data_paths", ASCENDING), ("date_created", ASCENDING), ("_id", ASCENDING)],
+			name="data_paths_1_date_created_1__id_1"
+		),
+		# pull_processes_data_type, one wildcard index covers every data key;
+		# it can not end on (date_created, _id), so the page sort runs over the matches
+		IndexModel([("elastic_data_paths.$**", ASCENDING)], name="elastic_data_paths.$**_1"),
+	],
+}
+
+
+def _index_key(index_document):
+	"""
+	Normalise an index key specification for comparison.
+
+	:param index_document: index description from IndexModel or index_information.
+	:return: The key as a tuple of (field, direction) pairs.
+	"""
+	key = index_document["key"]
+	if hasattr(key, "items"):
+		key = key.items()
+	key = tuple((field, direction) for field, direction in key)
+
+	# live text indexes are keyed on _fts/_ftsx, their fields are in the weights
+	if ("_fts", "text") in key:
+		return tuple(sorted((field, TEXT) for field in index_document["weights"]))
+	if any(direction == TEXT for _, direction in key):
+		return tuple(sorted(key))
+	return key
+
+
+def ensure_indexes(database=db, background=False):
+	"""
+	Create all declared indexes. Existing indexes with an identical
+	specification are left untouched so this is safe to run on every start.
+
+	:param database: The database to create the indexes on.
+	:param background: Request a background build (ignored by MongoDB 4.2+,
+	                   which always uses the optimized build process).
+	:return: A dictionary of collection name to the index names ensured.
+	"""
+	ensured = {}
+	for collection_name, index_models in INDEX_SPECS.items():
+		if background:
+			index_models = [
+				IndexModel(
+					list(model.document["key"].items()), background=True,
+					**{option: value for option, value in model.document.items() if option != "key"}
+				)
+				for model in index_models
+			]
+		ensured[collection_name] = database[collection_name].create_indexes(index_models)
+	return ensured
+
+
+def index_drift(database=db):
+	"""
+	Compare the declared indexes against the indexes in the live database.
+
+	:param database: The database to inspect.
+	:return: A dictionary per collection listing missing, mismatched and
+	         undeclared indexes. Collections without drift are omitted.
+	"""
+	drift = {}
+	for collection_name, index_models in INDEX_SPECS.items():
+		live_indexes = database[collection_name].index_information()
+		live_indexes.pop("_id_", None)
+
+		declared = {model.document["name"]: _index_key(model.document) for model in index_models}
+		live = {name: _index_key(info) for name, info in live_indexes.items()}
+
+		collection_drift = {
+			"missing": sorted(name for name in declared if name not in live),
+			"mismatched": sorted(name for name in declared if name in live and live[name] != declared[name]),
+			"undeclared": sorted(name for name in live if name not in declared),
+		}
+		if any(collection_drift.values()):
+			drift[collection_name] = collection_drift
+	return drift
+
+
+def bootstrap_indexes(mode="create"):
+	"""
+	Startup hook used by the api.
+
+	:param mode: "create" to ensure the indexes, "check" to only log drift,
+	             "off" to skip index management entirely.
+	:return: The drift remaining after the bootstrap ran.
+	"""
+	if mode == "off":
+		return {}
+	if mode == "create":
+		ensure_indexes()
+
+	drift = index_drift()
+	for collection_name, collection_drift in drift.items():
+		logger.warning("index drift on %s: %s", collection_name, collection_drift)
+	return drift
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Manage the Goldfish database indexes")
+	subparsers = parser.add_subparsers(dest="command", required=True)
+	subparsers.add_parser("check", help="report drift between declared and live indexes")
+	build_parser = subparsers.add_parser("build", help="create all declared indexes")
+	build_parser.add_argument("--background", action="store_true",
+		help="request background index builds for large collections")
+	args = parser.parse_args()
+
+	if args.command == "build":
+		for collection_name, index_names in ensure_indexes(background=args.background).items():
+			print(f"{collection_name}: {', '.join(index_names)}")
+
+	drift = index_drift()
+	if not drift:
+		print("indexes are in sync")
+		return 0
+	for collection_name, collection_drift in drift.items():
+		print(f"{collection_name}: {collection_drift}")
+	return 1
+
+
+if __name__ == "__main__":
+	raise SystemExit(main())
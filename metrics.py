@@ -0,0 +1,359 @@
+"""
+-------------------------------------------------------------------
+This is a Goldfish Project File
+
+Authors: Max Witwer, Jie Chen, Elliott Cole
+Collaboration with the Baker Lab
+
+This file was generated during an internship at the institute for
+protein design
+
+Description:
+This file contains the service instrumentation. An http middleware
+records the latency of every route and how many Mongo round trips
+the request made, the timed decorator records the latency of every
+CRUD function, and a pymongo command listener records the latency
+of every Mongo command and writes commands slower than a threshold
+to the slow query log together with the shape of their filter. A
+pool listener records how long requests wait to check a connection
+out of the Mongo connection pool. All metrics are rendered in the
+Prometheus text format for /metrics.
+
+Configuration (environment variables):
+    MONGO_SLOW_QUERY_MS   commands slower than this are logged (default 100)
+
+
+Date: 07/06/2024
+-------------------------------------------------------------------
+"""
+
+from dotenv import load_dotenv
+import os
+
+import contextvars
+import functools
+import inspect
+import logging
+import threading
+import time
+
+from pymongo import monitoring
+
+from query_guard import filter_signature
+
+# load environmental varibles from ".env" file
+load_dotenv()
+
+slow_query_logger = logging.getLogger("goldfish.slow_query")
+
+# default histogram buckets in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+	return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _label_text(names:tuple, values:tuple, extra:str=""):
+	pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+	if extra:
+		pairs.append(extra)
+	return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+	"""
+	Monotonic counter with labels.
+
+	Attributes:
+		name (str): Metric name, without the _total suffix.
+		description (str): Help text.
+		label_names (tuple): Names of the labels, in order.
+	"""
+
+	def __init__(self, name:str, description:str, label_names:tuple=()):
+		self.name = name
+		self.description = description
+		self.label_names = label_names
+		self._values = {}
+		self._lock = threading.Lock()
+
+	def inc(self, *label_values, amount:float=1):
+		with self._lock:
+			self._values[label_values] = self._values.get(label_values, 0) + amount
+
+	def render(self):
+		lines = [f"# HELP {self.name}_total {self.description}", f"# TYPE {self.name}_total counter"]
+		with self._lock:
+			for label_values, value in self._values.items():
+				lines.append(f"{self.name}_total{_label_text(self.label_names, label_values)} {value}")
+		return "\n".join(lines) + "\n"
+
+
+class Histogram:
+	"""
+	Cumulative histogram with labels.
+
+	Attributes:
+		name (str): Metric name.
+		description (str): Help text.
+		label_names (tuple): Names of the labels, in order.
+		buckets (tuple): Upper bounds of the buckets, ascending.
+	"""
+
+	def __init__(self, name:str, description:str, label_names:tuple=(), buckets:tuple=LATENCY_BUCKETS):
+		self.name = name
+		self.description = description
+		self.label_names = label_names
+		self.buckets = buckets
+		# label values -> [bucket counts, sum, count]
+		self._series = {}
+		self._lock = threading.Lock()
+
+	def observe(self, value:float, *label_values):
+		with self._lock:
+			series = self._series.get(label_values)
+			if series is None:
+				series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+			for index, bound in enumerate(self.buckets):
+				if value <= bound:
+					series[0][index] += 1
+					break
+			series[1] += value
+			series[2] += 1
+
+	def render(self):
+		lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+		with self._lock:
+			for label_values, (bucket_counts, total, count) in self._series.items():
+				cumulative = 0
+				for bound, bucket_count in zip(self.buckets, bucket_counts):
+					cumulative += bucket_count
+					labels = _label_text(self.label_names, label_values, f'le="{bound}"')
+					lines.append(f"{self.name}_bucket{labels} {cumulative}")
+				labels = _label_text(self.label_names, label_values, 'le="+Inf"')
+				lines.append(f"{self.name}_bucket{labels} {count}")
+				lines.append(f"{self.name}_sum{_label_text(self.label_names, label_values)} {total}")
+				lines.append(f"{self.name}_count{_label_text(self.label_names, label_values)} {count}")
+		return "\n".join(lines) + "\n"
+
+
+request_latency = Histogram(
+	"goldfish_http_request_duration_seconds", "Latency of api requests by route.",
+	("method", "route", "status")
+)
+request_mongo_commands = Histogram(
+	"goldfish_http_request_mongo_commands", "Mongo round trips made per api request.",
+	("route",), buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100)
+)
+crud_latency = Histogram(
+	"goldfish_crud_duration_seconds", "Latency of CRUD layer functions.",
+	("module", "function")
+)
+mongo_command_latency = Histogram(
+	"goldfish_mongo_command_duration_seconds", "Latency of Mongo commands.",
+	("command",)
+)
+mongo_command_failures = Counter(
+	"goldfish_mongo_command_failures", "Mongo commands that returned an error.",
+	("command",)
+)
+slow_queries = Counter(
+	"goldfish_mongo_slow_queries", "Mongo commands slower than MONGO_SLOW_QUERY_MS.",
+	("command", "collection")
+)
+
+pool_checkout_wait = Histogram(
+	"goldfish_mongo_pool_checkout_seconds", "Time spent waiting to check a connection out of the pool.",
+	("address",)
+)
+pool_checkout_failures = Counter(
+	"goldfish_mongo_pool_checkout_failures", "Connection checkouts that failed, e.g. on waitQueueTimeoutMS.",
+	("address", "reason")
+)
+pool_connections_created = Counter(
+	"goldfish_mongo_pool_connections_created", "Connections opened by the pool.",
+	("address",)
+)
+pool_connections_closed = Counter(
+	"goldfish_mongo_pool_connections_closed", "Connections closed by the pool.",
+	("address", "reason")
+)
+
+REGISTRY = [
+	request_latency, request_mongo_commands, crud_latency, mongo_command_latency, mongo_command_failures,
+	slow_queries, pool_checkout_wait, pool_checkout_failures, pool_connections_created, pool_connections_closed
+]
+
+# per request counters, set by the middleware and read by the command listener
+request_stats = contextvars.ContextVar("request_stats", default=None)
+
+
+def render_metrics():
+	"""
+	:return: Every metric in the Prometheus text format.
+	"""
+	return "".join(metric.render() for metric in REGISTRY)
+
+
+def command_filter_shape(command_name:str, command:dict):
+	"""
+	Describe the filter of a Mongo command without its values.
+
+	:param command_name: Name of the command, e.g. "find".
+	:param command: The command document.
+	:return: The filter signature, or None when the command has no filter.
+	"""
+	if command_name == "aggregate":
+		return " | ".join(next(iter(stage)) for stage in command.get("pipeline", []))
+	statements = command.get("updates") or command.get("deletes")
+	if statements:
+		return filter_signature(statements[0].get("q", {}))
+	for key in ("filter", "query"):
+		if isinstance(command.get(key), dict):
+			return filter_signature(command[key])
+	return None
+
+
+class CommandMetrics(monitoring.CommandListener):
+	"""
+	pymongo command listener feeding the command metrics, the per request
+	round trip count and the slow query log.
+
+	Attributes:
+		slow_ms (float): Commands slower than this many milliseconds are logged.
+	"""
+
+	def __init__(self, slow_ms:float=100.0):
+		self.slow_ms = slow_ms
+		# (connection, request id) -> (collection, command document)
+		self._pending = {}
+
+	def started(self, event):
+		collection = event.command.get(event.command_name)
+		self._pending[(event.connection_id, event.request_id)] = (
+			collection if isinstance(collection, str) else None, event.command
+		)
+		stats = request_stats.get()
+		if stats is not None:
+			stats["mongo_commands"] += 1
+
+	def succeeded(self, event):
+		collection, command = self._pending.pop((event.connection_id, event.request_id), (None, {}))
+		seconds = event.duration_micros / 1e6
+		mongo_command_latency.observe(seconds, event.command_name)
+
+		# awaitData getMores (change streams) wait on purpose
+		if seconds * 1000 < self.slow_ms or (event.command_name == "getMore" and "maxTimeMS" in command):
+			return
+		slow_queries.inc(event.command_name, collection or "")
+		stats = request_stats.get()
+		slow_query_logger.warning(
+			"slow %s on %s took %.1f ms, filter %s, request %s",
+			event.command_name, collection, seconds * 1000,
+			command_filter_shape(event.command_name, command),
+			stats["path"] if stats else None
+		)
+
+	def failed(self, event):
+		self._pending.pop((event.connection_id, event.request_id), None)
+		mongo_command_latency.observe(event.duration_micros / 1e6, event.command_name)
+		mongo_command_failures.inc(event.command_name)
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+	"""
+	pymongo connection pool listener feeding the pool metrics.
+	"""
+
+	def connection_checked_out(self, event):
+		pool_checkout_wait.observe(event.duration or 0.0, _address(event.address))
+
+	def connection_check_out_failed(self, event):
+		pool_checkout_failures.inc(_address(event.address), event.reason)
+
+	def connection_created(self, event):
+		pool_connections_created.inc(_address(event.address))
+
+	def connection_closed(self, event):
+		pool_connections_closed.inc(_address(event.address), event.reason)
+
+	# the remaining pool events are not recorded
+	def pool_created(self, event):
+		pass
+
+	def pool_ready(self, event):
+		pass
+
+	def pool_cleared(self, event):
+		pass
+
+	def pool_closed(self, event):
+		pass
+
+	def connection_ready(self, event):
+		pass
+
+	def connection_check_out_started(self, event):
+		pass
+
+	def connection_checked_in(self, event):
+		pass
+
+
+def _address(address:tuple):
+	return f"{address[0]}:{address[1]}"
+
+
+# listeners passed to the sync and async Mongo clients
+command_metrics = CommandMetrics(slow_ms=float(os.getenv('MONGO_SLOW_QUERY_MS', '100')))
+pool_metrics = PoolMetrics()
+
+
+def timed(function):
+	"""
+	Decorator recording the latency of a CRUD function, sync or async.
+	"""
+	labels = (function.__module__, function.__name__)
+
+	if inspect.iscoroutinefunction(function):
+		@functools.wraps(function)
+		async def async_wrapper(*args, **kwargs):
+			start = time.perf_counter()
+			try:
+				return await function(*args, **kwargs)
+			finally:
+				crud_latency.observe(time.perf_counter() - start, *labels)
+		return async_wrapper
+
+	@functools.wraps(function)
+	def wrapper(*args, **kwargs):
+		start = time.perf_counter()
+		try:
+			return function(*args, **kwargs)
+		finally:
+			crud_latency.observe(time.perf_counter() - start, *labels)
+	return wrapper
+
+
+async def metrics_middleware(request, call_next):
+	"""
+	http middleware recording the latency and Mongo round trips of every
+	request. Routes are labelled by their path template so ids do not
+	create new series. Streamed responses are timed until their headers
+	are sent.
+	"""
+	stats = {"mongo_commands": 0, "path": request.url.path}
+	token = request_stats.set(stats)
+	start = time.perf_counter()
+	status = 500
+	try:
+		response = await call_next(request)
+		status = response.status_code
+		return response
+	finally:
+		route = request.scope.get("route")
+		route_path = route.path if route is not None else "unmatched"
+		request_latency.observe(time.perf_counter() - start, request.method, route_path, str(status))
+		request_mongo_commands.observe(stats["mongo_commands"], route_path)
+		request_stats.reset(token)
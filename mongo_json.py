@@ -0,0 +1,86 @@
+"""
+-------------------------------------------------------------------
+This is a Goldfish Project File
+
+Authors: Max Witwer, Jie Chen, Elliott Cole
+Collaboration with the Baker Lab
+
+This file was generated during an internship at the institute for
+protein design
+
+Description:
+This file contains the orjson based serializer used for every api
+response. Mongo documents are written straight to JSON bytes
+without first being copied by FastAPI's jsonable_encoder, which
+walks every nested meta_data and elastic_data_paths dict in Python.
+Datetimes use the same format as the json_encoders of the GraphMap
+and ProcessStep schemas, and bson types such as ObjectId are
+converted natively.
+
+
+Date: 07/06/2024
+-------------------------------------------------------------------
+"""
+
+import base64
+from datetime import date, datetime
+from decimal import Decimal
+
+import orjson
+from bson import Binary, Decimal128, ObjectId, Timestamp
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+# same format as the json_encoders config of the db_schemas models
+DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+# datetimes are passed through to bson_default so they use DATETIME_FORMAT
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+def bson_default(obj):
+	"""
+	Convert the values orjson can not serialize on its own.
+
+	:param obj: The value to convert.
+	:return: A JSON serializable replacement.
+	"""
+	if isinstance(obj, datetime):
+		return obj.strftime(DATETIME_FORMAT)
+	if isinstance(obj, date):
+		return obj.isoformat()
+	if isinstance(obj, ObjectId):
+		return str(obj)
+	if isinstance(obj, Timestamp):
+		return obj.as_datetime().strftime(DATETIME_FORMAT)
+	if isinstance(obj, Decimal128):
+		return str(obj)
+	if isinstance(obj, Decimal):
+		return float(obj)
+	if isinstance(obj, (Binary, bytes)):
+		return base64.b64encode(obj).decode()
+	if isinstance(obj, (set, frozenset)):
+		return list(obj)
+	if isinstance(obj, BaseModel):
+		return obj.model_dump()
+	raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content):
+	"""
+	Serialize a response body.
+
+	:param content: Documents, or any structure containing them.
+	:return: The JSON encoded bytes.
+	"""
+	return orjson.dumps(content, default=bson_default, option=ORJSON_OPTIONS)
+
+
+class MongoJSONResponse(JSONResponse):
+	"""
+	JSON response rendered by dumps(). Routes return it directly so
+	FastAPI does not run jsonable_encoder over the content first.
+	"""
+
+	def render(self, content) -> bytes:
+		return dumps(content)
@@ -9,8 +9,25 @@ This file was generated during an internship at the institute for
 protein design
 
 Description:
-This file contains a system to load some dummy data onto the 
-database inorder to develop and test the system
+This file contains a system to load dummy data onto the database
+inorder to develop, test and benchmark the system. It generates N
+graphs with M processes each, with meta_data of a configurable size
+and a configurable fan-out of elastic_data_paths keys and paths.
+The generator is seeded, so the same arguments always produce the
+same documents and ids. Documents are written with batched
+insert_many calls, after which the query indexes are created and the
+graph summaries and the data key catalog are rebuilt.
+
+Usage (from the repository root, DATABASE_URL must be set):
+    python populate_dummy_data.py                                  one graph with ten processes
+    python populate_dummy_data.py --graphs 1000 --processes 200 \\
+        --meta-data-bytes 2048 --data-keys 4 --paths-per-key 10 --seed 7
+
+The ids are derived from the seed (0 by default), so loading the same
+seed into the same database again regenerates documents that already
+exist: those inserts are skipped and counted as duplicates, the rest
+is inserted and the summaries and catalog are still rebuilt.
+
 
 Date: 07/06/2024
 -------------------------------------------------------------------
@@ -19,9 +36,12 @@ Date: 07/06/2024
 from dotenv import load_dotenv
 import os
 
-from pymongo import MongoClient
-from bson import ObjectId
-from datetime import datetime
+import argparse
+import random
+import string
+import time
+import uuid
+from datetime import datetime, timedelta
 
 # Add the path to the schemas directory to the system path
 import sys
@@ -32,58 +52,199 @@ sys.path.append("./db_schemas")
 from graph_map import GraphMap
 from process_step import ProcessStep
 
+from pymongo.errors import BulkWriteError
+
+from index_manager import ensure_indexes
+from db_connection import get_database
+from data_paths import with_data_paths
+from graph_summary import catalog_rebuild_pipeline, rebuild_pipeline, rebuild_timestamp, stale_summary_filter
+from query_utils import chunked
+
 # Load environmental variables from the ".env" file
 load_dotenv()
 
-
-# Generate some object ids
-graph_map_ID = str(ObjectId())
-process_step_IDs = [str(ObjectId()) for _ in range(10)]
-
-# generate timestamp
-time_stamp = datetime.now()
-
-# Create an example graph_map instance
-example_graph_inst = {
-    "_id": graph_map_ID,
-    "project_name": "Example Schema",
-    "process_list": process_step_IDs,
-    "process_meta_data": {"description": "variable meta data goes here"},
-    "owner": "Max Witwer",
-    "owner_email": "mwitwer@uw.edu",
-    "date_created": time_stamp,
-    "date_updated": time_stamp
-}
-
-# Create a list of example process_step instances
-example_process_inst = [{
-    "_id": process_step_IDs[i],
-    "parent_graph": graph_map_ID,
-    "meta_data": {"description": "variable meta data goes here"},
-    "elastic_data_paths": {
-        "pdb": ["/some_path1.pdb", "/some_path2.pdb", "/some_path3.pdb"]
-    },
-    "file_location_type": "digs_local",
-    "date_created": time_stamp,
-    "date_updated": time_stamp
-} for i in range(len(process_step_IDs))]
-
-# Create GraphMap and ProcessStep objects using the example instances
-graph_map = GraphMap(**example_graph_inst)
-process_steps = [ProcessStep(**process) for process in example_process_inst]
-
-# pull environmental variable and connect to database
-database_url = os.getenv('DATABASE_URL')
-client = MongoClient(database_url)
-
-# generate database objects
-db = client.Goldfish
-graph_collection = db.graph_map
-process_collection = db.process_step
-
-
-
-
-# push data to database
-graph_collection.insert_one(graph_map.dict())
-process_collection.insert_many([process.dict() for process in process_steps])
+# value pools the generated documents draw from
+DATA_KEYS = ["pdb", "fasta", "silent", "json", "npz", "csv", "a3m", "log"]
+FILE_LOCATION_TYPES = ["digs_local", "pool", "embedded", "mixed"]
+TOOLS = ["rfdiffusion", "proteinmpnn", "alphafold2", "rosetta_relax", "esmfold"]
+
+# generated dates lie in the year before this date, so runs are reproducible
+BASE_DATE = datetime(2024, 7, 6)
+
+
+def _document_id(rng:random.Random):
+    """
+    :return: A uuid4 string like the api assigns, drawn from the seeded generator.
+    """
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _meta_data(rng:random.Random, step:int, size:int):
+    """
+    Meta data of roughly size bytes: a few typed fields and a text note
+    padding it to the requested size.
+    """
+    meta_data = {
+        "description": f"design step {step}",
+        "tool": rng.choice(TOOLS),
+        "score": round(rng.uniform(-3.0, 0.0), 4),
+        "parameters": {"num_designs": rng.randint(1, 64), "temperature": round(rng.uniform(0.0, 1.0), 2)},
+    }
+    padding = size - len(str(meta_data))
+    if padding > 0:
+        meta_data["notes"] = "".join(rng.choices(string.ascii_lowercase + " ", k=padding))
+    return meta_data
+
+
+def _elastic_data_paths(rng:random.Random, project:str, step:int, data_keys:int, paths_per_key:int):
+    """
+    Between one and data_keys keys, each with between one and paths_per_key paths.
+    """
+    keys = rng.sample(DATA_KEYS[:max(data_keys, 1)], rng.randint(1, max(data_keys, 1)))
+    return {
+        key: [f"/projects/{project}/step_{step}/output_{index}.{key}" for index in range(rng.randint(1, max(paths_per_key, 1)))]
+        for key in keys
+    }
+
+
+def generate_graphs(graphs:int=1, processes:int=10, meta_data_bytes:int=64, data_keys:int=1, paths_per_key:int=3, seed:int=0):
+    """
+    Generate graph documents together with their process documents.
+
+    :param graphs: Number of graphs.
+    :param processes: Number of processes per graph.
+    :param meta_data_bytes: Approximate size of every meta_data dictionary.
+    :param data_keys: Largest number of elastic_data_paths keys per process, at most len(DATA_KEYS).
+    :param paths_per_key: Largest number of paths per elastic_data_paths key.
+    :param seed: Seed of the random generator.
+    :return: A generator over (graph, processes) pairs, validated against the schemas.
+    """
+    rng = random.Random(seed)
+    owners = max(1, graphs // 10)
+
+    for graph_index in range(graphs):
+        graph_id = _document_id(rng)
+        project = f"project_{graph_index}"
+        owner = rng.randrange(owners)
+        date_created = BASE_DATE - timedelta(minutes=rng.randint(0, 365 * 24 * 60))
+
+        process_docs = []
+        for step in range(processes):
+            time_stamp = date_created + timedelta(seconds=step + 1)
+            process = ProcessStep(
+                parent_graph=graph_id,
+                meta_data=_meta_data(rng, step, meta_data_bytes),
+                elastic_data_paths=_elastic_data_paths(rng, project, step, data_keys, paths_per_key),
+                file_location_type=rng.choice(FILE_LOCATION_TYPES),
+                date_created=time_stamp,
+                date_updated=time_stamp
+            )
+            # the schemas do not carry the _id, it is assigned like the api does
+            process_docs.append(with_data_paths({**process.dict(), "_id": _document_id(rng)}))
+
+        graph = GraphMap(
+            project_name=f"Example Schema {graph_index}",
+            process_list=[process["_id"] for process in process_docs],
+            process_meta_data=_meta_data(rng, -1, meta_data_bytes),
+            owner=f"owner_{owner}",
+            owner_email=f"owner_{owner}@example.com",
+            date_created=date_created,
+            date_updated=date_created + timedelta(seconds=processes)
+        )
+        yield {**graph.dict(), "_id": graph_id}, process_docs
+
+
+def _insert(collection, documents:list):
+    """
+    Unordered insert_many that skips documents whose _id already exists.
+
+    :return: The number of documents inserted and the number skipped as duplicates.
+    :raises BulkWriteError: A document failed for another reason than a duplicate key.
+    """
+    try:
+        collection.insert_many(documents, ordered=False)
+        return len(documents), 0
+    except BulkWriteError as error:
+        write_errors = error.details["writeErrors"]
+        if any(write_error["code"] != 11000 for write_error in write_errors):
+            raise
+        return error.details["nInserted"], len(write_errors)
+
+
+def populate(db, graphs:int=1, processes:int=10, meta_data_bytes:int=64, data_keys:int=1, paths_per_key:int=3,
+             seed:int=0, batch_size:int=1000):
+    """
+    Insert generated graphs and processes with batched insert_many calls.
+
+    :param db: The database to load.
+    :param batch_size: Number of documents per insert_many.
+    :return: The number of graphs and processes inserted, the number of
+             documents skipped because their _id already existed and the
+             seconds it took.
+    """
+    graph_collection = db.graph_map
+    process_collection = db.process_step
+    start = time.perf_counter()
+
+    graph_batch, process_batch = [], []
+    counts = {"graphs": 0, "processes": 0, "duplicates": 0}
+
+    def insert(collection, documents, kind):
+        inserted, duplicates = _insert(collection, documents)
+        counts[kind] += inserted
+        counts["duplicates"] += duplicates
+
+    for graph, process_docs in generate_graphs(graphs, processes, meta_data_bytes, data_keys, paths_per_key, seed):
+        graph_batch.append(graph)
+        process_batch.extend(process_docs)
+        if len(graph_batch) >= batch_size:
+            insert(graph_collection, graph_batch, "graphs")
+            graph_batch = []
+        if len(process_batch) >= batch_size:
+            for chunk in chunked(process_batch, batch_size):
+                insert(process_collection, chunk, "processes")
+            process_batch = []
+
+    if graph_batch:
+        insert(graph_collection, graph_batch, "graphs")
+    for chunk in chunked(process_batch, batch_size):
+        insert(process_collection, chunk, "processes")
+
+    # make sure the query indexes exist for the loaded data
+    ensure_indexes(db)
+
+    # the inserts bypass the CRUD layer, so recompute the graph summaries and the data key catalog
+    rebuilt_at = rebuild_timestamp()
+    list(process_collection.aggregate(rebuild_pipeline(process_collection.name, "graph_summary", rebuilt_at), allowDiskUse=True))
+    db.graph_summary.delete_many(stale_summary_filter(rebuilt_at))
+    list(process_collection.aggregate(catalog_rebuild_pipeline("data_key_catalog", rebuilt_at), allowDiskUse=True))
+    db.data_key_catalog.delete_many({"date_updated": {"$lt": rebuilt_at}})
+
+    counts["seconds"] = time.perf_counter() - start
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generated Goldfish graphs and processes")
+    parser.add_argument("--graphs", type=int, default=1, help="number of graphs")
+    parser.add_argument("--processes", type=int, default=10, help="processes per graph")
+    parser.add_argument("--meta-data-bytes", type=int, default=64, help="approximate size of every meta_data")
+    parser.add_argument("--data-keys", type=int, default=1, help=f"most elastic_data_paths keys per process (at most {len(DATA_KEYS)})")
+    parser.add_argument("--paths-per-key", type=int, default=3, help="most paths per elastic_data_paths key")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generator")
+    parser.add_argument("--batch-size", type=int, default=1000, help="documents per insert_many")
+    args = parser.parse_args()
+
+    # connect to database through the shared connection manager
+    counts = populate(
+        get_database(), args.graphs, args.processes, args.meta_data_bytes, args.data_keys,
+        args.paths_per_key, args.seed, args.batch_size
+    )
+    print(f"inserted {counts['graphs']} graphs and {counts['processes']} processes in {counts['seconds']:.1f} s")
+    if counts["duplicates"]:
+        print(f"skipped {counts['duplicates']} documents already in the database, was this seed loaded before?")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,265 @@
+"""
+-------------------------------------------------------------------
+This is a Goldfish Project File
+
+Authors: Max Witwer, Jie Chen, Elliott Cole
+Collaboration with the Baker Lab
+
+This file was generated during an internship at the institute for
+protein design
+
+Description:
+This file contains the guard in front of the generic filter
+endpoints. Before a user supplied filter is run, its query plan is
+looked up with explain() and cached under the filter's signature
+(its field and operator structure with the values left out), so
+repeated queries of the same shape cost no extra round trip. A
+filter whose winning plan is a collection scan over more documents
+than the configured threshold is either rejected or throttled to a
+few scans per second. Every guarded query also carries a maxTimeMS
+so a slow scan is stopped by the server.
+
+Configuration (environment variables):
+    QUERY_GUARD_MODE            "throttle" (default), "reject" or "off"
+    QUERY_COLLSCAN_THRESHOLD    documents a collection scan may cover (default 10000)
+    QUERY_COLLSCAN_RATE         collection scans per second in throttle mode (default 1)
+    QUERY_COLLSCAN_BURST        collection scans allowed back to back (default 5)
+    QUERY_MAX_TIME_MS           server side time limit per query, 0 for none (default 10000)
+    QUERY_PLAN_CACHE_SIZE       plans kept per api process (default 1000)
+    QUERY_PLAN_CACHE_TTL        seconds before a plan is explained again (default 300)
+
+
+Date: 07/06/2024
+-------------------------------------------------------------------
+"""
+
+from dotenv import load_dotenv
+import os
+
+import json
+import threading
+import time
+
+from pymongo.errors import OperationFailure
+
+from document_cache import DocumentCache
+
+# load environmental varibles from ".env" file
+load_dotenv()
+
+
+class QueryRejected(Exception):
+	"""
+	Raised when the guard refuses to run a filter.
+
+	Attributes:
+		status_code (int): HTTP status the api answers with.
+	"""
+
+	def __init__(self, message:str, status_code:int=400):
+		super().__init__(message)
+		self.status_code = status_code
+
+
+def filter_signature(filter:dict):
+	"""
+	Reduce a filter to its shape, keeping fields and operators but
+	replacing every value with its type name.
+
+	:param filter: The filter to describe.
+	:return: A string that is equal for filters planned the same way.
+	"""
+	def shape(value):
+		if isinstance(value, dict):
+			return {key: shape(item) for key, item in value.items()}
+		if isinstance(value, list) and any(isinstance(item, dict) for item in value):
+			return [shape(item) for item in value]
+		return type(value).__name__
+
+	return json.dumps(shape(filter), sort_keys=True)
+
+
+def plan_shape(explain_result:dict):
+	"""
+	Summarise the winning plan of an explain() result.
+
+	:param explain_result: The document returned by explain().
+	:return: A dictionary with the plan's stages, the indexes it uses and
+	         whether it scans the whole collection.
+	"""
+	stages = []
+	indexes = []
+
+	def walk(plan:dict):
+		# slot based engine plans nest the classic plan under queryPlan
+		plan = plan.get("queryPlan", plan)
+		if "stage" in plan:
+			stages.append(plan["stage"])
+		if "indexName" in plan:
+			indexes.append(plan["indexName"])
+		for shard in plan.get("shards", []):
+			walk(shard.get("winningPlan", {}))
+		if "inputStage" in plan:
+			walk(plan["inputStage"])
+		for input_stage in plan.get("inputStages", []):
+			walk(input_stage)
+
+	walk(explain_result.get("queryPlanner", {}).get("winningPlan", {}))
+	return {"stages": stages, "indexes": indexes, "collscan": "COLLSCAN" in stages}
+
+
+class TokenBucket:
+	"""
+	Thread safe token bucket used to throttle collection scans.
+
+	Attributes:
+		rate (float): Tokens added per second.
+		burst (int): Maximum tokens held.
+	"""
+
+	def __init__(self, rate:float, burst:int):
+		self.rate = rate
+		self.burst = burst
+		self._tokens = float(burst)
+		self._updated = time.monotonic()
+		self._lock = threading.Lock()
+
+	def take(self):
+		"""
+		Take a token if one is available.
+
+		:return: True if a token was taken.
+		"""
+		with self._lock:
+			now = time.monotonic()
+			self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+			self._updated = now
+			if self._tokens < 1:
+				return False
+			self._tokens -= 1
+			return True
+
+
+class QueryGuard:
+	"""
+	Checks user supplied filters against their cached query plans.
+
+	Attributes:
+		mode (str): "throttle", "reject" or "off".
+		collscan_threshold (int): Collection size above which a scan is guarded.
+		max_time_ms (int): maxTimeMS set on guarded queries, None for none.
+		plan_cache (DocumentCache): Plans keyed by collection and filter signature.
+		bucket (TokenBucket): Collection scans allowed in throttle mode.
+	"""
+
+	def __init__(self, mode:str="throttle", collscan_threshold:int=10000, collscan_rate:float=1.0,
+			collscan_burst:int=5, max_time_ms:int=10000, plan_cache_size:int=1000, plan_cache_ttl:float=300.0):
+		self.mode = mode
+		self.collscan_threshold = collscan_threshold
+		self.max_time_ms = max_time_ms or None
+		self.plan_cache = DocumentCache("query_plans", plan_cache_size, plan_cache_ttl)
+		self.bucket = TokenBucket(collscan_rate, collscan_burst)
+
+		self.explains = 0
+		self.rejected = 0
+		self.throttled = 0
+
+	def _decide(self, collection_name:str, plan:dict):
+		"""
+		Raise if the plan may not run right now.
+		"""
+		if not plan["collscan"] or plan["documents"] <= self.collscan_threshold:
+			return
+
+		if self.mode == "reject":
+			self.rejected += 1
+			raise QueryRejected(
+				f"filter scans the whole {collection_name} collection ({plan['documents']} documents), "
+				"filter on an indexed field instead",
+				status_code=400
+			)
+		if not self.bucket.take():
+			self.throttled += 1
+			raise QueryRejected(
+				f"too many unindexed queries on {collection_name}, retry later or filter on an indexed field",
+				status_code=429
+			)
+
+	def check(self, collection, filter:dict, sort:list=None):
+		"""
+		Guard a pymongo query before it is run.
+
+		:param collection: The collection the filter will be run on.
+		:param filter: The user supplied filter.
+		:param sort: The sort the query will use, None for unsorted.
+		:raises QueryRejected: The filter is invalid, rejected or throttled.
+		"""
+		if self.mode == "off":
+			return
+
+		key = (collection.name, filter_signature(filter), str(sort))
+		plan = self.plan_cache.get(key)
+		if plan is None:
+			cursor = collection.find(filter)
+			if sort:
+				cursor = cursor.sort(sort)
+			try:
+				plan = plan_shape(cursor.explain())
+			except OperationFailure as error:
+				raise QueryRejected(f"invalid filter: {error}")
+			plan["documents"] = collection.estimated_document_count()
+			self.explains += 1
+			self.plan_cache.set(key, plan)
+
+		self._decide(collection.name, plan)
+
+	async def check_async(self, collection, filter:dict, sort:list=None):
+		"""
+		Guard a Motor query before it is run, see check().
+		"""
+		if self.mode == "off":
+			return
+
+		key = (collection.name, filter_signature(filter), str(sort))
+		plan = self.plan_cache.get(key)
+		if plan is None:
+			cursor = collection.find(filter)
+			if sort:
+				cursor = cursor.sort(sort)
+			try:
+				plan = plan_shape(await cursor.explain())
+			except OperationFailure as error:
+				raise QueryRejected(f"invalid filter: {error}")
+			plan["documents"] = await collection.estimated_document_count()
+			self.explains += 1
+			self.plan_cache.set(key, plan)
+
+		self._decide(collection.name, plan)
+
+	def stats(self):
+		"""
+		Report the guard counters.
+
+		:return: A dictionary of the guard settings, counters and plan cache.
+		"""
+		return {
+			"mode": self.mode,
+			"collscan_threshold": self.collscan_threshold,
+			"max_time_ms": self.max_time_ms,
+			"explains": self.explains,
+			"rejected": self.rejected,
+			"throttled": self.throttled,
+			"plan_cache": self.plan_cache.stats(),
+		}
+
+
+# guard shared by the sync and async CRUD layers
+query_guard = QueryGuard(
+	mode=os.getenv('QUERY_GUARD_MODE', 'throttle'),
+	collscan_threshold=int(os.getenv('QUERY_COLLSCAN_THRESHOLD', '10000')),
+	collscan_rate=float(os.getenv('QUERY_COLLSCAN_RATE', '1')),
+	collscan_burst=int(os.getenv('QUERY_COLLSCAN_BURST', '5')),
+	max_time_ms=int(os.getenv('QUERY_MAX_TIME_MS', '10000')),
+	plan_cache_size=int(os.getenv('QUERY_PLAN_CACHE_SIZE', '1000')),
+	plan_cache_ttl=float(os.getenv('QUERY_PLAN_CACHE_TTL', '300')),
+)
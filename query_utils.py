@@ -0,0 +1,235 @@
+"""
+-------------------------------------------------------------------
+This is a Goldfish Project File
+
+Authors: Max Witwer, Jie Chen, Elliott Cole
+Collaboration with the Baker Lab
+
+This file was generated during an internship at the institute for
+protein design
+
+Description:
+This file contains helpers shared by the sync and async CRUD
+layers for shaping queries. Projections limit the fields Mongo
+sends back over the wire, and the process_list modifiers let the
+graph be changed with single atomic updates. Collection reads are
+paginated with keyset pagination over (date_created, _id): every
+page is sorted on that pair and the "after" token handed back to
+the client encodes the pair of the last document, so the next page
+starts right after it without skipping over the documents already
+served. The lineage pipeline joins a graph's process_list with the
+process documents on the server, so the steps of a graph are read in
+one round trip.
+
+
+Date: 07/06/2024
+-------------------------------------------------------------------
+"""
+
+import base64
+import binascii
+
+from bson import json_util
+from pymongo import ASCENDING
+
+# sort order used by every paginated read
+KEYSET_SORT = [("date_created", ASCENDING), ("_id", ASCENDING)]
+
+
+def build_projection(fields:list=None, exclude:list=None):
+	"""
+	Build a find() projection from lists of included or excluded fields.
+
+	:param fields: Fields to return, dotted paths allowed. _id is always returned.
+	:param exclude: Fields to leave out of the returned documents.
+	:return: The projection dictionary, or None to return whole documents.
+	:raises ValueError: If both fields and exclude are supplied.
+	"""
+	if fields and exclude:
+		raise ValueError("fields and exclude can not be combined")
+	if fields:
+		return {field: 1 for field in fields}
+	if exclude:
+		return {field: 0 for field in exclude}
+
+
+def keyset_projection(projection:dict=None):
+	"""
+	Make sure a projection keeps the fields the "after" token is built from.
+
+	:param projection: The projection requested by the client.
+	:return: The projection with date_created and _id retained.
+	"""
+	if not projection:
+		return projection
+
+	projection = dict(projection)
+	if any(projection.values()):
+		projection["date_created"] = 1
+	else:
+		projection.pop("date_created", None)
+		projection.pop("_id", None)
+	return projection
+
+
+def encode_after_token(document:dict):
+	"""
+	Build the "after" token pointing just past a document.
+
+	:param document: The last document of a page.
+	:return: An opaque url safe token string.
+	"""
+	key = [document.get("date_created"), document["_id"]]
+	return base64.urlsafe_b64encode(json_util.dumps(key).encode()).decode()
+
+
+def decode_after_token(token:str):
+	"""
+	Decode an "after" token back into its (date_created, _id) pair.
+
+	:param token: The token produced by encode_after_token.
+	:return: A tuple of (date_created, _id).
+	:raises ValueError: If the token is malformed.
+	"""
+	try:
+		date_created, document_id = json_util.loads(base64.urlsafe_b64decode(token.encode()))
+	except (binascii.Error, TypeError, ValueError) as error:
+		raise ValueError(f"invalid after token '{token}'") from error
+	return date_created, document_id
+
+
+def keyset_filter(filter:dict, after:str=None):
+	"""
+	Restrict a filter to the documents that sort after a token.
+
+	:param filter: The base filter of the query.
+	:param after: Token of the last document already served, or None.
+	:return: The filter to apply for the next page.
+	"""
+	if not after:
+		return filter
+
+	date_created, document_id = decode_after_token(after)
+	after_filter = {"$or": [
+		{"date_created": {"$gt": date_created}},
+		{"date_created": date_created, "_id": {"$gt": document_id}},
+	]}
+	if not filter:
+		return after_filter
+	return {"$and": [filter, after_filter]}
+
+
+def next_after_token(page:list, limit:int=None):
+	"""
+	Token for the page following a result page.
+
+	:param page: The documents returned for the current page.
+	:param limit: The page size that was requested.
+	:return: The token for the next page, or None when this was the last page.
+	"""
+	if limit and page and len(page) == limit:
+		return encode_after_token(page[-1])
+
+
+def find_documents(collection, filter:dict, limit:int=None, after:str=None, projection:dict=None, max_time_ms:int=None, session=None):
+	"""
+	Open a cursor over a collection. When limit or after is supplied the
+	cursor is sorted on KEYSET_SORT and resumes after the given token.
+	Works with both pymongo and Motor collections.
+
+	:param collection: The collection to query.
+	:param filter: filter to apply to database.
+	:param limit: Maximum number of documents to return, None for all.
+	:param after: Token of the last document already served, or None.
+	:param projection: Fields to include or exclude, None for whole documents.
+	:param max_time_ms: Server side time limit for the query, None for none.
+	:param session: Session to run the query in, None for an implicit one.
+	:return: The cursor over the matching documents.
+	"""
+	if limit is None and after is None:
+		cursor = collection.find(filter, projection, session=session)
+	else:
+		cursor = collection.find(
+			keyset_filter(filter, after), keyset_projection(projection), session=session
+		).sort(KEYSET_SORT)
+		if limit:
+			cursor = cursor.limit(limit)
+
+	if max_time_ms:
+		cursor = cursor.max_time_ms(max_time_ms)
+	return cursor
+
+
+def keyset_sort(limit:int=None, after:str=None):
+	"""
+	:return: The sort find_documents uses for the given page arguments.
+	"""
+	if limit is None and after is None:
+		return None
+	return KEYSET_SORT
+
+
+def lineage_pipeline(graph_id:str, process_collection_name:str, start:int=0, stop:int=None, projection:dict=None):
+	"""
+	Aggregation over the graph collection returning the process documents
+	of a graph in process_list order, each with its "position" in the
+	list. Ids without a process document are skipped.
+
+	:param graph_id: The ID of the graph.
+	:param process_collection_name: Name of the process collection to join.
+	:param start: First process_list position to return.
+	:param stop: Position to stop before, None for the end of the list.
+	:param projection: Fields to include or exclude, None for whole documents.
+	:return: The pipeline.
+	:raises ValueError: If the range is empty or negative.
+	"""
+	if start < 0 or (stop is not None and stop <= start):
+		raise ValueError("the process_list range must satisfy 0 <= start < stop")
+
+	steps = "$process_list"
+	if start or stop is not None:
+		# $slice needs a positive int32 count, the largest one reads to the end
+		count = stop - start if stop is not None else 2**31 - 1
+		steps = {"$slice": ["$process_list", start, count]}
+
+	pipeline = [
+		{"$match": {"_id": graph_id}},
+		{"$project": {"_id": 0, "process_list": steps}},
+		# $unwind and $lookup both keep the list order
+		{"$unwind": {"path": "$process_list", "includeArrayIndex": "position"}},
+		{"$lookup": {"from": process_collection_name, "localField": "process_list", "foreignField": "_id", "as": "process"}},
+		{"$unwind": "$process"},
+		{"$replaceRoot": {"newRoot": {"$mergeObjects": ["$process", {"position": {"$add": ["$position", start]}}]}}},
+	]
+	if projection:
+		projection = dict(projection)
+		if any(projection.values()):
+			projection["position"] = 1
+		pipeline.append({"$project": projection})
+	return pipeline
+
+
+def process_list_push(process_ids:list, list_insert_location=None):
+	"""
+	Build the $push modifier that adds processes to a graph's process_list.
+
+	:param process_ids: The process ids to add, in order.
+	:param list_insert_location: integer position to insert at, None to append.
+	:return: The value for {"$push": {"process_list": ...}}.
+	"""
+	push = {"$each": list(process_ids)}
+	if type(list_insert_location) == int:
+		push["$position"] = list_insert_location
+	return push
+
+
+def chunked(items:list, chunk_size:int):
+	"""
+	Split a list into consecutive chunks.
+
+	:param items: The list to split.
+	:param chunk_size: Maximum number of items per chunk.
+	:return: A generator over the chunks.
+	"""
+	for start in range(0, len(items), chunk_size):
+		yield items[start:start + chunk_size]
@@ -0,0 +1,240 @@
+"""
+-------------------------------------------------------------------
+This is a Goldfish Project File
+
+Authors: Max Witwer, Jie Chen, Elliott Cole
+Collaboration with the Baker Lab
+
+This file was generated during an internship at the institute for
+protein design
+
+Description:
+This file contains the read preference routing of the CRUD reads.
+Every read function has a policy: "primary" reads stay on the
+primary, "analytics" reads (the owner/email listings and the
+collection scans) go to secondaryPreferred with a maxStalenessSeconds
+bound, so they do not compete with the ingestion writes.
+
+Reads that follow a write stay on the primary in a causally
+consistent session. Every response to a request that wrote returns
+the write's operation time in the X-Goldfish-Operation-Time header;
+a client that sends it back in X-Goldfish-After-Operation-Time gets
+its reads from the primary, in a session that waits for that
+operation time, so it always sees its own writes, also across a
+primary failover.
+
+Configuration (environment variables):
+    ANALYTICS_READ_PREFERENCE         mode of analytics reads (default "secondaryPreferred")
+    ANALYTICS_MAX_STALENESS_SECONDS   staleness bound of analytics reads, at least 90,
+                                      -1 for none (default 120)
+    READ_POLICY_OVERRIDES             e.g. "pull_processes_parent_graph=analytics,pull_graphs_owner=primary"
+
+
+Date: 07/06/2024
+-------------------------------------------------------------------
+"""
+
+from dotenv import load_dotenv
+import os
+
+import contextvars
+import inspect
+import logging
+
+from bson import Timestamp
+from fastapi.responses import JSONResponse
+from pymongo import monitoring
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+
+# load environmental varibles from ".env" file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+OPERATION_TIME_HEADER = "X-Goldfish-Operation-Time"
+AFTER_OPERATION_TIME_HEADER = "X-Goldfish-After-Operation-Time"
+
+READ_PREFERENCE_MODES = {
+	"primary": Primary,
+	"primaryPreferred": PrimaryPreferred,
+	"secondary": Secondary,
+	"secondaryPreferred": SecondaryPreferred,
+	"nearest": Nearest,
+}
+
+# read functions and their policy, functions not listed read from the primary
+READ_POLICIES = {
+	"pull_graph_collection": "analytics",
+	"pull_graphs_owner": "analytics",
+	"pull_graphs_email": "analytics",
+	"pull_process_collection": "analytics",
+	"pull_processes_data_type": "analytics",
+	"pull_processes_file_location_type": "analytics",
+	"search_graphs": "analytics",
+	"aggregate_graph_collection": "analytics",
+	"aggregate_process_collection": "analytics",
+}
+
+WRITE_COMMANDS = ("insert", "update", "delete", "findAndModify")
+
+# per request causal state, set by causal_read_middleware
+causal_state = contextvars.ContextVar("causal_state", default=None)
+
+
+def analytics_read_preference():
+	"""
+	:return: The read preference of analytics reads, from the environment.
+	"""
+	mode = READ_PREFERENCE_MODES[os.getenv('ANALYTICS_READ_PREFERENCE', 'secondaryPreferred')]
+	if mode is Primary:
+		return Primary()
+	return mode(max_staleness=int(os.getenv('ANALYTICS_MAX_STALENESS_SECONDS', '120')))
+
+
+def _load_overrides():
+	for override in filter(None, os.getenv('READ_POLICY_OVERRIDES', '').split(",")):
+		function_name, policy = override.strip().split("=")
+		READ_POLICIES[function_name] = policy
+
+
+_load_overrides()
+
+
+def format_operation_time(operation_time:Timestamp):
+	return f"{operation_time.time}.{operation_time.inc}"
+
+
+def parse_operation_time(text:str):
+	"""
+	:param text: An operation time as sent in the headers, "<seconds>.<increment>".
+	:return: The bson Timestamp.
+	:raises ValueError: The text is not an operation time.
+	"""
+	seconds, _, increment = text.partition(".")
+	return Timestamp(int(seconds), int(increment or 0))
+
+
+def _needs_primary(function_name:str):
+	state = causal_state.get()
+	return READ_POLICIES.get(function_name) != "analytics" or (state is not None and state["after"] is not None)
+
+
+def _causal_session(client):
+	state = causal_state.get()
+	if state is None or state["after"] is None:
+		return None
+	session = client.start_session(causal_consistency=True)
+	session.advance_operation_time(state["after"])
+	state["sessions"].append(session)
+	return session
+
+
+def read_route(function_name:str, primary_collection, analytics_collection):
+	"""
+	Pick the collection and session a pymongo read runs with.
+
+	:param function_name: The CRUD read function, looked up in READ_POLICIES.
+	:param primary_collection: The collection on the primary.
+	:param analytics_collection: The same collection with the analytics read preference.
+	:return: A (collection, session) tuple, the session is None outside of
+	         a read that follows a write.
+	"""
+	if not _needs_primary(function_name):
+		return analytics_collection, None
+	return primary_collection, _causal_session(primary_collection.database.client)
+
+
+async def read_route_async(function_name:str, primary_collection, analytics_collection):
+	"""
+	Motor version of read_route().
+	"""
+	if not _needs_primary(function_name):
+		return analytics_collection, None
+
+	state = causal_state.get()
+	if state is None or state["after"] is None:
+		return primary_collection, None
+	session = await primary_collection.database.client.start_session(causal_consistency=True)
+	session.advance_operation_time(state["after"])
+	state["sessions"].append(session)
+	return primary_collection, session
+
+
+class OperationTimeTracker(monitoring.CommandListener):
+	"""
+	pymongo command listener remembering the operation time of the
+	latest write made while handling a request. Only replica sets and
+	sharded clusters report operation times.
+	"""
+
+	def started(self, event):
+		pass
+
+	def succeeded(self, event):
+		state = causal_state.get()
+		if state is None or event.command_name not in WRITE_COMMANDS:
+			return
+		operation_time = event.reply.get("operationTime")
+		if operation_time is not None and (state["operation_time"] is None or operation_time > state["operation_time"]):
+			state["operation_time"] = operation_time
+
+	def failed(self, event):
+		pass
+
+
+# listener passed to the sync and async Mongo clients
+operation_time_tracker = OperationTimeTracker()
+
+
+async def _end_sessions(sessions:list):
+	"""
+	End the causal sessions of a request. Motor sessions return an
+	awaitable from end_session(), pymongo sessions end right away. A
+	failure is logged and the remaining sessions are still ended.
+	"""
+	for session in sessions:
+		try:
+			result = session.end_session()
+			if inspect.isawaitable(result):
+				await result
+		except Exception:
+			logger.exception("ending a causal read session failed")
+
+
+async def causal_read_middleware(request, call_next):
+	"""
+	http middleware reading X-Goldfish-After-Operation-Time, returning
+	X-Goldfish-Operation-Time after writes and ending the causal sessions
+	once the response body has been sent.
+	"""
+	after = request.headers.get(AFTER_OPERATION_TIME_HEADER)
+	try:
+		state = {"after": parse_operation_time(after) if after else None, "operation_time": None, "sessions": []}
+	except ValueError:
+		return JSONResponse({"detail": f"invalid {AFTER_OPERATION_TIME_HEADER} header"}, status_code=400)
+
+	token = causal_state.set(state)
+	try:
+		response = await call_next(request)
+	except BaseException:
+		await _end_sessions(state["sessions"])
+		raise
+	finally:
+		causal_state.reset(token)
+
+	if state["operation_time"] is not None:
+		response.headers[OPERATION_TIME_HEADER] = format_operation_time(state["operation_time"])
+
+	if state["sessions"]:
+		# streamed cursors still use the session after call_next returns
+		body_iterator = response.body_iterator
+
+		async def body_then_end_sessions():
+			try:
+				async for chunk in body_iterator:
+					yield chunk
+			finally:
+				await _end_sessions(state["sessions"])
+
+		response.body_iterator = body_then_end_sessions()
+	return response
@@ -21,194 +21,490 @@ Date: 07/06/2024
 """
 
 # routes.py
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Body, File, HTTPException, Query, UploadFile
+from typing import List, Literal
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from CRUD_utils import *
+from query_utils import build_projection, next_after_token
+from mongo_json import MongoJSONResponse, dumps
+from query_guard import QueryRejected, query_guard
+from pymongo.errors import BulkWriteError, DuplicateKeyError, ExecutionTimeout, OperationFailure
+from document_cache import cache_stats
+from metrics import render_metrics
+from graph_delete_jobs import start_graph_delete_job, pull_job_status
+from analytics import data_values_pipeline, date_histogram_pipeline, group_count_pipeline
+from graph_transfer import check_transfer_options, export_stream, read_documents, transfer_media_type, transfer_suffix
 import json
 
 from crud_models import *
 
+import os
 import uuid
+import inspect
+from starlette.concurrency import run_in_threadpool
 
-crud_router = APIRouter()
+# choose which data layer backs the endpoints ("sync" or "async")
+database_backend = os.getenv('DATABASE_BACKEND', 'sync')
+if database_backend == "async":
+    import async_CRUD_utils
+
+# most ids accepted by the batched id reads
+read_max_ids = int(os.getenv('READ_MAX_IDS', '1000'))
+
+# responses are serialized with orjson, see mongo_json.py
+crud_router = APIRouter(default_response_class=MongoJSONResponse)
+
+async def crud_call(crud_function, *args, **kwargs):
+    """
+    Run a CRUD_utils function on the configured database backend.
+
+    With the "sync" backend the pymongo function is called directly.
+    With the "async" backend the Motor function of the same name from
+    async_CRUD_utils is awaited, falling back to running the pymongo
+    function in the threadpool when no async version exists, so the
+    event loop is never blocked by a query.
+
+    **Parameters:**
+    - **crud_function**: The CRUD_utils function to run.
+    - **args/kwargs**: Arguments passed through to the function.
+
+    **Returns:**
+    - Whatever the selected backend function returns.
+    """
+    if database_backend != "async":
+        return crud_function(*args, **kwargs)
+
+    async_function = getattr(async_CRUD_utils, crud_function.__name__, None)
+    if async_function and inspect.iscoroutinefunction(async_function):
+        return await async_function(*args, **kwargs)
+    return await run_in_threadpool(crud_function, *args, **kwargs)
+
+def parse_projection(fields:str=None, exclude:str=None):
+    """
+    Turn the comma separated fields/exclude query parameters into a
+    projection for the CRUD_utils read functions.
+
+    **Parameters:**
+    - **fields**: Comma separated fields to return.
+    - **exclude**: Comma separated fields to leave out.
+
+    **Returns:**
+    - The projection dictionary, or None for whole documents.
+    """
+    try:
+        return build_projection(
+            [field.strip() for field in fields.split(",") if field.strip()] if fields else None,
+            [field.strip() for field in exclude.split(",") if field.strip()] if exclude else None
+        )
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+
+def ndjson_response(cursor):
+    """
+    Stream documents to the client as newline delimited JSON while the
+    database cursor yields them, instead of building the full body first.
+
+    **Parameters:**
+    - **cursor**: A pymongo or Motor cursor over the documents to send.
+
+    **Returns:**
+    - A StreamingResponse with the application/x-ndjson media type.
+    """
+    if hasattr(cursor, "__aiter__"):
+        async def document_lines():
+            async for document in cursor:
+                yield dumps(document) + b"\n"
+    else:
+        # sync iterators are consumed in the threadpool by StreamingResponse
+        def document_lines():
+            for document in cursor:
+                yield dumps(document) + b"\n"
+
+    return StreamingResponse(document_lines(), media_type="application/x-ndjson")
+
+async def read_ids(crud_function, ids, fields=None, exclude=None):
+    """
+    Shared body of the batched id read endpoints.
+
+    **Parameters:**
+    - **crud_function**: pull_graph_ids or pull_process_ids.
+    - **ids**: The requested ids.
+    - **fields/exclude**: Optional comma separated projection fields.
+
+    **Returns:**
+    - The documents in request order with null for misses, and the missing ids.
+    """
+    if len(ids) > read_max_ids:
+        raise HTTPException(status_code=400, detail=f"at most {read_max_ids} ids can be read at once")
+    result = await crud_call(crud_function, ids, projection=parse_projection(fields, exclude))
+    missing = [ID for ID, document in zip(ids, result) if document is None]
+    return MongoJSONResponse({"result": result, "missing": missing})
+
+async def read_collection(crud_function, *args, projection=None, limit=None, after=None, stream=False, not_found="Not found"):
+    """
+    Shared body of the collection read endpoints. Handles keyset
+    pagination through limit/after and the NDJSON streaming mode.
+
+    **Parameters:**
+    - **crud_function**: The CRUD_utils collection read function.
+    - **args**: Arguments passed through to the function.
+    - **projection**: Fields to include or exclude, None for whole documents.
+    - **limit**: Page size, None to return every match.
+    - **after**: Pagination token returned with the previous page.
+    - **stream**: Stream the matches as NDJSON instead of one JSON body.
+    - **not_found**: Detail of the 404 raised when nothing matches.
+
+    **Returns:**
+    - The matching documents, with a "next_after" token when paginating.
+    """
+    try:
+        if stream:
+            cursor = await crud_call(crud_function, *args, projection=projection, limit=limit, after=after, as_cursor=True)
+            return ndjson_response(cursor)
+        result = await crud_call(crud_function, *args, projection=projection, limit=limit, after=after)
+    except QueryRejected as error:
+        raise HTTPException(status_code=error.status_code, detail=str(error))
+    except ExecutionTimeout:
+        raise HTTPException(status_code=504, detail="Query exceeded its time limit")
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+
+    if not result:
+        raise HTTPException(status_code=404, detail=not_found)
+    if limit:
+        return MongoJSONResponse({"result": result, "next_after": next_after_token(result, limit)})
+    return MongoJSONResponse({"result": result})
 
 @crud_router.post("/CRUD/read/graph_instance/", tags=["General Graph Read Operations"])
-async def read_graph_instance(filter: str):
+async def read_graph_instance(filter: str, fields: str = None, exclude: str = None):
     """
     search database and return specific match to input filter
 
     **Parameters:**
     - **filter**: Filter to be applied to the data.
+    - **fields**: Optional comma separated fields to return.
+    - **exclude**: Optional comma separated fields to leave out.
 
     **Returns:**
     - A graph document if found, otherwise raises a 404 HTTP exception.
     """
     
-    result = pull_graph_instance(json.loads(filter))
+    result = await crud_call(pull_graph_instance, json.loads(filter), projection=parse_projection(fields, exclude))
     if not result:
         raise HTTPException(status_code=404, detail="Graph not found")
-    return {"result": result}
+    return MongoJSONResponse({"result": result})
 
 @crud_router.post("/CRUD/read/graph_collection/", tags=["General Graph Read Operations"])
-async def read_graph_collection(filter: str):
+async def read_graph_collection(filter: str, fields: str = None, exclude: str = None, limit: int = Query(None, gt=0), after: str = None, stream: bool = False):
     """
     search entire database and return all found matches to the filter
 
     **Parameters:**
     - **filter**: Filter to be applied to the data.
+    - **fields**: Optional comma separated fields to return.
+    - **exclude**: Optional comma separated fields to leave out.
+    - **limit**: Optional page size, enables keyset pagination.
+    - **after**: Token from "next_after" of the previous page.
+    - **stream**: Stream the documents as NDJSON instead of one JSON body.
 
     **Returns:**
     - A list of graph documents if found, otherwise raises a 404 HTTP exception.
     """
     
-    result = pull_graph_collection(json.loads(filter))
-    if not result:
-        raise HTTPException(status_code=404, detail="Graph not found")
-    return {"result": result}
+    return await read_collection(pull_graph_collection, json.loads(filter), projection=parse_projection(fields, exclude),
+                                 limit=limit, after=after, stream=stream,
+                                 not_found="Graph not found")
+
+@crud_router.get("/CRUD/read/graph_search/", tags=["General Graph Read Operations"])
+async def read_graph_search(query: str, mode: Literal["text", "prefix"] = "text", field: Literal["project_name", "owner"] = "project_name",
+                            fields: str = None, exclude: str = None, limit: int = Query(20, gt=0, le=100), after: str = None):
+    """
+    Search graphs instead of scanning them with $regex filters.
+
+    **Modes:**
+    - text: ranked full text search over project_name, owner and the
+      process_meta_data description, e.g. query=binder. Every match has a "score".
+    - prefix: case sensitive match of the start of project_name or owner,
+      in field order, served by the index on that field.
+
+    **Parameters:**
+    - **query**: Words to search for, or the prefix in prefix mode.
+    - **mode**: "text" or "prefix".
+    - **field**: The field searched in prefix mode.
+    - **fields**: Optional comma separated fields to return.
+    - **exclude**: Optional comma separated fields to leave out.
+    - **limit**: Page size, at most 100.
+    - **after**: Token from "next_after" of the previous page.
+
+    **Returns:**
+    - The matching graphs and the "next_after" token, otherwise raises a 404 HTTP exception.
+    """
+    try:
+        result = await crud_call(search_graphs, query, mode=mode, field=field, projection=parse_projection(fields, exclude),
+                                 limit=limit, after=after)
+    except ExecutionTimeout:
+        raise HTTPException(status_code=504, detail="Query exceeded its time limit")
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    except OperationFailure as error:
+        # IndexNotFound, $text needs the text index from index_manager.py
+        if error.code == 27:
+            raise HTTPException(status_code=503, detail="The text index is missing, run python index_manager.py build")
+        raise
+
+    if not result["matches"]:
+        raise HTTPException(status_code=404, detail="Graphs not found")
+    return MongoJSONResponse({"result": result["matches"], "next_after": result["next_after"]})
 
 @crud_router.get("/CRUD/read/graph_id/{item_id}", tags=["Specific Graph Read Operations"])
-async def read_graph_data_from_id(item_id: str):
+async def read_graph_data_from_id(item_id: str, fields: str = None, exclude: str = None):
     """
     Endpoint to read graph data by ID.
 
     **Parameters:**
     - **item_id**: The ID of the graph document to retrieve.
+    - **fields**: Optional comma separated fields to return.
+    - **exclude**: Optional comma separated fields to leave out.
 
     **Returns:**
     - The graph document if found, otherwise raises a 404 HTTP exception.
     """
-    result = pull_graph_id(item_id)
+    result = await crud_call(pull_graph_id, item_id, projection=parse_projection(fields, exclude))
     if not result:
         raise HTTPException(status_code=404, detail="Graph not found")
-    return {"result": result}
+    return MongoJSONResponse({"result": result})
+
+@crud_router.post("/CRUD/read/graph_ids/", tags=["Specific Graph Read Operations"])
+async def read_graph_data_from_ids(ids: List[str] = Body(...), fields: str = None, exclude: str = None):
+    """
+    Endpoint to read many graphs by ID with a single query.
+
+    **Parameters:**
+    - **ids**: JSON list of graph IDs, at most READ_MAX_IDS (default 1000).
+    - **fields**: Optional comma separated fields to return.
+    - **exclude**: Optional comma separated fields to leave out.
+
+    **Returns:**
+    - "result": the graph documents in the order of ids, null for ids that were not found.
+    - "missing": the ids that were not found.
+    """
+    return await read_ids(pull_graph_ids, ids, fields, exclude)
+
+@crud_router.get("/CRUD/read/graph_summary/{item_id}", tags=["Specific Graph Read Operations"])
+async def read_graph_summary(item_id: str):
+    """
+    Endpoint to read the process counts of a graph from its maintained
+    summary, without reading the processes themselves.
+
+    **Parameters:**
+    - **item_id**: The ID of the graph.
+
+    **Returns:**
+    - The process count and the counts per file_location_type and per
+      elastic_data_paths key if the graph exists, otherwise raises a 404
+      HTTP exception.
+    """
+    result = await crud_call(pull_graph_summary, item_id)
+    if not result:
+        raise HTTPException(status_code=404, detail="Graph not found")
+    return MongoJSONResponse({"result": result})
+
+@crud_router.get("/CRUD/read/graph_lineage/{item_id}", tags=["Specific Graph Read Operations"])
+async def read_graph_lineage(item_id: str, fields: str = None, exclude: str = None, start: int = Query(0, ge=0), stop: int = Query(None, gt=0)):
+    """
+    Endpoint to read the process steps of a graph in process_list order
+    with a single query.
+
+    **Parameters:**
+    - **item_id**: The ID of the graph.
+    - **fields**: Optional comma separated fields to return.
+    - **exclude**: Optional comma separated fields to leave out.
+    - **start**: First process_list position to return.
+    - **stop**: Optional process_list position to stop before.
+
+    **Returns:**
+    - The process documents, each with its "position" in process_list,
+      if the graph exists, otherwise raises a 404 HTTP exception.
+    """
+    try:
+        result = await crud_call(pull_graph_lineage, item_id, projection=parse_projection(fields, exclude), start=start, stop=stop)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    if result is None:
+        raise HTTPException(status_code=404, detail="Graph not found")
+    return MongoJSONResponse({"result": result})
 
 @crud_router.get("/CRUD/read/graph_name/{project_name}", tags=["Specific Graph Read Operations"])
-async def read_graph_data_from_project_name(project_name: str):
+async def read_graph_data_from_project_name(project_name: str, fields: str = None, exclude: str = None):
     """
     Endpoint to read graph data by owner's name.
 
     **Parameters:**
     - **owner**: The name of the owner.
+    - **fields**: Optional comma separated fields to return.
+    - **exclude**: Optional comma separated fields to leave out.
 
     **Returns:**
     - A list of graph documents owned by the specified owner, otherwise raises a 404 HTTP exception.
     """
-    result = pull_graph_project_name(project_name)
+    result = await crud_call(pull_graph_project_name, project_name, projection=parse_projection(fields, exclude))
     if not result:
         raise HTTPException(status_code=404, detail="Graph not found")
-    return {"result": result}
+    return MongoJSONResponse({"result": result})
 
 @crud_router.get("/CRUD/read/graph_owner/{owner}", tags=["Specific Graph Read Operations"])
-async def read_graph_data_from_owner(owner: str):
+async def read_graph_data_from_owner(owner: str, fields: str = None, exclude: str = None, limit: int = Query(None, gt=0), after: str = None, stream: bool = False):
     """
     Endpoint to read graph data by owner's name.
     
     :param owner: The name of the owner.
+    :param fields: Optional comma separated fields to return.
+    :param exclude: Optional comma separated fields to leave out.
+    :param limit: Optional page size, enables keyset pagination.
+    :param after: Token from "next_after" of the previous page.
+    :param stream: Stream the documents as NDJSON instead of one JSON body.
     :return: A list of graph documents owned by the specified owner, otherwise raises a 404 HTTP exception.
     """
-    result = pull_graphs_owner(owner)
-    if not result:
-        raise HTTPException(status_code=404, detail="Graphs not found")
-    return {"result": result}
+    return await read_collection(pull_graphs_owner, owner, projection=parse_projection(fields, exclude),
+                                 limit=limit, after=after, stream=stream,
+                                 not_found="Graphs not found")
 
 @crud_router.get("/CRUD/read/graph_email/{email}", tags=["Specific Graph Read Operations"])
-async def read_graph_data_from_email(email: str):
+async def read_graph_data_from_email(email: str, fields: str = None, exclude: str = None, limit: int = Query(None, gt=0), after: str = None, stream: bool = False):
     """
     Endpoint to read graph data by owner's email.
 
     **Parameters:**
     - **email**: The email of the owner.
+    - **fields**: Optional comma separated fields to return.
+    - **exclude**: Optional comma separated fields to leave out.
+    - **limit**: Optional page size, enables keyset pagination.
+    - **after**: Token from "next_after" of the previous page.
+    - **stream**: Stream the documents as NDJSON instead of one JSON body.
 
     **Returns:**
     - A list of graph documents owned by the specified email, otherwise raises a 404 HTTP exception.
     """
-    result = pull_graphs_email(email)
-    if not result:
-        raise HTTPException(status_code=404, detail="Graphs not found")
-    return {"result": result}
+    return await read_collection(pull_graphs_email, email, projection=parse_projection(fields, exclude),
+                                 limit=limit, after=after, stream=stream,
+                                 not_found="Graphs not found")
 
 @crud_router.post("/CRUD/read/process_instance/", tags=["General Process Read Operations"])
-async def read_process_instance(filter: str):
+async def read_process_instance(filter: str, fields: str = None, exclude: str = None):
     """
     search database and return specific match to input filter
 
     **Parameters:**
     - **filter**: Filter to be applied to the data.
+    - **fields**: Optional comma separated fields to return.
+    - **exclude**: Optional comma separated fields to leave out.
 
     **Returns:**
     - A graph document if found, otherwise raises a 404 HTTP exception.
     """
     
-    result = pull_process_instance(json.loads(filter))
+    result = await crud_call(pull_process_instance, json.loads(filter), projection=parse_projection(fields, exclude))
     if not result:
         raise HTTPException(status_code=404, detail="Process not found")
-    return {"result": result}
+    return MongoJSONResponse({"result": result})
 
 @crud_router.post("/CRUD/read/process_collection/", tags=["General Process Read Operations"])
-async def read_process_collection(filter: str):
+async def read_process_collection(filter: str, fields: str = None, exclude: str = None, limit: int = Query(None, gt=0), after: str = None, stream: bool = False):
     """
     search entire database and return all found matches to the filter
 
     **Parameters:**
     - **filter**: Filter to be applied to the data.
+    - **fields**: Optional comma separated fields to return.
+    - **exclude**: Optional comma separated fields to leave out.
+    - **limit**: Optional page size, enables keyset pagination.
+    - **after**: Token from "next_after" of the previous page.
+    - **stream**: Stream the documents as NDJSON instead of one JSON body.
 
     **Returns:**
     - A list of graph documents if found, otherwise raises a 404 HTTP exception.
     """
-    result = pull_process_collection(json.loads(filter))
-    if not result:
-        raise HTTPException(status_code=404, detail="Graph not found")
-    return {"result": result}
+    return await read_collection(pull_process_collection, json.loads(filter), projection=parse_projection(fields, exclude),
+                                 limit=limit, after=after, stream=stream,
+                                 not_found="Graph not found")
 
 @crud_router.get("/CRUD/read/process_id/{id}", tags=["Specific Process Read Operations"])
-async def read_process_data_from_id(id: str):
+async def read_process_data_from_id(id: str, fields: str = None, exclude: str = None):
     """
     Endpoint to read process data by ID.
 
     **Parameters:**
     - **id**: The ID of the process document to retrieve.
+    - **fields**: Optional comma separated fields to return.
+    - **exclude**: Optional comma separated fields to leave out.
 
     **Returns:**
     - The process document if found, otherwise raises a 404 HTTP exception.
     """
-    result = pull_process_id(id)
+    result = await crud_call(pull_process_id, id, projection=parse_projection(fields, exclude))
     if not result:
         raise HTTPException(status_code=404, detail="Process not found")
-    return {"result": result}
+    return MongoJSONResponse({"result": result})
+
+@crud_router.post("/CRUD/read/process_ids/", tags=["Specific Process Read Operations"])
+async def read_process_data_from_ids(ids: List[str] = Body(...), fields: str = None, exclude: str = None):
+    """
+    Endpoint to read many processes by ID with a single query, e.g. the
+    process_list of a graph.
+
+    **Parameters:**
+    - **ids**: JSON list of process IDs, at most READ_MAX_IDS (default 1000).
+    - **fields**: Optional comma separated fields to return.
+    - **exclude**: Optional comma separated fields to leave out.
+
+    **Returns:**
+    - "result": the process documents in the order of ids, null for ids that were not found.
+    - "missing": the ids that were not found.
+    """
+    return await read_ids(pull_process_ids, ids, fields, exclude)
 
 @crud_router.get("/CRUD/read/process_parent/{parent_graph}", tags=["Specific Process Read Operations"])
-async def read_process_data_from_parent_graph(parent_graph: str):
+async def read_process_data_from_parent_graph(parent_graph: str, fields: str = None, exclude: str = None, limit: int = Query(None, gt=0), after: str = None, stream: bool = False):
     """
     Endpoint to read process data by parent graph ID.
 
     **Parameters:**
     - **parent_graph**: The ID of the parent graph.
+    - **fields**: Optional comma separated fields to return.
+    - **exclude**: Optional comma separated fields to leave out.
+    - **limit**: Optional page size, enables keyset pagination.
+    - **after**: Token from "next_after" of the previous page.
+    - **stream**: Stream the documents as NDJSON instead of one JSON body.
 
     **Returns:**
     - A list of process documents associated with the specified parent graph, otherwise raises a 404 HTTP exception.
     """
-    result = pull_processes_parent_graph(parent_graph)
-    if not result:
-        raise HTTPException(status_code=404, detail="Processes not found")
-    return {"result": result}
+    return await read_collection(pull_processes_parent_graph, parent_graph, projection=parse_projection(fields, exclude),
+                                 limit=limit, after=after, stream=stream,
+                                 not_found="Processes not found")
 
 @crud_router.get("/CRUD/read/process_data_type/{data_key}", tags=["Specific Process Read Operations"])
-async def read_process_data_from_meta_data_tag(data_key: str):
+async def read_process_data_from_meta_data_tag(data_key: str, fields: str = None, exclude: str = None, limit: int = Query(None, gt=0), after: str = None, stream: bool = False):
     """
     Endpoint to read process data by a specific key in the elastic_data_paths dictionary.
 
     **Parameters:**
     - **data_key**: The key to search for in the elastic_data_paths dictionary.
+    - **fields**: Optional comma separated fields to return.
+    - **exclude**: Optional comma separated fields to leave out.
+    - **limit**: Optional page size, enables keyset pagination.
+    - **after**: Token from "next_after" of the previous page.
+    - **stream**: Stream the documents as NDJSON instead of one JSON body.
 
     **Returns:**
     - A list of process documents that contain the specified key, otherwise raises a 404 HTTP exception.
     """
-    result = pull_processes_data_type(data_key)
-    if not result:
-        raise HTTPException(status_code=404, detail="Processes not found")
-    return {"result": result}
+    return await read_collection(pull_processes_data_type, data_key, projection=parse_projection(fields, exclude),
+                                 limit=limit, after=after, stream=stream,
+                                 not_found="Processes not found")
 
 @crud_router.get("/CRUD/read/process_file_location_type/{file_location}", tags=["Specific Process Read Operations"])
-async def read_process_data_from_file_location_type(file_location_type: str):
+async def read_process_data_from_file_location_type(file_location_type: str, fields: str = None, exclude: str = None, limit: int = Query(None, gt=0), after: str = None, stream: bool = False):
     """
     Endpoint to read process data by a specific data location category.
 
@@ -219,14 +515,200 @@ async def read_process_data_from_file_location_type(file_location_type: str):
 
     **Parameters:**
     - **data_key**: The key to search for in the elastic_data_paths dictionary.
+    - **fields**: Optional comma separated fields to return.
+    - **exclude**: Optional comma separated fields to leave out.
+    - **limit**: Optional page size, enables keyset pagination.
+    - **after**: Token from "next_after" of the previous page.
+    - **stream**: Stream the documents as NDJSON instead of one JSON body.
 
     **Returns:**
     - A list of process documents that contain the specified key, otherwise raises a 404 HTTP exception.
     """
-    result = pull_processes_file_location_type(file_location_type)
+    return await read_collection(pull_processes_file_location_type, file_location_type, projection=parse_projection(fields, exclude),
+                                 limit=limit, after=after, stream=stream,
+                                 not_found="Processes not found")
+
+@crud_router.get("/CRUD/read/process_by_path/", tags=["Specific Process Read Operations"])
+async def read_process_data_from_data_path(path: str, fields: str = None, exclude: str = None, limit: int = Query(None, gt=0), after: str = None, stream: bool = False):
+    """
+    Endpoint to find the processes that produced or consumed a file,
+    i.e. whose elastic_data_paths hold the path.
+
+    **Parameters:**
+    - **path**: The file path, e.g. /some_path1.pdb.
+    - **fields**: Optional comma separated fields to return.
+    - **exclude**: Optional comma separated fields to leave out.
+    - **limit**: Optional page size, enables keyset pagination.
+    - **after**: Token from "next_after" of the previous page.
+    - **stream**: Stream the documents as NDJSON instead of one JSON body.
+
+    **Returns:**
+    - A list of process documents referencing the path, otherwise raises a 404 HTTP exception.
+    """
+    return await read_collection(pull_processes_data_path, path, projection=parse_projection(fields, exclude),
+                                 limit=limit, after=after, stream=stream,
+                                 not_found="Processes not found")
+
+@crud_router.get("/CRUD/read/data_keys/", tags=["Specific Process Read Operations"])
+async def read_data_keys():
+    """
+    Endpoint to list the elastic_data_paths keys held by the processes,
+    read from the maintained data key catalog.
+
+    **Returns:**
+    - The data keys with the number of processes holding each, most used
+      first, otherwise raises a 404 HTTP exception.
+    """
+    result = await crud_call(pull_data_key_catalog)
     if not result:
-        raise HTTPException(status_code=404, detail="Processes not found")
-    return {"result": result}
+        raise HTTPException(status_code=404, detail="No data keys found")
+    return MongoJSONResponse({"result": result})
+
+# Analytics Operations
+
+async def aggregate_collection(crud_function, build_pipeline, *args, filter:str=None, **kwargs):
+    """
+    Shared body of the analytics endpoints. Builds the pipeline, runs it
+    on the server and streams the results as NDJSON.
+
+    **Parameters:**
+    - **crud_function**: aggregate_graph_collection or aggregate_process_collection.
+    - **build_pipeline**: The pipeline builder from analytics.py.
+    - **args/kwargs**: Arguments passed through to the builder.
+    - **filter**: Optional JSON filter selecting the documents to aggregate.
+
+    **Returns:**
+    - A StreamingResponse with one result per line.
+    """
+    try:
+        pipeline = build_pipeline(*args, filter=json.loads(filter) if filter else None, **kwargs)
+        cursor = await crud_call(crud_function, pipeline)
+        if hasattr(cursor, "__aiter__"):
+            # Motor only runs the aggregation on the first fetch, do it here
+            # so a failing pipeline is reported before the response starts
+            cursor = await prefetch_first(cursor)
+    except ExecutionTimeout:
+        raise HTTPException(status_code=504, detail="Aggregation exceeded its time limit")
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    except OperationFailure as error:
+        # an invalid filter or stage, e.g. an unknown operator
+        raise HTTPException(status_code=400, detail=(error.details or {}).get("errmsg", str(error)))
+    return ndjson_response(cursor)
+
+async def prefetch_first(cursor):
+    """
+    Fetch the first document of a Motor cursor, so the command behind it
+    runs and fails while an error status can still be returned.
+
+    **Parameters:**
+    - **cursor**: A Motor cursor.
+
+    **Returns:**
+    - An async iterator over all of the cursor's documents.
+    """
+    documents = cursor.__aiter__()
+    try:
+        first = [await documents.__anext__()]
+    except StopAsyncIteration:
+        first = []
+
+    async def all_documents():
+        for document in first:
+            yield document
+        async for document in documents:
+            yield document
+
+    return all_documents()
+
+@crud_router.post("/CRUD/analytics/graph_group_count/", tags=["Analytics Operations"])
+async def analytics_graph_group_count(fields: str, filter: str = None, limit: int = Query(None, gt=0)):
+    """
+    Count graphs per combination of field values, largest groups first.
+
+    **Parameters:**
+    - **fields**: Comma separated fields to group by, e.g. owner,project_name.
+    - **filter**: Optional filter selecting the graphs to count.
+    - **limit**: Optional maximum number of groups.
+
+    **Returns:**
+    - NDJSON lines like {"group": {"owner": "..."}, "count": 3}.
+    """
+    return await aggregate_collection(aggregate_graph_collection, group_count_pipeline,
+                                      [field.strip() for field in fields.split(",") if field.strip()],
+                                      filter=filter, limit=limit)
+
+@crud_router.post("/CRUD/analytics/process_group_count/", tags=["Analytics Operations"])
+async def analytics_process_group_count(fields: str, filter: str = None, limit: int = Query(None, gt=0)):
+    """
+    Count processes per combination of field values, largest groups first.
+
+    **Parameters:**
+    - **fields**: Comma separated fields to group by, e.g. file_location_type,meta_data.tool.
+    - **filter**: Optional filter selecting the processes to count.
+    - **limit**: Optional maximum number of groups.
+
+    **Returns:**
+    - NDJSON lines like {"group": {"file_location_type": "pool"}, "count": 12}.
+    """
+    return await aggregate_collection(aggregate_process_collection, group_count_pipeline,
+                                      [field.strip() for field in fields.split(",") if field.strip()],
+                                      filter=filter, limit=limit)
+
+@crud_router.post("/CRUD/analytics/graph_date_histogram/", tags=["Analytics Operations"])
+async def analytics_graph_date_histogram(field: Literal["date_created", "date_updated"] = "date_created",
+                                         unit: Literal["minute", "hour", "day", "week", "month", "year"] = "day",
+                                         bin_size: int = Query(1, gt=0), filter: str = None):
+    """
+    Count graphs per time bucket of date_created or date_updated.
+
+    **Parameters:**
+    - **field**: The date field to bucket.
+    - **unit**: Unit of the buckets.
+    - **bin_size**: Number of units per bucket.
+    - **filter**: Optional filter selecting the graphs to count.
+
+    **Returns:**
+    - NDJSON lines like {"bucket": "2024-07-06T00:00:00", "count": 3}, oldest first.
+    """
+    return await aggregate_collection(aggregate_graph_collection, date_histogram_pipeline,
+                                      field, unit, bin_size, filter=filter)
+
+@crud_router.post("/CRUD/analytics/process_date_histogram/", tags=["Analytics Operations"])
+async def analytics_process_date_histogram(field: Literal["date_created", "date_updated"] = "date_created",
+                                           unit: Literal["minute", "hour", "day", "week", "month", "year"] = "day",
+                                           bin_size: int = Query(1, gt=0), filter: str = None):
+    """
+    Count processes per time bucket of date_created or date_updated.
+
+    **Parameters:**
+    - **field**: The date field to bucket.
+    - **unit**: Unit of the buckets.
+    - **bin_size**: Number of units per bucket.
+    - **filter**: Optional filter selecting the processes to count.
+
+    **Returns:**
+    - NDJSON lines like {"bucket": "2024-07-06T00:00:00", "count": 12}, oldest first.
+    """
+    return await aggregate_collection(aggregate_process_collection, date_histogram_pipeline,
+                                      field, unit, bin_size, filter=filter)
+
+@crud_router.get("/CRUD/analytics/process_data_values/{data_key}", tags=["Analytics Operations"])
+async def analytics_process_data_values(data_key: str, filter: str = None, limit: int = Query(None, gt=0)):
+    """
+    Distinct values stored under an elastic_data_paths key, with the
+    number of processes holding each.
+
+    **Parameters:**
+    - **data_key**: The key in the elastic_data_paths dictionary, e.g. pdb.
+    - **filter**: Optional filter selecting the processes.
+    - **limit**: Optional maximum number of values.
+
+    **Returns:**
+    - NDJSON lines like {"value": "/path/model.pdb", "count": 1}, sorted by value.
+    """
+    return await aggregate_collection(aggregate_process_collection, data_values_pipeline,
+                                      data_key, filter=filter, limit=limit)
 
 
 @crud_router.get("/CRUD/delete/graph_file_id/{id}", tags=["Specific Graph Delete Operations"])
@@ -240,10 +722,45 @@ async def delete_graph_from_id(id: str):
     **Returns:**
     - A result indicating the success of the deletion, otherwise raises a 404 HTTP exception.
     """
-    result = delete_graph(id)
+    result = await crud_call(delete_graph, id)
     if not result:
         raise HTTPException(status_code=404, detail="Processes not found")
-    return {"result": result}    
+    return MongoJSONResponse({"result": result})
+
+@crud_router.get("/CRUD/delete/graph_job/{id}", tags=["Specific Graph Delete Operations"])
+async def delete_graph_in_background(id: str, batch_size: int = Query(1000, gt=0)):
+    """
+    Endpoint to delete a graph and all of its processes as a background job.
+    Returns as soon as the job is recorded; poll /CRUD/read/job_status/{job_id}
+    for progress and the final consistency check.
+
+    **Parameters:**
+    - **id**: The ID of the graph to delete.
+    - **batch_size**: Maximum number of processes deleted per batch.
+
+    **Returns:**
+    - The job document, otherwise raises a 404 HTTP exception.
+    """
+    result = await run_in_threadpool(start_graph_delete_job, id, batch_size)
+    if not result:
+        raise HTTPException(status_code=404, detail="Graph not found")
+    return MongoJSONResponse({"result": result})
+
+@crud_router.get("/CRUD/read/job_status/{job_id}", tags=["Service Operations"])
+async def read_job_status(job_id: str):
+    """
+    Endpoint to read the progress of a background job.
+
+    **Parameters:**
+    - **job_id**: The ID returned when the job was started.
+
+    **Returns:**
+    - The job document with its status and progress counters, otherwise raises a 404 HTTP exception.
+    """
+    result = await run_in_threadpool(pull_job_status, job_id)
+    if not result:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return MongoJSONResponse({"result": result})
 
 @crud_router.get("/CRUD/delete/process_file_id/{id}", tags=["Specific Process Delete Operations"])
 async def delete_process_from_id(id: str):
@@ -256,10 +773,10 @@ async def delete_process_from_id(id: str):
     **Returns:**
     - A result indicating the success of the deletion, otherwise raises a 404 HTTP exception.
     """
-    result = delete_process(id)
+    result = await crud_call(delete_process, id)
     if not result:
         raise HTTPException(status_code=404, detail="Processes not found")
-    return {"result": result}
+    return MongoJSONResponse({"result": result})
 
 
 @crud_router.get("/CRUD/delete/process_partent_id/{parent_id}", tags=["Specific Process Delete Operations"])
@@ -273,10 +790,10 @@ async def delete_processes_from_parent_id(parent_id: str):
     **Returns:**
     - A result indicating the success of the deletion, otherwise raises a 404 HTTP exception.
     """
-    result = delete_all_from_parent_graph(parent_id)
+    result = await crud_call(delete_all_from_parent_graph, parent_id)
     if not result:
         raise HTTPException(status_code=404, detail="Processes not found")
-    return {"result": result}
+    return MongoJSONResponse({"result": result})
 
 
 
@@ -293,10 +810,10 @@ async def update_process_data_meta_data(updated_instance:Process_update_meta_dat
     - A result indicating the success of the update, otherwise raises a 404 HTTP exception.
     """
     updated_meta_data = updated_instance.dict()
-    result = update_process_meta_data(**updated_meta_data)
+    result = await crud_call(update_process_meta_data, **updated_meta_data)
     if not result:
         raise HTTPException(status_code=404, detail="Processes not found")
-    return {"result": result}
+    return MongoJSONResponse({"result": result})
 
 @crud_router.post("/CRUD/update/process_elastic_data_paths/", tags=["Specific Process Update Operations"])
 async def update_process_data_elastic_data_paths(updated_instance:Process_update_elastic_data_paths_schema):
@@ -310,10 +827,10 @@ async def update_process_data_elastic_data_paths(updated_instance:Process_update
     - A result indicating the success of the update, otherwise raises a 404 HTTP exception.
     """
     updated_elastic_data_paths = updated_instance.dict()
-    result = update_process_elastic_data_paths(**updated_elastic_data_paths)
+    result = await crud_call(update_process_elastic_data_paths, **updated_elastic_data_paths)
     if not result:
         raise HTTPException(status_code=404, detail="Processes not found")
-    return {"result": result}
+    return MongoJSONResponse({"result": result})
 
 @crud_router.post("/CRUD/update/graph_process_meta_data/", tags=["Specific Graph Update Operations"])
 async def update_graph_data_process_meta_data(updated_instance:Graph_update_meta_data_schema):
@@ -327,10 +844,10 @@ async def update_graph_data_process_meta_data(updated_instance:Graph_update_meta
     - A result indicating the success of the update, otherwise raises a 404 HTTP exception.
     """
     updated_process_meta_data = updated_instance.dict()
-    result = update_graph_process_meta_data(**updated_process_meta_data)
+    result = await crud_call(update_graph_process_meta_data, **updated_process_meta_data)
     if not result:
         raise HTTPException(status_code=404, detail="Processes not found")
-    return {"result": result}
+    return MongoJSONResponse({"result": result})
 
 @crud_router.post("/CRUD/update/graph_project_name/", tags=["Specific Graph Update Operations"])
 async def update_graph_data_project_name(updated_instance:Graph_update_project_name_schema):
@@ -344,10 +861,10 @@ async def update_graph_data_project_name(updated_instance:Graph_update_project_n
     - A result indicating the success of the update, otherwise raises a 404 HTTP exception.
     """
     updated_project_name = updated_instance.dict()
-    result = update_graph_project_name(**updated_project_name)
+    result = await crud_call(update_graph_project_name, **updated_project_name)
     if not result:
         raise HTTPException(status_code=404, detail="Processes not found")
-    return {"result": result}
+    return MongoJSONResponse({"result": result})
 
 @crud_router.post("/CRUD/update/graph_owner_email/", tags=["Specific Graph Update Operations"])
 async def update_graph_data_owner_email(updated_instance:Graph_update_owner_email_schema):
@@ -361,10 +878,10 @@ async def update_graph_data_owner_email(updated_instance:Graph_update_owner_emai
     - A result indicating the success of the update, otherwise raises a 404 HTTP exception.
     """
     updated_owner_email = updated_instance.dict()
-    result = update_graph_owner_email(**updated_owner_email)
+    result = await crud_call(update_graph_owner_email, **updated_owner_email)
     if not result:
         raise HTTPException(status_code=404, detail="Processes not found")
-    return {"result": result}
+    return MongoJSONResponse({"result": result})
 
 @crud_router.post("/CRUD/update/graph_owner/", tags=["Specific Graph Update Operations"])
 async def update_graph_data_owner(updated_instance:Graph_update_owner_schema):
@@ -378,10 +895,10 @@ async def update_graph_data_owner(updated_instance:Graph_update_owner_schema):
     - A result indicating the success of the update, otherwise raises a 404 HTTP exception.
     """
     updated_owner = updated_instance.dict()
-    result = update_graph_owner(**updated_owner)
+    result = await crud_call(update_graph_owner, **updated_owner)
     if not result:
         raise HTTPException(status_code=404, detail="Processes not found")
-    return {"result": result}
+    return MongoJSONResponse({"result": result})
 
 @crud_router.post("/CRUD/update/process_list_order/", tags=["Specific Graph Update Operations"])
 async def update_graph_data_process_list_order(updated_instance:Graph_update_process_list_order):
@@ -394,13 +911,59 @@ async def update_graph_data_process_list_order(updated_instance:Graph_update_pro
     - **updated_instance**: An instance of Graph_update_owner_schema containing the updated list order.
 
     **Returns:**
-    - A result indicating the success of the update, otherwise raises a 404 HTTP exception.
+    - A result indicating the success of the update, raises a 400 HTTP exception
+      when the list holds an id twice, otherwise a 404 HTTP exception.
     """
     updated_process_list = updated_instance.dict()
-    result = update_graph_process_list_order(**updated_process_list)
+    try:
+        result = await crud_call(update_graph_process_list_order, **updated_process_list)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
     if not result:
         raise HTTPException(status_code=404, detail="Processes not found")
-    return {"result": result}
+    return MongoJSONResponse({"result": result})
+
+@crud_router.post("/CRUD/update/process_bulk/", tags=["Specific Process Update Operations"])
+async def update_process_data_bulk(updated_instances:List[Process_bulk_update_schema], chunk_size:int = Query(1000, gt=0)):
+    """
+    Endpoint to update fields of many processes in one request.
+    Only the fields supplied for an entry are changed.
+
+    **Parameters:**
+    - **updated_instances**: A list of Process_bulk_update_schema instances.
+    - **chunk_size**: Number of updates sent to the database per bulk write.
+
+    **Returns:**
+    - A summary of the matched and modified counts and the ids that were not found,
+      otherwise raises a 400 HTTP exception for an empty batch.
+    """
+    if not updated_instances:
+        raise HTTPException(status_code=400, detail="No updates supplied")
+
+    updates = [updated_instance.dict(exclude_none=True) for updated_instance in updated_instances]
+    result = await crud_call(update_process_documents_bulk, updates, chunk_size=chunk_size)
+    return MongoJSONResponse({"result": result})
+
+@crud_router.post("/CRUD/update/graph_bulk/", tags=["Specific Graph Update Operations"])
+async def update_graph_data_bulk(updated_instances:List[Graph_bulk_update_schema], chunk_size:int = Query(1000, gt=0)):
+    """
+    Endpoint to update fields of many graphs in one request.
+    Only the fields supplied for an entry are changed.
+
+    **Parameters:**
+    - **updated_instances**: A list of Graph_bulk_update_schema instances.
+    - **chunk_size**: Number of updates sent to the database per bulk write.
+
+    **Returns:**
+    - A summary of the matched and modified counts and the ids that were not found,
+      otherwise raises a 400 HTTP exception for an empty batch.
+    """
+    if not updated_instances:
+        raise HTTPException(status_code=400, detail="No updates supplied")
+
+    updates = [updated_instance.dict(exclude_none=True) for updated_instance in updated_instances]
+    result = await crud_call(update_graph_documents_bulk, updates, chunk_size=chunk_size)
+    return MongoJSONResponse({"result": result})
 
 @crud_router.post("/CRUD/create/graph/", tags=["Graph Create Operations"])
 async def create_graph(new_graph:GraphMap):
@@ -417,10 +980,37 @@ async def create_graph(new_graph:GraphMap):
 
     # Generate internal _id
     new_graph_dict["_id"] = str(uuid.uuid4())
-    result = create_graph_document(new_graph_dict)
+    result = await crud_call(create_graph_document, new_graph_dict)
     if not result:
         raise HTTPException(status_code=404, detail="Processes not found")
-    return {"result": result}
+    return MongoJSONResponse({"result": result})
+
+@crud_router.post("/CRUD/create/graph/bulk", tags=["Graph Create Operations"])
+async def create_graph_bulk(new_graphs:List[GraphMap], chunk_size:int = Query(1000, gt=0)):
+    """
+    Endpoint to create many graph documents in one request.
+
+    **Parameters:**
+    - **new_graphs**: A list of GraphMap instances containing the graph document data.
+    - **chunk_size**: Number of documents sent to the database per bulk write.
+
+    **Returns:**
+    - The ids that were created and the ids that failed with the reason,
+      otherwise raises a 400 HTTP exception for an empty batch.
+    """
+    if not new_graphs:
+        raise HTTPException(status_code=400, detail="No graphs supplied")
+
+    new_graph_dicts = []
+    for new_graph in new_graphs:
+        new_graph_dict = new_graph.dict()
+
+        # Generate internal _id
+        new_graph_dict["_id"] = str(uuid.uuid4())
+        new_graph_dicts.append(new_graph_dict)
+
+    result = await crud_call(create_graph_documents_bulk, new_graph_dicts, chunk_size=chunk_size)
+    return MongoJSONResponse({"result": result})
 
 @crud_router.post("/CRUD/create/process/", tags=["Process Create Operations"])
 async def create_process(new_process:ProcessStep, list_insert_location:int = None):
@@ -439,9 +1029,134 @@ async def create_process(new_process:ProcessStep, list_insert_location:int = Non
 
     # Generate internal _id
     new_process_dict["_id"] = str(uuid.uuid4())
-    result = create_process_document(new_process_dict, list_insert_location=list_insert_location)
+    result = await crud_call(create_process_document, new_process_dict, list_insert_location=list_insert_location)
     if not result:
         raise HTTPException(status_code=404, detail="Processes not found")
-    return {"result": result}
+    return MongoJSONResponse({"result": result})
+
+@crud_router.post("/CRUD/create/process/bulk", tags=["Process Create Operations"])
+async def create_process_bulk(new_processes:List[ProcessStep], ordered:bool = False):
+    """
+    Endpoint to create many processes in one request.
+
+    **Parameters:**
+    - **new_processes**: A list of ProcessStep instances containing the process data.
+    - **ordered**: Stop inserting at the first failure instead of continuing
+                   with the remaining processes.
+
+    **Returns:**
+    - A status entry per supplied process, in the supplied order, otherwise
+      raises a 400 HTTP exception for an empty batch.
+    """
+    if not new_processes:
+        raise HTTPException(status_code=400, detail="No processes supplied")
+
+    new_process_dicts = []
+    for new_process in new_processes:
+        new_process_dict = new_process.dict()
 
+        # Generate internal _id
+        new_process_dict["_id"] = str(uuid.uuid4())
+        new_process_dicts.append(new_process_dict)
 
+    result = await crud_call(create_process_documents_bulk, new_process_dicts, ordered=ordered)
+    return MongoJSONResponse({"result": result})
+
+# Transfer Operations
+
+@crud_router.get("/CRUD/export/graph/{item_id}", tags=["Transfer Operations"])
+async def export_graph_data(item_id: str, format: Literal["ndjson", "bson"] = "ndjson", compression: Literal["none", "zstd"] = "none"):
+    """
+    Endpoint to export a graph and all of its processes as one stream,
+    see graph_transfer.py for the format.
+
+    **Parameters:**
+    - **item_id**: The ID of the graph.
+    - **format**: "ndjson" for extended JSON lines, "bson" for raw BSON documents.
+    - **compression**: "zstd" to compress the stream, needs the zstandard package.
+
+    **Returns:**
+    - The export as a download, otherwise raises a 404 HTTP exception.
+    """
+    try:
+        check_transfer_options(format, compression)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+
+    # the processes are read with a cursor while the response streams
+    documents = await run_in_threadpool(export_graph, item_id)
+    if documents is None:
+        raise HTTPException(status_code=404, detail="Graph not found")
+    return StreamingResponse(
+        export_stream(documents, format, compression),
+        media_type=transfer_media_type(format, compression),
+        headers={"Content-Disposition": f'attachment; filename="{item_id}{transfer_suffix(format, compression)}"'}
+    )
+
+@crud_router.post("/CRUD/import/graph/", tags=["Transfer Operations"])
+async def import_graph_data(file: UploadFile = File(...), format: Literal["ndjson", "bson"] = "ndjson", compression: Literal["none", "zstd"] = "none", batch_size: int = Query(1000, gt=0, le=10000)):
+    """
+    Endpoint to import a graph and all of its processes from an export.
+    The upload is spooled to disk and read one document at a time.
+
+    **Parameters:**
+    - **file**: The export, as written by /CRUD/export/graph/{item_id}.
+    - **format**: "ndjson" or "bson", as exported.
+    - **compression**: "none" or "zstd", as exported.
+    - **batch_size**: Number of processes per insert_many.
+
+    **Returns:**
+    - The imported graph id and number of processes, raises a 400 HTTP
+      exception for an invalid export or a process the server rejects and
+      a 409 HTTP exception when the graph or one of its processes already exists.
+    """
+    try:
+        result = await run_in_threadpool(import_graph, read_documents(file.file, format, compression), batch_size)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Graph already exists")
+    except BulkWriteError as error:
+        write_errors = error.details.get("writeErrors", [])
+        rejected = [write_error for write_error in write_errors if write_error["code"] != 11000]
+        if write_errors and not rejected:
+            raise HTTPException(status_code=409, detail="Processes already exist")
+        if rejected:
+            # e.g. a process failing document validation, report the server's reason
+            raise HTTPException(status_code=400, detail=rejected[0]["errmsg"])
+        raise HTTPException(status_code=500, detail=str(error))
+    if result is None:
+        raise HTTPException(status_code=409, detail="Graph already exists")
+    return MongoJSONResponse({"result": result})
+
+@crud_router.get("/CRUD/cache/stats", tags=["Service Operations"])
+async def read_cache_stats():
+    """
+    Endpoint to report the document cache counters.
+
+    **Returns:**
+    - Size, hits, misses, evictions, expirations and invalidations per cache.
+    """
+    return MongoJSONResponse({"result": cache_stats()})
+
+@crud_router.get("/CRUD/query_guard/stats", tags=["Service Operations"])
+async def read_query_guard_stats():
+    """
+    Endpoint to report the query guard settings and counters.
+
+    **Returns:**
+    - Mode, limits, explain/reject/throttle counts and the plan cache counters.
+    """
+    return MongoJSONResponse({"result": query_guard.stats()})
+
+@crud_router.get("/metrics", tags=["Service Operations"], response_class=PlainTextResponse)
+async def read_metrics():
+    """
+    Endpoint to expose the service metrics to Prometheus.
+
+    **Returns:**
+    - Route, CRUD function and Mongo command latency histograms, Mongo
+      round trips per request and slow query counts in the Prometheus
+      text format.
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
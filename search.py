@@ -0,0 +1,122 @@
+"""
+-------------------------------------------------------------------
+This is a Goldfish Project File
+
+Authors: Max Witwer, Jie Chen, Elliott Cole
+Collaboration with the Baker Lab
+
+This file was generated during an internship at the institute for
+protein design
+
+Description:
+This file contains the query plans of the graph search. The "text"
+mode runs a $text query against the text index over project_name,
+owner and the description in process_meta_data (see index_manager.py)
+and ranks the matches by text score. The "prefix" mode matches the
+start of project_name or owner with an anchored, case sensitive
+regular expression, which Mongo answers with a range scan of the
+B-tree index on that field, and returns the matches in field order.
+
+Both modes are paginated with an opaque "after" token: the text mode
+token holds the number of ranked matches already served, the prefix
+mode token holds the (field value, _id) of the last match, so the
+next page continues from the index position.
+
+
+Date: 07/06/2024
+-------------------------------------------------------------------
+"""
+
+import base64
+import binascii
+import re
+
+from bson import json_util
+from pymongo import ASCENDING
+
+SEARCH_MODES = ("text", "prefix")
+
+# fields the prefix mode can search, each leads a B-tree index ending on _id
+PREFIX_FIELDS = ("project_name", "owner")
+
+# most matches returned per page
+MAX_SEARCH_LIMIT = 100
+
+
+def _encode_token(position:dict):
+	return base64.urlsafe_b64encode(json_util.dumps(position).encode()).decode()
+
+
+def _decode_token(token:str):
+	try:
+		return json_util.loads(base64.urlsafe_b64decode(token.encode()))
+	except (binascii.Error, TypeError, ValueError) as error:
+		raise ValueError(f"invalid after token '{token}'") from error
+
+
+def search_plan(query:str, mode:str="text", field:str="project_name", limit:int=20, after:str=None, projection:dict=None):
+	"""
+	Build the find() arguments of one search page.
+
+	:param query: Words to search for in text mode, the prefix in prefix mode.
+	:param mode: "text" or "prefix".
+	:param field: The field searched in prefix mode, one of PREFIX_FIELDS.
+	:param limit: Page size, at most MAX_SEARCH_LIMIT.
+	:param after: Token of the previous page, None for the first page.
+	:param projection: Fields to include or exclude, None for whole documents.
+	:return: A dictionary with the filter, projection, sort, skip and limit.
+	:raises ValueError: The mode, field, limit or token is invalid.
+	"""
+	if mode not in SEARCH_MODES:
+		raise ValueError(f"mode must be one of {', '.join(SEARCH_MODES)}")
+	if not query:
+		raise ValueError("the search query can not be empty")
+	if not 0 < limit <= MAX_SEARCH_LIMIT:
+		raise ValueError(f"limit must be between 1 and {MAX_SEARCH_LIMIT}")
+	position = _decode_token(after) if after else {}
+
+	if mode == "text":
+		score = {"score": {"$meta": "textScore"}}
+		return {
+			"filter": {"$text": {"$search": query}},
+			"projection": {**(projection or {}), **score},
+			"sort": [("score", {"$meta": "textScore"}), ("_id", ASCENDING)],
+			"skip": position.get("skip", 0),
+			"limit": limit,
+		}
+
+	if field not in PREFIX_FIELDS:
+		raise ValueError(f"prefix search supports {', '.join(PREFIX_FIELDS)}")
+	filter = {field: {"$regex": f"^{re.escape(query)}"}}
+	if "value" in position:
+		filter = {"$and": [filter, {"$or": [
+			{field: {"$gt": position["value"]}},
+			{field: position["value"], "_id": {"$gt": position["_id"]}},
+		]}]}
+	if projection and any(projection.values()):
+		# the token is built from the searched field
+		projection = {**projection, field: 1}
+	elif projection:
+		projection = {name: value for name, value in projection.items() if name not in (field, "_id")} or None
+	return {
+		"filter": filter,
+		"projection": projection,
+		"sort": [(field, ASCENDING), ("_id", ASCENDING)],
+		"skip": 0,
+		"limit": limit,
+	}
+
+
+def next_search_token(page:list, plan:dict, mode:str="text", field:str="project_name"):
+	"""
+	Token for the page following a search page.
+
+	:param page: The documents returned for the current page.
+	:param plan: The search_plan the page was read with.
+	:return: The token, or None when this was the last page.
+	"""
+	if len(page) < plan["limit"]:
+		return None
+	if mode == "text":
+		return _encode_token({"skip": plan["skip"] + len(page)})
+	return _encode_token({"value": page[-1].get(field), "_id": page[-1]["_id"]})